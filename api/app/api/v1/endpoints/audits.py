@@ -12,7 +12,6 @@ from datetime import datetime
 
 from app.core.database import get_session
 from app.api.deps import get_current_user
-from app.helpers import extract_domain
 from app.models import AuditComparison, AuditSchemaReview, SchemaAuditStatus, SchemaAuditSourceType
 from app.models import AuditUrlValidation, UrlValidationStatus, UrlValidationSourceType
 from app.models.url_validation_comment import UrlValidationComment, CommentStatus
@@ -21,175 +20,13 @@ from app.models.webpage import WebPage
 from app.models.audit import AuditReport, AuditStatus
 from app.models.audit_comparison import ComparisonStatus
 from app.schemas import audit_schemas
-from app.services.audit_engine import get_audit_engine
-from app.services.ai_client import get_ai_client
-from app.services.cache import Cache
-from app.services.seo_analyzer import SEOAnalyzer
-from app.services.audit_comparator import get_audit_comparator
 from app.services.schema_audit_service import get_schema_audit_service
 from app.services.url_validation_service import get_url_validation_service
-from app.services.background_tasks import run_comparison_task, run_schema_audit_task, run_url_validation_task, run_url_validation_single_url_task
+from app.services.background_tasks import JobType, dispatch_job
 
 router = APIRouter()
 
 
-async def run_audit_task(
-        audit_id: UUID,
-        webpage: WebPage,
-        include_ai: bool,
-        token: str
-):
-    """
-    Tarea en segundo plano para ejecutar auditoría.
-    Se ejecuta de forma asíncrona sin bloquear la respuesta.
-    """
-    from app.core.database import db_manager
-
-    audit = None  # Inicializar para evitar UnboundLocalError
-    documentation_context = None
-    _cache = Cache(table_name="audits_reports")
-    try:
-        # Usar el context manager síncrono del gestor de BD
-        with db_manager.sync_session_context() as session:
-            # Obtener el audit report
-            audit = session.get(AuditReport, audit_id)
-            if not audit:
-                print(f"❌ No se encontró audit {audit_id}")
-                return
-
-            # Capturar documentation_context antes de que la sesión se cierre
-            documentation_context = audit.documentation_context
-
-            # Actualizar estado
-            audit.status = AuditStatus.IN_PROGRESS
-            session.add(audit)
-            # No llamar commit aquí, el context manager lo hace automáticamente
-
-        print(f"🚀 Iniciando auditoría para {webpage.url}")
-
-        # Ejecutar auditoría con Playwright/Lighthouse
-        audit_engine = get_audit_engine()
-        req_lighthouse_params = dict(
-            url=webpage.url,
-            instructions=webpage.instructions,
-            manual_html_content=webpage.manual_html_content
-        )
-        lighthouse_result = await _cache.loadFromCacheAsync(
-            params=req_lighthouse_params,
-            prefix="___lighthouse_report___",
-            callback_async=audit_engine.run_lighthouse_audit,
-            **req_lighthouse_params
-        )
-
-        # Si se solicita análisis de IA
-        ai_analysis_data = None
-
-        if include_ai:
-            print(f"🤖 Ejecutando análisis de IA...")
-            ai_client = get_ai_client()
-
-            try:
-                req_ai_analysis_params = dict(
-                    url=webpage.url,
-                )
-                ai_analysis = await _cache.loadFromCacheAsync(
-                    params=req_ai_analysis_params,
-                    prefix="ai_analysis_",
-                    ttl=3600,
-                    callback_async=ai_client.analyze_seo_content,
-                    html_content=lighthouse_result.get('html_content_raw', ''),
-                    lighthouse_data={
-                        'performance_score': lighthouse_result.get('performance_score'),
-                        'seo_score': lighthouse_result.get('seo_score'),
-                        'accessibility_score': lighthouse_result.get('accessibility_score'),
-                        'lcp': lighthouse_result.get('lcp'),
-                        'cls': lighthouse_result.get('cls')
-                    },
-                    token=token,
-                    documentation_context=documentation_context,
-                    **req_ai_analysis_params
-                )
-
-                # Extraer métricas de uso y contenido
-                usage = ai_analysis.get('usage', {})
-                content = ai_analysis.get('content', '')
-
-                ai_analysis_data = {
-                    'content': content,
-                    'usage': usage,
-                    'generated_at': datetime.utcnow().isoformat(),
-                    'model': 'deepseek-v4-flash'
-                }
-            except Exception as ai_error:
-                print(f"⚠️  Error en análisis de IA: {ai_error}")
-                ai_analysis_data = {
-                    'error': str(ai_error),
-                    'status': 'failed'
-                }
-
-        _seo_analyzer = SEOAnalyzer(url=extract_domain(webpage.url),
-                                    html_content=lighthouse_result.get('html_content_raw', ''))
-        seo_analysis = _seo_analyzer.run_full_analysis()
-
-        # Actualizar resultados en la base de datos
-        with db_manager.sync_session_context() as session:
-            audit = session.get(AuditReport, audit_id)
-            #eliminar html y htl_raw
-            lighthouse_result.pop('html_content', None)
-            lighthouse_result.pop('html_content_raw', None)
-            if audit:
-                # Extraer métricas
-                audit.performance_score = lighthouse_result.get('performance_score')
-                audit.seo_score = lighthouse_result.get('seo_score')
-                audit.accessibility_score = lighthouse_result.get('accessibility_score')
-                audit.best_practices_score = lighthouse_result.get('best_practices_score')
-                audit.lcp = lighthouse_result.get('lcp')
-                audit.fid = lighthouse_result.get('fid')
-                audit.cls = lighthouse_result.get('cls')
-                audit.lighthouse_data = lighthouse_result
-
-                # Asignar datos de IA y guardar tokens
-                if ai_analysis_data:
-                    audit.ai_suggestions = ai_analysis_data
-                    # Guardar tokens en columnas dedicadas si existen en ai_analysis_data
-                    if 'usage' in ai_analysis_data:
-                        usage_data = ai_analysis_data['usage']
-                        audit.input_tokens = usage_data.get('prompt_tokens', 0)
-                        audit.output_tokens = usage_data.get('completion_tokens', 0)
-
-                audit.status = AuditStatus.COMPLETED
-                audit.completed_at = datetime.utcnow()
-                audit.seo_analysis = seo_analysis
-
-                audit.report_pdf_path = None
-                audit.report_word_path = None
-                audit.report_excel_path = None
-
-                session.add(audit)
-                # No llamar commit aquí, el context manager lo hace automáticamente
-
-        print(f"✅ Auditoría completada: {audit_id}")
-    except Exception as e:
-        print(f"❌ Error en auditoría {audit_id}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-
-        # Intentar actualizar el audit con el error
-        try:
-            with db_manager.sync_session_context() as session:
-                if audit is None:
-                    audit = session.get(AuditReport, audit_id)
-
-                if audit:
-                    audit.status = AuditStatus.FAILED
-                    audit.error_message = str(e)
-                    audit.completed_at = datetime.utcnow()
-                    session.add(audit)
-                    # No llamar commit aquí, el context manager lo hace automáticamente
-        except Exception as inner_error:
-            print(f"❌ Error al guardar estado de fallo: {inner_error}")
-
-
 @router.post("/audits", response_model=audit_schemas.AuditTaskResponse, status_code=status.HTTP_202_ACCEPTED)
 async def create_audit(
         audit_request: audit_schemas.AuditCreate,
@@ -233,12 +70,15 @@ async def create_audit(
     auth_token = getattr(current_user, '_token', None) or "dummy-token"
 
     # Lanzar tarea en segundo plano
-    background_tasks.add_task(
-        run_audit_task,
+    await dispatch_job(
+        background_tasks,
+        JobType.AUDIT,
+        entity_id=audit.id,
         audit_id=audit.id,
-        webpage=webpage,
+        web_page_id=webpage.id,
         include_ai=audit_request.include_ai_analysis,
-        token=auth_token
+        token=auth_token,
+        sample_runs=audit_request.sample_runs
     )
 
     return audit_schemas.AuditTaskResponse(
@@ -603,8 +443,10 @@ async def create_schema_audit(
 
     auth_token = getattr(current_user, '_token', None) or "dummy-token"
 
-    background_tasks.add_task(
-        run_schema_audit_task,
+    await dispatch_job(
+        background_tasks,
+        JobType.SCHEMA_AUDIT,
+        entity_id=schema_audit.id,
         schema_audit_id=schema_audit.id,
         token=auth_token
     )
@@ -781,6 +623,8 @@ async def create_url_validation(
         ai_instruction=request_body.ai_instruction,
         urls_raw=request_body.urls,
         status=UrlValidationStatus.PENDING,
+        processed_urls=0,
+        total_urls=len(urls),
     )
 
     session.add(validation)
@@ -790,8 +634,10 @@ async def create_url_validation(
     # 4. Lanzar tarea en segundo plano
     auth_token = getattr(current_user, "_token", None) or "dummy-token"
 
-    background_tasks.add_task(
-        run_url_validation_task,
+    await dispatch_job(
+        background_tasks,
+        JobType.URL_VALIDATION,
+        entity_id=validation.id,
         validation_id=validation.id,
         urls=urls,
         proposed_schema=proposed_schema,
@@ -843,6 +689,8 @@ async def list_url_validations(
             description_validation,
             status,
             global_severity,
+            processed_urls,
+            total_urls,
             input_tokens,
             output_tokens,
             error_message,
@@ -872,6 +720,8 @@ async def list_url_validations(
                 description_validation=row["description_validation"],
                 status=row["status"],
                 global_severity=row["global_severity"],
+                processed_urls=row["processed_urls"],
+                total_urls=row["total_urls"],
                 input_tokens=row["input_tokens"],
                 output_tokens=row["output_tokens"],
                 error_message=row["error_message"],
@@ -924,12 +774,18 @@ async def get_url_validation(
 async def rerun_url_validation(
         validation_id: UUID,
         background_tasks: BackgroundTasks,
+        resume: bool = Query(
+            False,
+            description="Conservar los resultados ya guardados y procesar solo las URLs faltantes o con error",
+        ),
         current_user: User = Depends(get_current_user),
         session=Depends(get_session),
 ):
     """
     Vuelve a ejecutar una validación de URLs completa sobre el mismo registro.
     Re-analiza todas las URLs conservando el mismo ID. No crea un registro nuevo.
+    Con ``resume=true`` retoma una validación interrumpida sin repetir las URLs
+    que ya tienen resultado.
     """
     stmt = select(AuditUrlValidation).where(
         AuditUrlValidation.id == validation_id,
@@ -990,7 +846,12 @@ async def rerun_url_validation(
 
     # Resetear el registro para nueva ejecución
     validation.status = UrlValidationStatus.PENDING
-    validation.results_json = []
+    if not resume:
+        validation.results_json = []
+        validation.processed_urls = 0
+        validation.input_tokens = 0
+        validation.output_tokens = 0
+    validation.total_urls = len(urls)
     validation.global_severity = None
     validation.error_message = None
     validation.completed_at = None
@@ -998,8 +859,10 @@ async def rerun_url_validation(
     await session.commit()
 
     auth_token = getattr(current_user, "_token", None) or "dummy-token"
-    background_tasks.add_task(
-        run_url_validation_task,
+    await dispatch_job(
+        background_tasks,
+        JobType.URL_VALIDATION,
+        entity_id=validation.id,
         validation_id=validation.id,
         urls=urls,
         proposed_schema=proposed_schema,
@@ -1082,8 +945,10 @@ async def rerun_url_validation_single(
         )
 
     auth_token = getattr(current_user, "_token", None) or "dummy-token"
-    background_tasks.add_task(
-        run_url_validation_single_url_task,
+    await dispatch_job(
+        background_tasks,
+        JobType.URL_VALIDATION_SINGLE,
+        entity_id=validation.id,
         validation_id=validation.id,
         target_url=url,
         proposed_schema=proposed_schema,
@@ -1600,14 +1465,17 @@ async def audits_compare(
     auth_token = getattr(current_user, '_token', None) or "dummy-token"
 
     # Lanzar tarea en segundo plano
-    background_tasks.add_task(
-        run_comparison_task,
+    await dispatch_job(
+        background_tasks,
+        JobType.COMPARISON,
+        entity_id=comparison.id,
         comparison_id=comparison.id,
         base_web_page_id=audit_request.web_page_id,
         competitor_ids=audit_request.web_page_id_to_compare,
         include_ai=audit_request.include_ai_analysis,
         token=auth_token,
-        user_id=current_user.id
+        user_id=current_user.id,
+        max_audit_age_hours=audit_request.max_audit_age_hours
     )
 
     return audit_schemas.ComparisonTaskResponse(
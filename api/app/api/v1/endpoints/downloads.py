@@ -1,33 +1,60 @@
 """
 Endpoints para descargar reportes generados.
 Regeneran PDF/Word bajo demanda cuando el archivo no existe o expiró.
+
+Con ``?wait=false`` la descarga no espera al render: responde 202 con
+``Location`` (la misma URL) y ``Retry-After`` mientras el reporte se
+construye en segundo plano, y el archivo cuando ya está listo.
 """
 from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, Response
 from sqlmodel import select
 
 from app.api.deps import get_current_user
 from app.core.database import get_session
+from app.helpers.file_download import file_download_response
 from app.models import AuditComparison, AuditReport, AuditSchemaReview, AuditUrlValidation
 from app.models.user import User
+from app.services.report_artifacts import get_report_artifact_store
 from app.services.report_lifecycle import get_report_lifecycle_service
 
 router = APIRouter()
 
 report_lifecycle = get_report_lifecycle_service()
+artifact_store = get_report_artifact_store()
+
+_PDF_MEDIA_TYPE = "application/pdf"
+_WORD_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+_EXCEL_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+_POLL_RETRY_AFTER_SECONDS = 3
 
+_WAIT_QUERY = Query(
+    True,
+    description="False: responder 202 mientras el reporte se genera y consultar de nuevo la misma URL",
+)
 
-def _build_download_response(file_path: str, media_type: str) -> FileResponse:
+
+def _build_download_response(request: Request, file_path: str, media_type: str) -> Response:
     path = Path(file_path)
     if not path.exists():
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Archivo no encontrado en el servidor",
         )
-    return FileResponse(path=str(path), media_type=media_type, filename=path.name)
+
+    # ETag = clave de contenido del artefacto: el cliente revalida o reanuda
+    # (Range + If-Range) sin volver a descargar el reporte completo
+    return file_download_response(
+        request,
+        path,
+        media_type,
+        etag=artifact_store.etag(path),
+        extra_headers={"Cache-Control": "private, no-cache"},
+    )
 
 
 def _raise_generation_error(exc: ValueError) -> None:
@@ -37,6 +64,32 @@ def _raise_generation_error(exc: ValueError) -> None:
     ) from exc
 
 
+async def _serve_report(
+    request: Request,
+    session,
+    entity: Any,
+    attr_name: str,
+    ensure: Callable[..., Awaitable[Optional[str]]],
+    media_type: str,
+    wait: bool,
+):
+    try:
+        if wait:
+            file_path = await ensure(session, entity)
+        else:
+            file_path = await report_lifecycle.ensure_in_background(session, entity, attr_name, ensure)
+    except ValueError as exc:
+        _raise_generation_error(exc)
+
+    if file_path is None:
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"status": "generating", "detail": "El reporte se está generando"},
+            headers={"Location": str(request.url), "Retry-After": str(_POLL_RETRY_AFTER_SECONDS)},
+        )
+    return _build_download_response(request, file_path, media_type)
+
+
 async def _get_owned_audit(session, audit_id: UUID, current_user: User) -> AuditReport:
     statement = select(AuditReport).where(
         AuditReport.id == audit_id,
@@ -108,37 +161,47 @@ async def _get_owned_url_validation(
 @router.get("/audits/{audit_id}/download/pdf")
 async def download_audit_pdf(
     audit_id: UUID,
+    request: Request,
+    wait: bool = _WAIT_QUERY,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
     audit = await _get_owned_audit(session, audit_id, current_user)
-    try:
-        file_path = await report_lifecycle.ensure_audit_pdf(session, audit)
-    except ValueError as exc:
-        _raise_generation_error(exc)
-    return _build_download_response(file_path, "application/pdf")
+    return await _serve_report(
+        request,
+        session,
+        audit,
+        "report_pdf_path",
+        report_lifecycle.ensure_audit_pdf,
+        _PDF_MEDIA_TYPE,
+        wait,
+    )
 
 
 @router.get("/audits/{audit_id}/download/word")
 async def download_audit_word(
     audit_id: UUID,
+    request: Request,
+    wait: bool = _WAIT_QUERY,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
     audit = await _get_owned_audit(session, audit_id, current_user)
-    try:
-        file_path = await report_lifecycle.ensure_audit_word(session, audit)
-    except ValueError as exc:
-        _raise_generation_error(exc)
-    return _build_download_response(
-        file_path,
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    return await _serve_report(
+        request,
+        session,
+        audit,
+        "report_word_path",
+        report_lifecycle.ensure_audit_word,
+        _WORD_MEDIA_TYPE,
+        wait,
     )
 
 
 @router.get("/audits/{audit_id}/download/excel")
 async def download_audit_excel(
     audit_id: UUID,
+    request: Request,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
@@ -149,45 +212,56 @@ async def download_audit_excel(
             detail="Reporte Excel no disponible",
         )
     return _build_download_response(
+        request,
         audit.report_excel_path,
-        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        _EXCEL_MEDIA_TYPE,
     )
 
 
 @router.get("/audits/comparisons/{comparison_id}/download/pdf")
 async def download_comparison_pdf(
     comparison_id: UUID,
+    request: Request,
+    wait: bool = _WAIT_QUERY,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
     comparison = await _get_owned_comparison(session, comparison_id, current_user)
-    try:
-        file_path = await report_lifecycle.ensure_comparison_pdf(session, comparison)
-    except ValueError as exc:
-        _raise_generation_error(exc)
-    return _build_download_response(file_path, "application/pdf")
+    return await _serve_report(
+        request,
+        session,
+        comparison,
+        "report_pdf_path",
+        report_lifecycle.ensure_comparison_pdf,
+        _PDF_MEDIA_TYPE,
+        wait,
+    )
 
 
 @router.get("/audits/comparisons/{comparison_id}/download/word")
 async def download_comparison_word(
     comparison_id: UUID,
+    request: Request,
+    wait: bool = _WAIT_QUERY,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
     comparison = await _get_owned_comparison(session, comparison_id, current_user)
-    try:
-        file_path = await report_lifecycle.ensure_comparison_word(session, comparison)
-    except ValueError as exc:
-        _raise_generation_error(exc)
-    return _build_download_response(
-        file_path,
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    return await _serve_report(
+        request,
+        session,
+        comparison,
+        "report_word_path",
+        report_lifecycle.ensure_comparison_word,
+        _WORD_MEDIA_TYPE,
+        wait,
     )
 
 
 @router.get("/audits/comparisons/{comparison_id}/download/excel")
 async def download_comparison_excel(
     comparison_id: UUID,
+    request: Request,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
@@ -198,132 +272,173 @@ async def download_comparison_excel(
             detail="Reporte Excel no disponible",
         )
     return _build_download_response(
+        request,
         comparison.report_excel_path,
-        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        _EXCEL_MEDIA_TYPE,
     )
 
 
 @router.get("/audits/comparisons/{comparison_id}/proposal/download/pdf")
 async def download_comparison_proposal_pdf(
     comparison_id: UUID,
+    request: Request,
+    wait: bool = _WAIT_QUERY,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
     comparison = await _get_owned_comparison(session, comparison_id, current_user)
     token = getattr(current_user, "_token", None)
-    try:
-        file_path = await report_lifecycle.ensure_comparison_proposal_pdf(session, comparison, token)
-    except ValueError as exc:
-        _raise_generation_error(exc)
-    return _build_download_response(file_path, "application/pdf")
+    return await _serve_report(
+        request,
+        session,
+        comparison,
+        "proposal_report_pdf_path",
+        lambda db_session, entity, **options: report_lifecycle.ensure_comparison_proposal_pdf(
+            db_session, entity, token, **options
+        ),
+        _PDF_MEDIA_TYPE,
+        wait,
+    )
 
 
 @router.get("/audits/comparisons/{comparison_id}/proposal/download/word")
 async def download_comparison_proposal_word(
     comparison_id: UUID,
+    request: Request,
+    wait: bool = _WAIT_QUERY,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
     comparison = await _get_owned_comparison(session, comparison_id, current_user)
     token = getattr(current_user, "_token", None)
-    try:
-        file_path = await report_lifecycle.ensure_comparison_proposal_word(session, comparison, token)
-    except ValueError as exc:
-        _raise_generation_error(exc)
-    return _build_download_response(
-        file_path,
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    return await _serve_report(
+        request,
+        session,
+        comparison,
+        "proposal_report_word_path",
+        lambda db_session, entity, **options: report_lifecycle.ensure_comparison_proposal_word(
+            db_session, entity, token, **options
+        ),
+        _WORD_MEDIA_TYPE,
+        wait,
     )
 
 
 @router.get("/audits/schemas/{schema_audit_id}/download/pdf")
 async def download_schema_audit_pdf(
     schema_audit_id: UUID,
+    request: Request,
+    wait: bool = _WAIT_QUERY,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
     schema_audit = await _get_owned_schema_audit(session, schema_audit_id, current_user)
-    try:
-        file_path = await report_lifecycle.ensure_schema_pdf(session, schema_audit)
-    except ValueError as exc:
-        _raise_generation_error(exc)
-    return _build_download_response(file_path, "application/pdf")
+    return await _serve_report(
+        request,
+        session,
+        schema_audit,
+        "report_pdf_path",
+        report_lifecycle.ensure_schema_pdf,
+        _PDF_MEDIA_TYPE,
+        wait,
+    )
 
 
 @router.get("/audits/schemas/{schema_audit_id}/download/word")
 async def download_schema_audit_word(
     schema_audit_id: UUID,
+    request: Request,
+    wait: bool = _WAIT_QUERY,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
     schema_audit = await _get_owned_schema_audit(session, schema_audit_id, current_user)
-    try:
-        file_path = await report_lifecycle.ensure_schema_word(session, schema_audit)
-    except ValueError as exc:
-        _raise_generation_error(exc)
-    return _build_download_response(
-        file_path,
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    return await _serve_report(
+        request,
+        session,
+        schema_audit,
+        "report_word_path",
+        report_lifecycle.ensure_schema_word,
+        _WORD_MEDIA_TYPE,
+        wait,
     )
 
 
 @router.get("/audits/url-validations/{validation_id}/download/pdf")
 async def download_url_validation_pdf(
     validation_id: UUID,
+    request: Request,
+    wait: bool = _WAIT_QUERY,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
     validation = await _get_owned_url_validation(session, validation_id, current_user)
-    try:
-        file_path = await report_lifecycle.ensure_url_validation_pdf(session, validation)
-    except ValueError as exc:
-        _raise_generation_error(exc)
-    return _build_download_response(file_path, "application/pdf")
+    return await _serve_report(
+        request,
+        session,
+        validation,
+        "report_pdf_path",
+        report_lifecycle.ensure_url_validation_pdf,
+        _PDF_MEDIA_TYPE,
+        wait,
+    )
 
 
 @router.get("/audits/url-validations/{validation_id}/download/word")
 async def download_url_validation_word(
     validation_id: UUID,
+    request: Request,
+    wait: bool = _WAIT_QUERY,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
     validation = await _get_owned_url_validation(session, validation_id, current_user)
-    try:
-        file_path = await report_lifecycle.ensure_url_validation_word(session, validation)
-    except ValueError as exc:
-        _raise_generation_error(exc)
-    return _build_download_response(
-        file_path,
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    return await _serve_report(
+        request,
+        session,
+        validation,
+        "report_word_path",
+        report_lifecycle.ensure_url_validation_word,
+        _WORD_MEDIA_TYPE,
+        wait,
     )
 
 
 @router.get("/audits/url-validations/{validation_id}/global/download/pdf")
 async def download_url_validation_global_pdf(
     validation_id: UUID,
+    request: Request,
+    wait: bool = _WAIT_QUERY,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
     validation = await _get_owned_url_validation(session, validation_id, current_user)
-    try:
-        file_path = await report_lifecycle.ensure_url_validation_global_pdf(session, validation)
-    except ValueError as exc:
-        _raise_generation_error(exc)
-    return _build_download_response(file_path, "application/pdf")
+    return await _serve_report(
+        request,
+        session,
+        validation,
+        "global_report_pdf_path",
+        report_lifecycle.ensure_url_validation_global_pdf,
+        _PDF_MEDIA_TYPE,
+        wait,
+    )
 
 
 @router.get("/audits/url-validations/{validation_id}/global/download/word")
 async def download_url_validation_global_word(
     validation_id: UUID,
+    request: Request,
+    wait: bool = _WAIT_QUERY,
     current_user: User = Depends(get_current_user),
     session=Depends(get_session),
 ):
     validation = await _get_owned_url_validation(session, validation_id, current_user)
-    try:
-        file_path = await report_lifecycle.ensure_url_validation_global_word(session, validation)
-    except ValueError as exc:
-        _raise_generation_error(exc)
-    return _build_download_response(
-        file_path,
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    return await _serve_report(
+        request,
+        session,
+        validation,
+        "global_report_word_path",
+        report_lifecycle.ensure_url_validation_global_word,
+        _WORD_MEDIA_TYPE,
+        wait,
     )
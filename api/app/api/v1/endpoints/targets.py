@@ -343,6 +343,7 @@ async def update_target_html(
 )
 async def get_target_html(
         target_url: str,
+        refresh: bool = Query(False, description="Ignorar el snapshot en caché y renderizar de nuevo"),
         session=Depends(get_session),
 ):
     """
@@ -366,7 +367,11 @@ async def get_target_html(
     try:
         from app.services.audit_engine import get_audit_engine
         engine = get_audit_engine()
-        html = await engine.fetch_html(target.url if target else target_url, timeout_ms=30_000)
+        html = await engine.fetch_html(
+            target.url if target else target_url,
+            timeout_ms=30_000,
+            max_age=0 if refresh else None
+        )
     except Exception as scrape_err:
         print(f"⚠️  Scraping bloqueado para {target_url}: {scrape_err} — intentando fallback")
         html = None
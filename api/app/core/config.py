@@ -3,7 +3,7 @@ Configuración central de la aplicación usando Pydantic Settings.
 Lee variables de entorno y proporciona valores por defecto.
 """
 from pydantic_settings import BaseSettings
-from typing import Literal
+from typing import Dict, Literal
 from functools import lru_cache
 
 
@@ -55,6 +55,102 @@ class Settings(BaseSettings):
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     REDIS_PASSWORD: str = ""
+    # Conexiones máximas del pool compartido por proceso
+    REDIS_MAX_CONNECTIONS: int = 50
+
+    # Pool de navegadores (Playwright/Chromium)
+    BROWSER_POOL_SIZE: int = 2
+    BROWSER_POOL_CONTEXTS_PER_BROWSER: int = 4
+    BROWSER_POOL_MAX_PAGES_PER_BROWSER: int = 100
+
+    # Cola de trabajos (Redis) + worker
+    # Con JOB_QUEUE_ENABLED=False las tareas corren en BackgroundTasks del API (modo local).
+    JOB_QUEUE_ENABLED: bool = False
+    JOB_WORKER_CONCURRENCY: Dict[str, int] = {
+        "audit": 2,
+        "comparison": 2,
+        "schema_audit": 4,
+        "url_validation": 1,
+        "url_validation_single": 2,
+    }
+    JOB_VISIBILITY_TIMEOUT_SECONDS: int = 300
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF_SECONDS: float = 30.0
+    JOB_RETRY_BACKOFF_MAX_SECONDS: float = 600.0
+    # Vida máxima del estado de un trabajo en Redis (payload con token incluido)
+    JOB_PAYLOAD_TTL_SECONDS: int = 24 * 60 * 60
+    JOB_ORPHAN_GRACE_SECONDS: int = 900
+    JOB_RECOVERY_INTERVAL_SECONDS: int = 60
+
+    # Capa de ejecución: BD síncrona en hilos, parseo/validación en procesos
+    # (CPU_PROCESS_POOL_SIZE=0 ejecuta el trabajo de CPU en el pool de hilos)
+    DB_THREAD_POOL_SIZE: int = 8
+    CPU_PROCESS_POOL_SIZE: int = 2
+    # Render de reportes PDF/Word (0 = pool de hilos)
+    REPORT_PROCESS_POOL_SIZE: int = 2
+    # Presupuesto del almacén de reportes (expulsión LRU al superarlo)
+    REPORT_STORE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+
+    # Cliente HTTP compartido para la API de IA (keep-alive entre llamadas)
+    AI_HTTP_MAX_CONNECTIONS: int = 32
+    AI_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 16
+    AI_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    # Peticiones simultáneas por host upstream ("default" aplica al resto)
+    AI_UPSTREAM_CONCURRENCY: Dict[str, int] = {"default": 8}
+    # Techo de tokens del resumen de página que sustituye al HTML crudo en el prompt SEO
+    AI_PAGE_DIGEST_MAX_TOKENS: int = 6000
+    # Caché de respuestas de IA (hash del prompt renderizado); TTL en segundos por plantilla
+    AI_RESPONSE_CACHE_ENABLED: bool = True
+    AI_RESPONSE_CACHE_TTL_SECONDS: Dict[str, int] = {
+        "default": 86400,
+        "seo_analysis": 3600,
+        "audit_comparison": 36000,
+    }
+
+    # Planificador de validación de URLs (ventana adaptativa + cortesía por host)
+    URL_VALIDATION_WINDOW_INITIAL: int = 5
+    URL_VALIDATION_WINDOW_MIN: int = 2
+    URL_VALIDATION_WINDOW_MAX: int = 20
+    URL_VALIDATION_TARGET_LATENCY_SECONDS: float = 15.0
+    URL_VALIDATION_HOST_RATE_PER_SECOND: float = 0.5
+    URL_VALIDATION_HOST_BURST: int = 2
+    URL_VALIDATION_AI_CONCURRENCY: int = 8
+    # Checkpoint de results_json cada N URLs o cada N segundos (lo que ocurra antes)
+    URL_VALIDATION_CHECKPOINT_EVERY: int = 5
+    URL_VALIDATION_CHECKPOINT_SECONDS: float = 10.0
+
+    # Análisis de IA simultáneos (competidores + schemas) por comparación
+    COMPARISON_AI_CONCURRENCY: int = 4
+    # Espera máxima por las re-auditorías de competidores (max_audit_age_hours)
+    COMPARISON_REFRESH_DEADLINE_SECONDS: int = 600
+
+    # Fetch HTTP sin navegador antes del render para extraer schemas
+    STATIC_FETCH_ENABLED: bool = True
+    STATIC_FETCH_TIMEOUT_SECONDS: float = 10.0
+    STATIC_FETCH_MAX_CONNECTIONS: int = 64
+    STATIC_FETCH_MAX_BYTES: int = 5_000_000
+
+    # Throttling de red/CPU al medir Web Vitals: none, desktop o mobile
+    AUDIT_THROTTLING_PROFILE: str = "desktop"
+    # Muestreo de rendimiento: cargas en frío por auditoría (1 = sin muestreo),
+    # recargas en caliente adicionales y desviaciones que separan cambio de ruido
+    AUDIT_SAMPLE_RUNS: int = 1
+    AUDIT_SAMPLE_MAX_RUNS: int = 7
+    AUDIT_SAMPLE_WARM_RUNS: int = 1
+    AUDIT_COMPARISON_NOISE_SIGMAS: float = 2.0
+
+    # Caché de snapshots HTML compartida por fetch_html / run_lighthouse_audit
+    HTML_SNAPSHOT_CACHE_ENABLED: bool = True
+    HTML_SNAPSHOT_FRESHNESS_SECONDS: int = 900
+    HTML_SNAPSHOT_RETENTION_SECONDS: int = 86400
+
+    # Strings de al menos este tamaño (HTML) se guardan en caché como blob deduplicado
+    CACHE_BLOB_MIN_BYTES: int = 32768
+    # TTL de los blobs referenciados solo por entradas sin TTL (se renueva al reescribirlas)
+    CACHE_PERSISTENT_BLOB_TTL_SECONDS: int = 2592000
+    # Vida mínima del set de etiquetas por tabla y llaves por lote al invalidar
+    CACHE_TAG_TTL_SECONDS: int = 604800
+    CACHE_INVALIDATION_BATCH_SIZE: int = 500
 
     class Config:
         env_file = ".env"
@@ -78,6 +174,12 @@ class Settings(BaseSettings):
             f"{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
         )
 
+    @property
+    def REDIS_URL(self) -> str:
+        """Construir URL de conexión a Redis"""
+        password_part = f":{self.REDIS_PASSWORD}@" if self.REDIS_PASSWORD else ""
+        return f"redis://{password_part}{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
+
     @property
     def DATABASE_URL(self) -> str:
         """URL por defecto (asíncrona)"""
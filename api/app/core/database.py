@@ -5,7 +5,6 @@ Provee una capa de abstracción para conexiones asíncronas y síncronas.
 from sqlmodel import SQLModel, Session, create_engine
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
 from typing import AsyncGenerator, Generator, Optional
 from contextlib import contextmanager, asynccontextmanager
 
@@ -60,9 +59,11 @@ class DatabaseManager:
                 'pool_pre_ping': True,
             }
 
-            # StaticPool para local (no acepta pool_size/max_overflow)
+            # Una conexión por hilo de run_db: una conexión compartida (StaticPool)
+            # mezclaría transacciones concurrentes entre hilos
             if self.settings.ENVIRONMENT == "local":
-                engine_kwargs['poolclass'] = StaticPool
+                engine_kwargs['pool_size'] = self.settings.DB_THREAD_POOL_SIZE
+                engine_kwargs['max_overflow'] = 0
             else:
                 # Para otros ambientes, usar pool normal con configuración
                 engine_kwargs['pool_size'] = 5
@@ -0,0 +1,183 @@
+"""
+Capa de ejecución para trabajo bloqueante fuera del event loop.
+
+- ``run_db``:  llamadas síncronas a la BD (psycopg2) en un pool de hilos acotado.
+- ``run_cpu``: parseo/validación intensivos en CPU en un pool de procesos.
+               Las funciones deben ser de nivel módulo (picklables).
+- ``run_report``: render de reportes PDF/Word en un pool de procesos propio,
+               para que un lote de descargas no deje sin workers a ``run_cpu``.
+- ``EventLoopMonitor``: mide cuánto tiempo estuvo bloqueado el event loop
+  (histograma Prometheus ``event_loop_lag_seconds``) para verificar que la
+  latencia del API se mantiene estable mientras corren auditorías.
+"""
+import asyncio
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from prometheus_client import Histogram
+
+from app.core.config import get_settings
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Retraso observado del event loop respecto al intervalo esperado",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+
+class ExecutionLayer:
+    """Pools compartidos (lazy) para trabajo de BD y de CPU."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._db_pool: Optional[ThreadPoolExecutor] = None
+        self._cpu_pool: Optional[ProcessPoolExecutor] = None
+        self._report_pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def db_pool(self) -> ThreadPoolExecutor:
+        if self._db_pool is None:
+            self._db_pool = ThreadPoolExecutor(
+                max_workers=self.settings.DB_THREAD_POOL_SIZE,
+                thread_name_prefix="db-sync",
+            )
+        return self._db_pool
+
+    @property
+    def cpu_pool(self) -> Optional[ProcessPoolExecutor]:
+        """Pool de procesos; None si CPU_PROCESS_POOL_SIZE=0 (se usa el pool de hilos)."""
+        if self._cpu_pool is None and self.settings.CPU_PROCESS_POOL_SIZE > 0:
+            # spawn: evita heredar hilos/conexiones del proceso padre vía fork
+            self._cpu_pool = ProcessPoolExecutor(
+                max_workers=self.settings.CPU_PROCESS_POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._cpu_pool
+
+    @property
+    def report_pool(self) -> Optional[ProcessPoolExecutor]:
+        """Pool de procesos de reportes; None si REPORT_PROCESS_POOL_SIZE=0."""
+        if self._report_pool is None and self.settings.REPORT_PROCESS_POOL_SIZE > 0:
+            self._report_pool = ProcessPoolExecutor(
+                max_workers=self.settings.REPORT_PROCESS_POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._report_pool
+
+    async def run_db(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.db_pool, functools.partial(fn, *args, **kwargs))
+
+    async def run_cpu(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        pool = self.cpu_pool
+        if pool is None:
+            return await loop.run_in_executor(self.db_pool, call)
+        try:
+            return await loop.run_in_executor(pool, call)
+        except BrokenProcessPool:
+            # Un proceso murió (OOM, segfault en lxml...): recrear el pool y reintentar una vez
+            log.warning("Pool de procesos roto; recreando y reintentando %s", getattr(fn, "__name__", fn))
+            self._cpu_pool = None
+            return await loop.run_in_executor(self.cpu_pool, call)
+
+    async def run_report(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        pool = self.report_pool
+        if pool is None:
+            return await loop.run_in_executor(self.db_pool, call)
+        try:
+            return await loop.run_in_executor(pool, call)
+        except BrokenProcessPool:
+            log.warning("Pool de reportes roto; recreando y reintentando %s", getattr(fn, "__name__", fn))
+            self._report_pool = None
+            return await loop.run_in_executor(self.report_pool, call)
+
+    def shutdown(self):
+        if self._report_pool is not None:
+            self._report_pool.shutdown(wait=False, cancel_futures=True)
+            self._report_pool = None
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown(wait=False, cancel_futures=True)
+            self._cpu_pool = None
+        if self._db_pool is not None:
+            self._db_pool.shutdown(wait=False, cancel_futures=True)
+            self._db_pool = None
+
+
+class EventLoopMonitor:
+    """
+    Duerme ``interval`` segundos en bucle y registra el retraso extra con el
+    que despierta: ese retraso es tiempo en que el loop estuvo bloqueado.
+    """
+
+    def __init__(self, interval: float = 0.5, warn_threshold: float = 0.25):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.samples = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.samples += 1
+            EVENT_LOOP_LAG.observe(lag)
+            if lag >= self.warn_threshold:
+                log.warning("⏱️ Event loop bloqueado %.3fs", lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "last_lag_seconds": round(self.last_lag, 4),
+            "max_lag_seconds": round(self.max_lag, 4),
+            "samples": self.samples,
+        }
+
+
+# Instancias globales
+execution_layer = ExecutionLayer()
+event_loop_monitor = EventLoopMonitor()
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Ejecuta una función síncrona de BD en el pool de hilos acotado."""
+    return await execution_layer.run_db(fn, *args, **kwargs)
+
+
+async def run_cpu(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Ejecuta una función CPU-intensiva (picklable) en el pool de procesos."""
+    return await execution_layer.run_cpu(fn, *args, **kwargs)
+
+
+async def run_report(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Ejecuta el render de un reporte (picklable) en el pool de procesos de reportes."""
+    return await execution_layer.run_report(fn, *args, **kwargs)
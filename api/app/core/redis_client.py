@@ -0,0 +1,54 @@
+"""
+Pools de conexiones Redis compartidos por proceso.
+
+- ``get_async_redis()``: cliente asíncrono binario (``decode_responses=False``)
+  sobre un único ``ConnectionPool`` creado en el lifespan de FastAPI / worker.
+- ``get_sync_redis()``: cliente síncrono compartido para código que no corre
+  en el event loop (scripts, hilos de ``run_db``).
+"""
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import get_settings
+
+_async_pool: Optional[aioredis.ConnectionPool] = None
+_sync_client: Optional[redis.Redis] = None
+
+
+def init_redis_pool() -> None:
+    global _async_pool
+    if _async_pool is None:
+        settings = get_settings()
+        _async_pool = aioredis.ConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            decode_responses=False,
+        )
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Cliente ligero sobre el pool compartido (crea el pool si hace falta)."""
+    if _async_pool is None:
+        init_redis_pool()
+    return aioredis.Redis(connection_pool=_async_pool)
+
+
+async def close_redis_pool() -> None:
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.aclose()
+        _async_pool = None
+
+
+def get_sync_redis() -> redis.Redis:
+    global _sync_client
+    if _sync_client is None:
+        settings = get_settings()
+        _sync_client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            decode_responses=False,
+        )
+    return _sync_client
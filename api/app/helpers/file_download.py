@@ -0,0 +1,148 @@
+"""
+Respuestas de descarga de archivos con peticiones condicionales y por rangos.
+
+- ``If-None-Match`` / ``If-Modified-Since`` -> 304 sin cuerpo.
+- ``Range: bytes=...`` (un solo rango) -> 206 con ``Content-Range``; con
+  ``If-Range`` solo se honra si el archivo no cambió desde la descarga
+  interrumpida. Varios rangos se responden con el archivo completo (200).
+- El cuerpo se envía en trozos leídos del disco (``StreamingResponse``), sin
+  cargar el reporte completo en memoria.
+"""
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request, status
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+_SINGLE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def _content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Comparación débil (RFC 9110 §13.1.2): se ignora el prefijo W/
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    return bool(if_modified_since) and _not_modified_since(if_modified_since, mtime)
+
+
+def _requested_range(request: Request, etag: str, mtime: float, size: int) -> Optional[Tuple[int, int]]:
+    """(inicio, fin) inclusivos del rango pedido; None para el archivo completo."""
+    range_header = request.headers.get("range")
+    if not range_header:
+        return None
+
+    if_range = request.headers.get("if-range")
+    if if_range:
+        if if_range.startswith(("W/", '"')):
+            # If-Range exige comparación fuerte: un ETag débil nunca valida el rango
+            still_valid = if_range == etag and not etag.startswith("W/")
+        else:
+            still_valid = _not_modified_since(if_range, mtime)
+        if not still_valid:
+            return None
+
+    match = _SINGLE_RANGE.match(range_header.replace(" ", ""))
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Sufijo: los últimos N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def _iter_file(path: Path, start: int, end: int) -> Iterator[bytes]:
+    remaining = end - start + 1
+    with path.open("rb") as handle:
+        handle.seek(start)
+        while remaining > 0:
+            chunk = handle.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_download_response(
+    request: Request,
+    path: Path,
+    media_type: str,
+    etag: str,
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    stat = path.stat()
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        **(extra_headers or {}),
+    }
+
+    if _is_not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    headers["Content-Disposition"] = _content_disposition(path.name)
+    try:
+        byte_range = _requested_range(request, etag, stat.st_mtime, stat.st_size)
+    except RangeNotSatisfiable:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={**headers, "Content-Range": f"bytes */{stat.st_size}"},
+        )
+
+    if byte_range is None:
+        start, end, status_code = 0, stat.st_size - 1, status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        _iter_file(path, start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
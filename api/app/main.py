@@ -16,9 +16,17 @@ from starlette.middleware.base import RequestResponseEndpoint
 
 from app.core.config import settings
 from app.core.database import init_db
+from app.core.executors import event_loop_monitor, execution_layer
+from app.core.redis_client import close_redis_pool, init_redis_pool
 from app.core.security import clear_request_auth_context
 from app.api.v1.api import api_router
+from app.services.ai_client import close_ai_http_client
+from app.services.browser_pool import close_browser_pool, get_browser_pool, init_browser_pool
+from app.services.html_snapshot_cache import close_html_snapshot_cache
+from app.services.job_queue import close_job_queue
 from app.services.report_lifecycle import get_report_lifecycle_service
+from app.services.static_fetcher import close_static_http_client
+from app.services.token_counter import warm_token_encoders
 from app.shared.herandro_services_api.herandro_services_api_client import (
     close_hsa_client,
     init_hsa_client,
@@ -49,6 +57,25 @@ async def lifespan(app: FastAPI):
     )
     print(f"✅ Herandro Services API client inicializado → {settings.HSA_BASE_URL}")
 
+    # 3. Pool de conexiones Redis (caché) compartido por el proceso
+    init_redis_pool()
+
+    # 4. Pool de navegadores (los Chromium se lanzan bajo demanda)
+    try:
+        await init_browser_pool()
+        print("✅ Pool de navegadores inicializado")
+    except Exception as e:
+        print(f"⚠️  Pool de navegadores no disponible: {e}")
+
+    # 5. Encoders de tiktoken (se cargan una vez por proceso)
+    try:
+        warm_token_encoders()
+    except Exception as e:
+        print(f"⚠️  Encoders de tokens no disponibles: {e}")
+
+    # 6. Monitor de bloqueo del event loop (event_loop_lag_seconds)
+    event_loop_monitor.start()
+
     report_cleanup_task = asyncio.create_task(
         get_report_lifecycle_service().run_cleanup_loop()
     )
@@ -59,7 +86,15 @@ async def lifespan(app: FastAPI):
     report_cleanup_task.cancel()
     with suppress(asyncio.CancelledError):
         await report_cleanup_task
+    await event_loop_monitor.stop()
+    await close_browser_pool()
+    await close_job_queue()
+    await close_html_snapshot_cache()
+    await close_redis_pool()
     await close_hsa_client()
+    await close_ai_http_client()
+    await close_static_http_client()
+    execution_layer.shutdown()
     print("👋 Cerrando aplicación...")
 
 
@@ -148,4 +183,6 @@ async def health_check():
     return {
         "status": "healthy",
         "service": settings.PROJECT_NAME,
+        "browser_pool": get_browser_pool().stats(),
+        "event_loop": event_loop_monitor.stats(),
     }
@@ -81,6 +81,10 @@ class AuditUrlValidation(SQLModel, table=True):
         description="Lista de resultados por URL"
     )
 
+    # Progreso (se actualiza en cada checkpoint de results_json)
+    processed_urls: Optional[int] = Field(default=0)
+    total_urls: Optional[int] = Field(default=0)
+
     # Reportes individuales
     report_pdf_path: Optional[str] = Field(default=None, sa_column=Column(String, nullable=True))
     report_word_path: Optional[str] = Field(default=None, sa_column=Column(String, nullable=True))
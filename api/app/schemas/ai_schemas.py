@@ -117,6 +117,10 @@ class ChatCompletionResponse(BaseModel):
     content: Optional[str] = None
     generated_at: Optional[str] = None
     usage: Optional[ChatCompletionUsage] = None
+    # Respuesta servida desde la caché: ``usage`` va en cero y el uso de la
+    # llamada original (ya facturado) queda en ``cached_usage``
+    cached: bool = False
+    cached_usage: Optional[ChatCompletionUsage] = None
 
     def get_content(self) -> str:
         """Obtiene el contenido desde content top-level, message o delta."""
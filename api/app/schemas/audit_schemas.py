@@ -7,6 +7,7 @@ from typing import Optional, Dict, Any, List, Literal
 from uuid import UUID
 from datetime import datetime
 
+from app.core.config import settings
 from app.models import WebPage, ComparisonStatus, SchemaAuditStatus, SchemaAuditSourceType
 from app.models.audit import AuditStatus
 from app.models.audit_url_validation import UrlValidationStatus, UrlValidationSourceType
@@ -23,12 +24,28 @@ class AuditCreate(BaseModel):
         default=None,
         description="Contexto o documentación extra que se inyecta en los agentes de IA para mejorar las recomendaciones"
     )
+    sample_runs: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description=(
+            "Cargas en frío para medir rendimiento (mediana, p75 y dispersión), como máximo "
+            "AUDIT_SAMPLE_MAX_RUNS. None usa AUDIT_SAMPLE_RUNS"
+        )
+    )
+
+    @field_validator("sample_runs")
+    @classmethod
+    def validate_sample_runs(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v > settings.AUDIT_SAMPLE_MAX_RUNS:
+            raise ValueError(f"sample_runs admite como máximo {settings.AUDIT_SAMPLE_MAX_RUNS} cargas")
+        return v
 
     class Config:
         json_schema_extra = {
             "example": {
                 "web_page_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
                 "include_ai_analysis": True,
+                "sample_runs": 3,
                 "documentation_context": "Nuestro sitio vende tours de lujo en el Caribe. El público objetivo son viajeros de alto poder adquisitivo..."
             }
         }
@@ -47,12 +64,19 @@ class AuditCompare(BaseModel):
         description="Contexto o documentación extra que se inyecta en los agentes de IA para mejorar las recomendaciones"
     )
 
+    max_audit_age_hours: Optional[float] = Field(
+        default=None,
+        gt=0,
+        description="Si se indica, los competidores sin auditoría o con una más antigua se auditan de nuevo antes de comparar"
+    )
+
     class Config:
         json_schema_extra = {
             "example": {
                 "web_page_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
                 "web_page_id_to_compare": ["3fa85f64-5717-4562-b3fc-2c963f66afa6"],
                 "include_ai_analysis": True,
+                "max_audit_age_hours": 168,
                 "documentation_context": "Somos una clínica dental especializada en ortodoncia invisible para adultos en CDMX."
             }
         }
@@ -528,6 +552,8 @@ class AuditUrlValidationListItem(BaseModel):
     description_validation: Optional[str] = None
     status: UrlValidationStatus
     global_severity: Optional[str] = None
+    processed_urls: Optional[int] = 0
+    total_urls: Optional[int] = 0
     input_tokens: Optional[int] = 0
     output_tokens: Optional[int] = 0
     error_message: Optional[str] = None
@@ -582,6 +608,8 @@ class AuditUrlValidationDetailResponse(BaseModel):
     status: UrlValidationStatus
     global_severity: Optional[str] = None
     results_json: Optional[Any] = None
+    processed_urls: Optional[int] = 0
+    total_urls: Optional[int] = 0
     input_tokens: Optional[int] = 0
     output_tokens: Optional[int] = 0
     error_message: Optional[str] = None
@@ -1,28 +1,191 @@
+import asyncio
 import httpx
 import json
 import logging
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlparse
 from fastapi import HTTPException, status
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pathlib import Path
-import tiktoken
+from prometheus_client import Counter
 
 from app.helpers import extract_domain
 from app.schemas.ai_schemas import (
   ChatCompletionRequest,
   ChatCompletionResponse,
+  ChatCompletionUsage,
   ChatMessage,
   MessageRole
 )
 from app.core.config import settings
-from app.services.seo_analyzer import SEOAnalyzer
+from app.core.executors import run_cpu
+from app.services.cache import Cache
+from app.services.html_distiller import distill_page, fit_page_digest
+from app.services.seo_analyzer import run_full_seo_analysis
+from app.services.token_counter import (
+  DEFAULT_TOKEN_MODEL,
+  count_tokens,
+  count_tokens_async,
+  estimate_tokens,
+)
 
 logger = logging.getLogger(__name__)
 
+
+# ---------------------------------------------------------------------------
+# Cliente HTTP compartido (keep-alive) y límites de concurrencia por upstream
+# ---------------------------------------------------------------------------
+
+_http_client: Optional[httpx.AsyncClient] = None
+_upstream_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+# Caché de respuestas: llave = hash del modelo + mensajes renderizados + opciones
+_response_cache = Cache(table_name="ai_responses")
+
+AI_RESPONSE_CACHE_REQUESTS = Counter(
+  "ai_response_cache_requests_total",
+  "Llamadas a chat_completion por plantilla y resultado de la caché de respuestas",
+  ["template", "result"],
+)
+
+
+def get_ai_http_client() -> httpx.AsyncClient:
+  """
+  Cliente httpx compartido por todas las instancias de AIClient.
+  Reutiliza conexiones TCP/TLS entre llamadas; keepalive_expiry se mantiene
+  por debajo del idle timeout del upstream para no reutilizar sockets muertos.
+  Se fuerza HTTP/1.1 porque el upstream corta streams HTTP/2 inactivos.
+  """
+  global _http_client
+  if _http_client is None or _http_client.is_closed:
+    _http_client = httpx.AsyncClient(
+      timeout=httpx.Timeout(900.0, read=900.0),
+      limits=httpx.Limits(
+        max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.AI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.AI_HTTP_KEEPALIVE_EXPIRY_SECONDS
+      ),
+      http2=False
+    )
+  return _http_client
+
+
+async def close_ai_http_client() -> None:
+  global _http_client
+  if _http_client is not None:
+    await _http_client.aclose()
+    _http_client = None
+  _upstream_semaphores.clear()
+
+
+def _upstream_semaphore(url: str) -> asyncio.Semaphore:
+  """Semáforo por host upstream (AI_UPSTREAM_CONCURRENCY, clave 'default' como respaldo)."""
+  host = urlparse(url).netloc
+  semaphore = _upstream_semaphores.get(host)
+  if semaphore is None:
+    limits = settings.AI_UPSTREAM_CONCURRENCY
+    semaphore = asyncio.Semaphore(max(1, limits.get(host, limits.get("default", 8))))
+    _upstream_semaphores[host] = semaphore
+  return semaphore
+
+
+async def _iter_sse_events(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+  """
+  Parser SSE incremental: agrupa las líneas ``data:`` de cada evento
+  (terminado por línea vacía) y produce el payload de cada uno.
+  """
+  data_lines = []
+  async for line in lines:
+    if not line:
+      if data_lines:
+        yield "\n".join(data_lines)
+        data_lines = []
+      continue
+    if line.startswith(":"):
+      continue  # comentario / keep-alive
+    if line.startswith("data:"):
+      data_lines.append(line[5:].lstrip(" "))
+  if data_lines:
+    yield "\n".join(data_lines)
+
+
+def _is_stream_chunk(event: Any) -> bool:
+  if not isinstance(event, dict):
+    return False
+  if event.get("object") == "chat.completion.chunk":
+    return True
+  choices = event.get("choices") or []
+  return bool(choices) and isinstance(choices[0], dict) and "delta" in choices[0] and not choices[0].get("message")
+
+
+async def _read_ai_response(response: httpx.Response, default_model: str) -> Any:
+  """
+  Lee la respuesta sin cargar todo el cuerpo en memoria:
+  - SSE con la respuesta completa en un evento: devuelve el primer evento válido
+    y deja de leer.
+  - SSE por chunks (``delta``): agrega el contenido hasta ``[DONE]``.
+  - JSON plano: lo parsea al final.
+  """
+  lines = response.aiter_lines()
+  first_line = None
+  async for line in lines:
+    if line.strip():
+      first_line = line
+      break
+
+  if first_line is None:
+    raise ValueError("Respuesta vacía de la API de IA")
+
+  if not (first_line.startswith("data:") or first_line.startswith("event:") or first_line.startswith(":")):
+    body = [first_line]
+    async for line in lines:
+      body.append(line)
+    return json.loads("\n".join(body))
+
+  async def _all_lines():
+    yield first_line
+    async for line in lines:
+      yield line
+
+  aggregated = None
+  content_parts = []
+  async for raw_event in _iter_sse_events(_all_lines()):
+    if raw_event.strip() == "[DONE]":
+      break
+    try:
+      event = json.loads(raw_event)
+    except json.JSONDecodeError as e:
+      logger.error(f"Failed to parse SSE JSON data: {e} - Event: {raw_event[:500]}")
+      continue
+
+    if not _is_stream_chunk(event):
+      if aggregated is None:
+        return event
+      continue
+
+    if aggregated is None:
+      aggregated = {
+        "id": event.get("id"),
+        "object": "chat.completion",
+        "created": event.get("created"),
+        "model": event.get("model") or default_model,
+        "usage": None,
+      }
+    delta = (event.get("choices") or [{}])[0].get("delta") or {}
+    if isinstance(delta.get("content"), str):
+      content_parts.append(delta["content"])
+    if event.get("usage"):
+      aggregated["usage"] = event["usage"]
+
+  if aggregated is None:
+    raise ValueError("La respuesta SSE de la API de IA no contenía eventos válidos")
+  aggregated["content"] = "".join(content_parts)
+  return aggregated
+
+
 class AIClient:
   def __init__(self):
     self.base_url = settings.HERANDRO_API_URL
-    self.timeout = httpx.Timeout(900.0, read=900.0)
 
     prompts_dir = Path(__file__).parent.parent / "prompts"
     self.jinja_env = Environment(
@@ -32,100 +195,126 @@ class AIClient:
       lstrip_blocks=True
     )
 
-  def count_tokens(self, text: str, model: str = "gpt-3.5-turbo") -> int:
-    try:
-      encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-      encoding = tiktoken.get_encoding("cl100k_base")
-
-    return len(encoding.encode(text))
+  def count_tokens(self, text: str, model: str = DEFAULT_TOKEN_MODEL) -> int:
+    """Conteo exacto con el encoder cacheado del proceso (síncrono)."""
+    return count_tokens(text, model)
+
+  def estimate_tokens(self, text: str, model: str = DEFAULT_TOKEN_MODEL) -> int:
+    """Estimación rápida para comprobar presupuestos de prompt."""
+    return estimate_tokens(text, model)
+
+  async def resolve_usage(self, response: ChatCompletionResponse, prompt_text: str, content: str) -> dict:
+    """
+    Uso de tokens de una respuesta. Se toma el ``usage`` del upstream y solo
+    se cuenta localmente (fuera del event loop si el texto es grande) lo que
+    falte. Una respuesta de caché no consumió tokens: su uso es cero.
+    """
+    if response.cached:
+      return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached": True}
+
+    usage = response.usage
+    prompt_tokens = usage.prompt_tokens if usage else None
+    completion_tokens = usage.completion_tokens if usage else None
+    if not prompt_tokens:
+      prompt_tokens = await count_tokens_async(prompt_text)
+    if not completion_tokens:
+      completion_tokens = await count_tokens_async(content)
+    total_tokens = usage.total_tokens if usage and usage.total_tokens else prompt_tokens + completion_tokens
+    return {
+      "prompt_tokens": prompt_tokens,
+      "completion_tokens": completion_tokens,
+      "total_tokens": total_tokens,
+      "cached": False,
+    }
 
   async def chat_completion(
+    self,
+    request: ChatCompletionRequest,
+    token: str,
+    cache_template: str = "default",
+    use_cache: bool = True
+  ) -> ChatCompletionResponse:
+    """
+    Chat completion con caché de respuestas en Redis. La llave es el hash
+    del payload (modelo, mensajes y opciones; nunca el token) y el TTL sale
+    de AI_RESPONSE_CACHE_TTL_SECONDS[cache_template]. ``use_cache=False``
+    fuerza la llamada al upstream. Las peticiones con sesión o auto_save
+    tienen efectos en el upstream y nunca se cachean. En un acierto (o al
+    esperar la llamada de otra petición) la respuesta lleva ``cached=True`` y
+    uso cero, para no volver a contar tokens ya facturados.
+    """
+    if (
+      not use_cache
+      or not settings.AI_RESPONSE_CACHE_ENABLED
+      or request.session_id
+      or request.auto_save
+    ):
+      AI_RESPONSE_CACHE_REQUESTS.labels(cache_template, "bypass").inc()
+      return await self._request_completion(request, token)
+
+    ttls = settings.AI_RESPONSE_CACHE_TTL_SECONDS
+    ttl = ttls.get(cache_template, ttls.get("default", 0))
+    called_upstream = False
+
+    async def _call_upstream() -> dict:
+      nonlocal called_upstream
+      called_upstream = True
+      response = await self._request_completion(request, token)
+      return response.model_dump(exclude_none=True)
+
+    data = await _response_cache.loadFromCacheAsync(
+      params=request.model_dump(mode="json", exclude_none=True),
+      prefix=f"{cache_template}:",
+      ttl=ttl,
+      callback_async=_call_upstream,
+      cache_if=lambda res: bool(ChatCompletionResponse.model_validate(res).get_content())
+    )
+    AI_RESPONSE_CACHE_REQUESTS.labels(cache_template, "miss" if called_upstream else "hit").inc()
+    response = ChatCompletionResponse.model_validate(data)
+    if not called_upstream:
+      logger.info(f"AI response served from cache (template={cache_template})")
+      response.cached_usage = response.usage
+      response.usage = ChatCompletionUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+      response.cached = True
+    return response
+
+  async def _request_completion(
     self,
     request: ChatCompletionRequest,
     token: str
   ) -> ChatCompletionResponse:
     url = f"{self.base_url}/agent/v1/chat/completions"
 
-    # Se fuerza la cabecera para mantener la conexion viva a nivel TCP
     headers = {
       "Authorization": f"Bearer {token}",
       "Content-Type": "application/json",
-      "Connection": "keep-alive"
+      "Accept": "text/event-stream, application/json"
     }
 
     payload = request.model_dump(exclude_none=True)
     logger.info(f"Initiating AI chat completion request to {url}")
     logger.info(f"Request payload keys: {list(payload.keys())}")
-    logger.info(f"Request headers: {headers}")
 
     try:
-      # Desactivamos el pool de conexiones y forzamos HTTP/1.1
-      # para evitar que el socket se cierre por inactividad estricta de HTTP/2
-      limits = httpx.Limits(max_keepalive_connections=0)
-
-      async with httpx.AsyncClient(timeout=self.timeout, limits=limits, http2=False) as client:
-        response = await client.post(
-          url,
-          headers=headers,
-          json=payload
+      async with _upstream_semaphore(url):
+        data = await self._post_and_read(url, headers, payload, request.model)
+
+      if isinstance(data, list):
+        obj_response = data[0]
+      elif isinstance(data, dict):
+        obj_response = data
+      else:
+        logger.error(f"Unexpected data format: {type(data).__name__}")
+        raise HTTPException(
+          status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+          detail=f"Formato de respuesta IA inesperado: {type(data).__name__}"
         )
 
-        logger.info(f"Received response with status code: {response.status_code}")
-
-        if response.status_code == 401:
-          logger.warning("Authentication failed: Invalid or expired token")
-          raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token invalido o expirado para acceder a la IA"
-          )
-        elif response.status_code == 422:
-          logger.error(f"Validation error from AI API: {response.text}")
-          raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail=f"Error de validacion en la API de IA: {response.text}"
-          )
-        elif response.status_code >= 500:
-          logger.error(f"Server error from AI API: {response.text}")
-          raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Servicio de IA temporalmente no disponible"
-          )
-
-        response.raise_for_status()
-
-        data = None
-        for line in response.text.split('\n'):
-          if line.startswith('data: '):
-            json_str = line[6:]
-            try:
-              data = json.loads(json_str)
-              break
-            except json.JSONDecodeError as e:
-              logger.error(f"Failed to parse SSE JSON data: {e} - Line: {json_str}")
-              continue
-
-        if data is None:
-          try:
-            data = response.json()
-          except ValueError:
-            logger.error(f"Failed to parse standard JSON response: {response.text}")
-            raise
-
-        if isinstance(data, list):
-          obj_response = data[0]
-        elif isinstance(data, dict):
-          obj_response = data
-        else:
-          logger.error(f"Unexpected data format: {type(data).__name__}")
-          raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Formato de respuesta IA inesperado: {type(data).__name__}"
-          )
-
-        logger.info("Successfully parsed AI response")
-        return ChatCompletionResponse.model_validate(obj_response)
+      logger.info("Successfully parsed AI response")
+      return ChatCompletionResponse.model_validate(obj_response)
 
+    except HTTPException:
+      raise
     except httpx.TimeoutException as e:
       logger.exception("Timeout occurred while waiting for AI API response")
       raise HTTPException(
@@ -145,20 +334,75 @@ class AIClient:
         detail="Error interno al procesar la respuesta de la IA"
       )
 
+  async def _post_and_read(self, url: str, headers: dict, payload: dict, model: str) -> Any:
+    """
+    POST en streaming sobre el cliente compartido. Si el upstream cerró una
+    conexión keep-alive reutilizada antes de responder, se reintenta una vez
+    con una conexión nueva.
+    """
+    client = get_ai_http_client()
+    for attempt in range(2):
+      try:
+        async with client.stream("POST", url, headers=headers, json=payload) as response:
+          logger.info(f"Received response with status code: {response.status_code}")
+
+          if response.status_code >= 400:
+            await response.aread()
+            self._raise_for_ai_status(response)
+
+          return await _read_ai_response(response, default_model=model)
+      except httpx.RemoteProtocolError:
+        if attempt == 0:
+          logger.warning("AI API cerró la conexión reutilizada; reintentando con una nueva")
+          continue
+        raise
+
+  @staticmethod
+  def _raise_for_ai_status(response: httpx.Response):
+    if response.status_code == 401:
+      logger.warning("Authentication failed: Invalid or expired token")
+      raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Token invalido o expirado para acceder a la IA"
+      )
+    elif response.status_code == 422:
+      logger.error(f"Validation error from AI API: {response.text}")
+      raise HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail=f"Error de validacion en la API de IA: {response.text}"
+      )
+    elif response.status_code >= 500:
+      logger.error(f"Server error from AI API: {response.text}")
+      raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Servicio de IA temporalmente no disponible"
+      )
+    response.raise_for_status()
+
   async def analyze_seo_content(
     self,
     html_content: str,
     url: str,
     lighthouse_data: Optional[dict] = None,
     token: str = None,
-    documentation_context: Optional[str] = None
+    documentation_context: Optional[str] = None,
+    seo_analysis: Optional[dict] = None
   ) -> dict:
-    seo_analyzer = SEOAnalyzer(url=extract_domain(url), html_content=html_content)
+    """
+    Análisis SEO con IA. En lugar del HTML crudo el prompt lleva un resumen
+    destilado de la página (ver html_distiller) limitado a
+    AI_PAGE_DIGEST_MAX_TOKENS. ``seo_analysis`` es el análisis ya calculado
+    por la auditoría; si no se recibe se calcula aquí.
+    """
+    if seo_analysis is None:
+      seo_analysis = await run_cpu(run_full_seo_analysis, extract_domain(url), html_content)
+
+    digest = await run_cpu(distill_page, url, html_content, seo_analysis)
+    page_digest = fit_page_digest(digest, settings.AI_PAGE_DIGEST_MAX_TOKENS, self.estimate_tokens)
 
     system_template = self.jinja_env.get_template("seo_analysis.jinja")
     system_content = system_template.render(
-      robots_analysis=seo_analyzer.analyze_robots_txt(),
-      structured_data=seo_analyzer.analyze_structured_data(),
+      robots_analysis=seo_analysis.get("technical_seo"),
       documentation_context=documentation_context
     )
 
@@ -168,13 +412,11 @@ class AIClient:
       isContext=True
     )
 
-    html_preview = html_content
-
     user_template = self.jinja_env.get_template("user_analysis.jinja")
     user_content = user_template.render(
       url=url,
       lighthouse_data=lighthouse_data,
-      html_content=html_preview,
+      page_digest=page_digest,
       documentation_context=documentation_context
     )
 
@@ -189,25 +431,9 @@ class AIClient:
       stream=False
     )
 
-    input_text = f"{system_content}\n{user_content}"
-    input_tokens = self.count_tokens(input_text)
-
-    response = await self.chat_completion(request, token)
+    response = await self.chat_completion(request, token, cache_template="seo_analysis")
     content = response.get_content()
-
-    if response.usage and response.usage.total_tokens:
-      usage = {
-        "prompt_tokens": response.usage.prompt_tokens or input_tokens,
-        "completion_tokens": response.usage.completion_tokens or self.count_tokens(content),
-        "total_tokens": response.usage.total_tokens,
-      }
-    else:
-      output_tokens = self.count_tokens(content)
-      usage = {
-        "prompt_tokens": input_tokens,
-        "completion_tokens": output_tokens,
-        "total_tokens": input_tokens + output_tokens,
-      }
+    usage = await self.resolve_usage(response, f"{system_content}\n{user_content}", content)
 
     return {
       "content": content,
@@ -244,24 +470,9 @@ class AIClient:
       ]
     )
 
-    input_tokens = self.count_tokens(prompt_content)
-
-    response = await self.chat_completion(request, token)
+    response = await self.chat_completion(request, token, cache_template="audit_comparison")
     content = response.get_content()
-
-    if response.usage and response.usage.total_tokens:
-      usage = {
-        "prompt_tokens": response.usage.prompt_tokens or input_tokens,
-        "completion_tokens": response.usage.completion_tokens or self.count_tokens(content),
-        "total_tokens": response.usage.total_tokens,
-      }
-    else:
-      output_tokens = self.count_tokens(content)
-      usage = {
-        "prompt_tokens": input_tokens,
-        "completion_tokens": output_tokens,
-        "total_tokens": input_tokens + output_tokens,
-      }
+    usage = await self.resolve_usage(response, prompt_content, content)
 
     return {
       "content": content,
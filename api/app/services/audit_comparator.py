@@ -2,10 +2,21 @@
 Servicio para comparación de auditorías SEO.
 Analiza diferencias entre dos auditorías y genera recomendaciones.
 """
+import math
 from typing import Dict, Any, List, Optional
+from app.core.config import get_settings
 from app.models.audit import AuditReport
 from app.services.ai_client import AIClient
 
+# Ruido entre cargas asumido cuando ninguna auditoría tiene muestras repetidas.
+# Los scores de SEO/accesibilidad/buenas prácticas salen del DOM y no varían.
+_DEFAULT_NOISE = {
+    'performance_score': 5.0,
+    'lcp': 250.0,
+    'fid': 20.0,
+    'cls': 0.02,
+}
+
 
 class AuditComparator:
     """Servicio para comparar auditorías SEO"""
@@ -77,8 +88,6 @@ class AuditComparator:
         Returns:
             Diccionario con comparación de métricas
         """
-        metrics = {}
-
         # Comparar scores
         score_comparisons = {}
         for metric in ['performance_score', 'seo_score', 'accessibility_score', 'best_practices_score']:
@@ -87,13 +96,17 @@ class AuditComparator:
 
             if base_value is not None and compare_value is not None:
                 difference = base_value - compare_value
+                noise = self._noise_threshold(metric, base_audit, compare_audit)
+                significant = abs(difference) > noise
                 score_comparisons[metric] = {
                     "base": base_value,
                     "compare": compare_value,
                     "difference": difference,
                     "percentage_diff": (difference / compare_value * 100) if compare_value > 0 else 0,
                     "is_better": difference >= 0,
-                    "status": self._get_comparison_status(difference)
+                    "noise_threshold": noise,
+                    "significant": significant,
+                    "status": self._get_comparison_status(difference) if significant else "similar"
                 }
 
         # Comparar Core Web Vitals
@@ -105,11 +118,14 @@ class AuditComparator:
             if base_value is not None and compare_value is not None:
                 # Para CWV, menor es mejor
                 difference = compare_value - base_value
+                noise = self._noise_threshold(metric, base_audit, compare_audit)
                 cwv_comparisons[metric] = {
                     "base": base_value,
                     "compare": compare_value,
                     "difference": difference,
                     "is_better": difference > 0,  # Menor es mejor
+                    "noise_threshold": noise,
+                    "significant": abs(difference) > noise,
                     "status": self._get_cwv_status(metric, base_value, compare_value)
                 }
 
@@ -295,7 +311,7 @@ class AuditComparator:
             tools=["web_search"]
         )
 
-        response = await self.ai_client.chat_completion(request, token)
+        response = await self.ai_client.chat_completion(request, token, cache_template="audit_comparison")
         return response.get_content()
 
     async def generate_ai_detailed_proposal_report(
@@ -329,20 +345,15 @@ class AuditComparator:
         )
 
         # Llamada a IA
-        response = await self.ai_client.chat_completion(request, token)
+        response = await self.ai_client.chat_completion(request, token, cache_template="schema_proposal_detail")
         content = response.get_content()
 
-        # Calcular tokens
-        input_tokens = self.ai_client.count_tokens(prompt_content)
-        output_tokens = self.ai_client.count_tokens(content)
+        # Tokens: usage del upstream, conteo local solo si falta
+        usage = await self.ai_client.resolve_usage(response, prompt_content, content)
 
         return {
             "content": content,
-            "usage": {
-                "prompt_tokens": input_tokens,
-                "completion_tokens": output_tokens,
-                "total_tokens": input_tokens + output_tokens
-            }
+            "usage": usage
         }
 
     # Métodos auxiliares
@@ -399,22 +410,15 @@ class AuditComparator:
             # tools=["web_search"] # Desactivar web_search para reducir complejidad si ya tenemos los datos
         )
 
-        # Calcular tokens de entrada manualmente
-        input_tokens = self.ai_client.count_tokens(prompt_content)
-
-        response = await self.ai_client.chat_completion(request, token)
+        response = await self.ai_client.chat_completion(request, token, cache_template="schemas_markup_comparison")
         content = response.get_content()
 
-        # Calcular tokens de salida manualmente
-        output_tokens = self.ai_client.count_tokens(content)
+        # Tokens: usage del upstream, conteo local solo si falta
+        usage = await self.ai_client.resolve_usage(response, prompt_content, content)
 
         return {
             "content": content,
-            "usage": {
-                "prompt_tokens": input_tokens,
-                "completion_tokens": output_tokens,
-                "total_tokens": input_tokens + output_tokens
-            }
+            "usage": usage
         }
 
     def _truncate_schemas(self, schemas: List[Dict[str, Any]], max_items: int = 15) -> List[Dict[str, Any]]:
@@ -478,10 +482,38 @@ class AuditComparator:
         else:
             return "poor"
 
+    @staticmethod
+    def _sample_stats(audit: AuditReport, metric: str) -> Dict[str, Any]:
+        """Estadísticas del muestreo de rendimiento guardadas en lighthouse_data."""
+        samples = (audit.lighthouse_data or {}).get('performance_samples') or {}
+        return (samples.get('cold') or {}).get(metric) or {}
+
+    def _noise_threshold(self, metric: str, base_audit: AuditReport, compare_audit: AuditReport) -> float:
+        """
+        Diferencia mínima para considerar un cambio real: N desviaciones
+        estándar combinadas de las cargas de ambas auditorías. Si solo una
+        tiene muestras se asume la misma varianza en la otra; sin muestras se
+        usa el ruido por defecto de la métrica.
+        """
+        stdevs = [
+            stats['stdev'] for stats in (
+                self._sample_stats(base_audit, metric),
+                self._sample_stats(compare_audit, metric)
+            )
+            if stats.get('stdev') is not None
+        ]
+        if not stdevs:
+            return _DEFAULT_NOISE.get(metric, 0.0)
+        if len(stdevs) == 1:
+            stdevs = stdevs * 2
+        combined = math.sqrt(sum(sd ** 2 for sd in stdevs))
+        return round(get_settings().AUDIT_COMPARISON_NOISE_SIGMAS * combined, 4)
+
     def _calculate_overall_winner(self, score_comparisons: Dict[str, Any]) -> str:
-        """Calcular ganador general basado en scores"""
-        better_count = sum(1 for comp in score_comparisons.values() if comp.get('is_better', False))
-        worse_count = len(score_comparisons) - better_count
+        """Calcular ganador general basado en scores (ignora diferencias dentro del ruido)"""
+        significant = [comp for comp in score_comparisons.values() if comp.get('significant', True)]
+        better_count = sum(1 for comp in significant if comp.get('is_better', False))
+        worse_count = len(significant) - better_count
 
         if better_count > worse_count:
             return "base"
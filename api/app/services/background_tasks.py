@@ -2,11 +2,19 @@
 Servicio centralizado para tareas en segundo plano.
 Maneja la ejecución de auditorías y comparaciones.
 """
+import asyncio
+import json
+import time
+from enum import Enum
 from uuid import UUID
-from datetime import datetime
-from typing import List, Any
+from datetime import datetime, timedelta
+from typing import List, Any, Callable, Dict, Optional, Tuple, Type
 
+from fastapi import BackgroundTasks
+
+from app.core.config import settings
 from app.core.database import db_manager
+from app.core.executors import run_db, run_cpu
 from app.models.webpage import WebPage
 from app.models.audit import AuditReport, AuditStatus
 from app.models.audit_comparison import AuditComparison, ComparisonStatus
@@ -15,44 +23,140 @@ from app.models.audit_url_validation import AuditUrlValidation, UrlValidationSta
 from app.services.audit_engine import get_audit_engine
 from app.services.ai_client import get_ai_client
 from app.services.cache import Cache
-from app.services.seo_analyzer import SEOAnalyzer, filter_open_graph_schemas
+from app.services.seo_analyzer import run_full_seo_analysis, filter_open_graph_schemas
 from app.services.audit_comparator import get_audit_comparator
-from app.services.schema_audit_service import get_schema_audit_service
+from app.services.schema_audit_service import (
+    get_schema_audit_service,
+    validate_schema_payload,
+    build_structural_comparison,
+)
+from app.services.job_queue import get_job_queue
+from app.services.url_scheduler import UrlPipelineScheduler
 from app.helpers import extract_domain
-from sqlalchemy import String, cast as sql_cast, desc
+from sqlalchemy import String, cast as sql_cast, desc, func
 from sqlalchemy.orm import joinedload
 from sqlmodel import select
 
 
+class _GroupLeaderCancelled(Exception):
+    """Se canceló el análisis IA compartido de un grupo de URLs: otra URL lo relanza."""
+
+
+# ---------------------------------------------------------------------------
+# Helpers síncronos de BD (se ejecutan en el pool de hilos vía run_db)
+# ---------------------------------------------------------------------------
+
+def _set_status_sync(model: Type, entity_id: UUID, status: Any) -> Optional[Any]:
+    """Cambia el estado de una fila y la devuelve (None si no existe)."""
+    with db_manager.sync_session_context() as session:
+        row = session.get(model, entity_id)
+        if not row:
+            return None
+        row.status = status
+        session.add(row)
+        return row
+
+
+def _latest_completed_audits_sync(session, web_page_ids: List[UUID]) -> Dict[UUID, AuditReport]:
+    """
+    Última auditoría completada por web_page_id en una sola consulta
+    (ROW_NUMBER() sobre cada página), con su web_page cargada.
+    """
+    if not web_page_ids:
+        return {}
+    ranked = select(
+        AuditReport.id.label("audit_id"),
+        func.row_number().over(
+            partition_by=AuditReport.web_page_id,
+            order_by=desc(AuditReport.created_at)
+        ).label("rank")
+    ).where(
+        AuditReport.web_page_id.in_(web_page_ids),
+        sql_cast(AuditReport.status, String) == AuditStatus.COMPLETED.value
+    ).subquery()
+
+    stmt = select(AuditReport).options(joinedload(AuditReport.web_page)).join(
+        ranked, AuditReport.id == ranked.c.audit_id
+    ).where(ranked.c.rank == 1)
+
+    return {audit.web_page_id: audit for audit in session.execute(stmt).scalars().all()}
+
+
+def _checkpoint_url_validation_sync(
+    validation_id: UUID,
+    results: List[dict],
+    total_urls: int,
+    input_tokens: int,
+    output_tokens: int
+):
+    """Guarda el avance parcial de una validación de URLs."""
+    with db_manager.sync_session_context() as session:
+        validation = session.get(AuditUrlValidation, validation_id)
+        if not validation:
+            return
+        validation.results_json = results
+        validation.processed_urls = len(results)
+        validation.total_urls = total_urls
+        validation.input_tokens = input_tokens
+        validation.output_tokens = output_tokens
+        session.add(validation)
+
+
+def _mark_failed_sync(
+    model: Type,
+    entity_id: UUID,
+    error_message: str,
+    set_completed_at: bool = True,
+    only_if_active: bool = False
+):
+    """Marca una fila como FAILED con su mensaje de error."""
+    with db_manager.sync_session_context() as session:
+        row = session.get(model, entity_id)
+        if not row:
+            return
+        if only_if_active and row.status not in ("pending", "in_progress"):
+            return
+        row.status = "failed"
+        row.error_message = error_message
+        if set_completed_at:
+            row.completed_at = datetime.utcnow()
+        session.add(row)
+
+
 async def run_audit_task(
     audit_id: UUID,
     webpage: WebPage,
     include_ai: bool,
-    token: str
+    token: str,
+    sample_runs: Optional[int] = None,
+    reraise: bool = False
 ):
     """
     Ejecutar auditoría en segundo plano.
     Centraliza la lógica de ejecución de auditorías.
+
+    Con ``reraise`` (worker de la cola) el error se propaga sin marcar la fila:
+    la cola reintenta y la marca como FAILED al agotar los intentos.
     """
-    audit = None
     _cache = Cache(table_name="audits_reports")
-
     try:
-        # Actualizar estado a IN_PROGRESS
-        with db_manager.sync_session_context() as session:
-            audit = session.get(AuditReport, audit_id)
-            if not audit:
-                print(f"❌ No se encontró audit {audit_id}")
-                return
-
-            audit.status = AuditStatus.IN_PROGRESS
-            session.add(audit)
+        # Actualizar estado (documentation_context queda cargado en la fila devuelta)
+        audit = await run_db(_set_status_sync, AuditReport, audit_id, AuditStatus.IN_PROGRESS)
+        if not audit:
+            print(f"❌ No se encontró audit {audit_id}")
+            return
+        documentation_context = audit.documentation_context
 
         print(f"🚀 Iniciando auditoría para {webpage.url}")
 
         # Ejecutar auditoría con Playwright/Lighthouse
         audit_engine = get_audit_engine()
-        req_lighthouse_params = dict(url=webpage.url, instructions=webpage.instructions)
+        req_lighthouse_params = dict(
+            url=webpage.url,
+            instructions=webpage.instructions,
+            manual_html_content=webpage.manual_html_content,
+            sample_runs=sample_runs
+        )
         lighthouse_result = await _cache.loadFromCacheAsync(
             params=req_lighthouse_params,
             prefix="___lighthouse_report___",
@@ -60,51 +164,48 @@ async def run_audit_task(
             **req_lighthouse_params
         )
 
-        # Análisis de IA si se solicita
+        # Parseo HTML + robots.txt en el pool de procesos (no bloquea el event loop);
+        # el análisis de IA reutiliza este resultado en lugar de repetirlo
+        seo_analysis = await run_cpu(
+            run_full_seo_analysis,
+            extract_domain(webpage.url),
+            lighthouse_result.get('html_content_raw', '')
+        )
+
+        # Si se solicita análisis de IA
         ai_analysis_data = None
-        ai_analysis = None
+
         if include_ai:
             print(f"🤖 Ejecutando análisis de IA...")
             ai_client = get_ai_client()
 
             try:
-                req_ai_analysis_params = dict(url=webpage.url)
-                ai_analysis = await _cache.loadFromCacheAsync(
-                    params=req_ai_analysis_params,
-                    prefix="ai_analysis_",
-                    ttl=3600,
-                    callback_async=ai_client.analyze_seo_content,
+                # La respuesta se cachea en chat_completion por hash del prompt
+                ai_analysis = await ai_client.analyze_seo_content(
+                    url=webpage.url,
                     html_content=lighthouse_result.get('html_content_raw', ''),
                     lighthouse_data={
                         'performance_score': lighthouse_result.get('performance_score'),
                         'seo_score': lighthouse_result.get('seo_score'),
                         'accessibility_score': lighthouse_result.get('accessibility_score'),
                         'lcp': lighthouse_result.get('lcp'),
-                        'cls': lighthouse_result.get('cls')
+                        'cls': lighthouse_result.get('cls'),
+                        'fcp': lighthouse_result.get('fcp'),
+                        'tbt': lighthouse_result.get('tbt'),
+                        'ttfb': lighthouse_result.get('ttfb')
                     },
                     token=token,
-                    **req_ai_analysis_params
+                    documentation_context=documentation_context,
+                    seo_analysis=seo_analysis
                 )
 
-                ai_analysis_content = ""
-
-                print(f"🔍 DEBUG AI Analysis Type: {type(ai_analysis)}")
-                if isinstance(ai_analysis, dict):
-                     print(f"🔍 DEBUG AI Analysis Keys: {ai_analysis.keys()}")
-                     ai_analysis_content = ai_analysis.get('content', '')
-
-                     # Fallback si content esta vacio o no existe
-                     if not ai_analysis_content and 'analysis' in ai_analysis:
-                         ai_analysis_content = ai_analysis.get('analysis', '')
-
-                     # Tokens se extraen mas abajo
-                else:
-                     ai_analysis_content = str(ai_analysis)
-
-                print(f"🔍 DEBUG AI Content Length: {len(ai_analysis_content)}")
+                # Extraer métricas de uso y contenido
+                usage = ai_analysis.get('usage', {})
+                content = ai_analysis.get('content', '')
 
                 ai_analysis_data = {
-                    'analysis': ai_analysis_content, # GUARDAR SOLO EL TEXTO
+                    'content': content,
+                    'usage': usage,
                     'generated_at': datetime.utcnow().isoformat(),
                     'model': 'deepseek-v4-flash'
                 }
@@ -115,20 +216,17 @@ async def run_audit_task(
                     'status': 'failed'
                 }
 
-        # Análisis SEO
-        _seo_analyzer = SEOAnalyzer(
-            url=extract_domain(webpage.url),
-            html_content=lighthouse_result.get('html_content_raw', '')
-        )
-        seo_analysis = _seo_analyzer.run_full_analysis()
+        #eliminar html y htl_raw
+        lighthouse_result.pop('html_content', None)
+        lighthouse_result.pop('html_content_raw', None)
 
-        # Guardar resultados
-        with db_manager.sync_session_context() as session:
-            audit = session.get(AuditReport, audit_id)
-            # lighthouse_result.pop('html_content', None)
-            # lighthouse_result.pop('html_content_raw', None)
-
-            if audit:
+        # Actualizar resultados en la base de datos
+        def _save_results():
+            with db_manager.sync_session_context() as session:
+                audit = session.get(AuditReport, audit_id)
+                if not audit:
+                    return
+                # Extraer métricas
                 audit.performance_score = lighthouse_result.get('performance_score')
                 audit.seo_score = lighthouse_result.get('seo_score')
                 audit.accessibility_score = lighthouse_result.get('accessibility_score')
@@ -137,12 +235,15 @@ async def run_audit_task(
                 audit.fid = lighthouse_result.get('fid')
                 audit.cls = lighthouse_result.get('cls')
                 audit.lighthouse_data = lighthouse_result
-                audit.ai_suggestions = ai_analysis_data
 
-                # Extraer tokens si existen
-                if isinstance(ai_analysis, dict) and 'usage' in ai_analysis and ai_analysis['usage']:
-                     audit.input_tokens = ai_analysis['usage'].get('prompt_tokens', 0)
-                     audit.output_tokens = ai_analysis['usage'].get('completion_tokens', 0)
+                # Asignar datos de IA y guardar tokens
+                if ai_analysis_data:
+                    audit.ai_suggestions = ai_analysis_data
+                    # Guardar tokens en columnas dedicadas si existen en ai_analysis_data
+                    if 'usage' in ai_analysis_data:
+                        usage_data = ai_analysis_data['usage']
+                        audit.input_tokens = usage_data.get('prompt_tokens', 0)
+                        audit.output_tokens = usage_data.get('completion_tokens', 0)
 
                 audit.status = AuditStatus.COMPLETED
                 audit.completed_at = datetime.utcnow()
@@ -154,57 +255,129 @@ async def run_audit_task(
 
                 session.add(audit)
 
+        await run_db(_save_results)
+
         print(f"✅ Auditoría completada: {audit_id}")
     except Exception as e:
         print(f"❌ Error en auditoría {audit_id}: {str(e)}")
         import traceback
         traceback.print_exc()
+        if reraise:
+            raise
 
-        # Guardar estado de error
+        # Intentar actualizar el audit con el error
         try:
-            with db_manager.sync_session_context() as session:
-                if audit is None:
-                    audit = session.get(AuditReport, audit_id)
-
-                if audit:
-                    audit.status = AuditStatus.FAILED
-                    audit.error_message = str(e)
-                    audit.completed_at = datetime.utcnow()
-                    session.add(audit)
+            await run_db(_mark_failed_sync, AuditReport, audit_id, str(e))
         except Exception as inner_error:
             print(f"❌ Error al guardar estado de fallo: {inner_error}")
 
 
+def _create_audit_sync(web_page_id: UUID, user_id: UUID) -> Optional[Tuple[UUID, WebPage]]:
+    """Crea una auditoría PENDING para el target (None si el target no existe)."""
+    with db_manager.sync_session_context() as session:
+        webpage = session.get(WebPage, web_page_id)
+        if not webpage:
+            return None
+        audit = AuditReport(web_page_id=web_page_id, user_id=user_id, status=AuditStatus.PENDING)
+        session.add(audit)
+        session.flush()
+        return audit.id, webpage
+
+
+def _audit_status_sync(audit_id: UUID) -> Optional[str]:
+    with db_manager.sync_session_context() as session:
+        audit = session.get(AuditReport, audit_id)
+        return AuditStatus(audit.status).value if audit else None
+
+
+async def _refresh_competitor_audits(
+    competitor_ids: List[UUID],
+    latest_audits: Dict[UUID, AuditReport],
+    max_age: timedelta,
+    user_id: UUID,
+    include_ai: bool,
+    token: str
+) -> List[Dict[str, Any]]:
+    """
+    Audita de nuevo, en paralelo y dentro de este proceso (comparten el pool
+    de navegadores), los competidores sin auditoría completada o con una más
+    antigua que ``max_age``. Espera como máximo COMPARISON_REFRESH_DEADLINE_SECONDS:
+    las auditorías que no terminan a tiempo se cancelan y quedan FAILED (sin
+    trabajo propio en la cola, la recuperación no podría seguirlas) y la
+    comparación usa la auditoría anterior u omite al competidor si no tenía.
+    """
+    cutoff = datetime.utcnow() - max_age
+    stale_ids = []
+    for competitor_id in competitor_ids:
+        audit = latest_audits.get(competitor_id)
+        if audit is None or (audit.completed_at or audit.created_at) < cutoff:
+            stale_ids.append(competitor_id)
+    if not stale_ids:
+        return []
+
+    tasks = {}
+    refreshed = []
+    for competitor_id in stale_ids:
+        created = await run_db(_create_audit_sync, competitor_id, user_id)
+        if created is None:
+            print(f"⚠️  Target {competitor_id} no encontrado")
+            continue
+        audit_id, webpage = created
+        print(f"🔄 Auditoría {'antigua' if competitor_id in latest_audits else 'inexistente'} para {webpage.url}, re-auditando ({audit_id})")
+        task = asyncio.create_task(run_audit_task(
+            audit_id=audit_id,
+            webpage=webpage,
+            include_ai=include_ai,
+            token=token
+        ))
+        tasks[task] = {"web_page_id": str(competitor_id), "audit_id": str(audit_id)}
+
+    if not tasks:
+        return refreshed
+
+    _, pending = await asyncio.wait(tasks, timeout=settings.COMPARISON_REFRESH_DEADLINE_SECONDS)
+
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    for task, info in tasks.items():
+        if task in pending:
+            await run_db(
+                _mark_failed_sync,
+                AuditReport,
+                UUID(info["audit_id"]),
+                "La re-auditoría excedió el tiempo máximo de la comparación"
+            )
+            status = "timeout"
+        else:
+            status = await run_db(_audit_status_sync, UUID(info["audit_id"])) or AuditStatus.FAILED.value
+        refreshed.append({**info, "status": status})
+    return refreshed
+
+
 async def run_comparison_task(
     comparison_id: UUID,
     base_web_page_id: UUID,
     competitor_ids: List[UUID],
     include_ai: bool,
     token: str,
-    user_id: UUID
+    user_id: UUID,
+    max_audit_age_hours: Optional[float] = None,
+    reraise: bool = False
 ):
     """
-    Ejecutar comparación de auditorías en segundo plano.
-    """
-    comparison = None
-    _cache = Cache(table_name="audits_reports_compare_")
-    documentation_context = None
-
-    try:
-        # Actualizar estado a IN_PROGRESS
-        with db_manager.sync_session_context() as session:
-            comparison = session.get(AuditComparison, comparison_id)
-            if not comparison:
-                print(f"❌ No se encontró comparison {comparison_id}")
-                return
-
-            documentation_context = comparison.documentation_context
-            comparison.status = ComparisonStatus.IN_PROGRESS
-            session.add(comparison)
+    Ejecutar comparación de auditorías en segundo plano (``reraise``: ver
+    ``run_audit_task``).
 
-        print(f"🚀 Iniciando comparación {comparison_id}")
+    Con ``max_audit_age_hours`` los competidores sin auditoría completada o
+    con una más antigua se auditan de nuevo antes de comparar (ver
+    ``_refresh_competitor_audits``).
+    """
 
-        # Obtener página base y su auditoría
+    def _load_inputs():
+        """Carga página base, su última auditoría y las de los competidores."""
         with db_manager.sync_session_context() as session:
             base_webpage = session.get(WebPage, base_web_page_id)
             if not base_webpage:
@@ -222,109 +395,146 @@ async def run_comparison_task(
             if not base_audit:
                 raise Exception(f"No hay auditorías completadas para {base_webpage.url}")
 
+            return base_webpage, base_audit, _latest_completed_audits_sync(session, competitor_ids)
+
+    def _load_competitor_audits():
+        with db_manager.sync_session_context() as session:
+            return _latest_completed_audits_sync(session, competitor_ids)
+
+    try:
+        # Actualizar estado a IN_PROGRESS
+        comparison = await run_db(_set_status_sync, AuditComparison, comparison_id, ComparisonStatus.IN_PROGRESS)
+        if not comparison:
+            print(f"❌ No se encontró comparison {comparison_id}")
+            return
+        documentation_context = comparison.documentation_context
+
+        print(f"🚀 Iniciando comparación {comparison_id}")
+
+        # Obtener página base, su auditoría y las de los competidores.
+        # La sesión se cierra antes de las llamadas a IA para no retener
+        # una conexión del pool durante minutos.
+        base_webpage, base_audit, latest_audits = await run_db(_load_inputs)
+
+        refreshed_audits = []
+        if max_audit_age_hours is not None:
+            refreshed_audits = await _refresh_competitor_audits(
+                competitor_ids=competitor_ids,
+                latest_audits=latest_audits,
+                max_age=timedelta(hours=max_audit_age_hours),
+                user_id=user_id,
+                include_ai=include_ai,
+                token=token
+            )
+            if any(r["status"] == AuditStatus.COMPLETED.value for r in refreshed_audits):
+                latest_audits = await run_db(_load_competitor_audits)
+
+        competitors = []
+        for competitor_id in competitor_ids:
+            competitor_audit = latest_audits.get(competitor_id)
+            if not competitor_audit:
+                print(f"⚠️  No hay auditoría para el target {competitor_id}")
+                continue
+            competitors.append((competitor_id, competitor_audit.web_page, competitor_audit))
+
         # Procesar comparaciones
         comparator = get_audit_comparator()
-        comparisons = []
-        competitors_audit = []
         total_input_tokens = 0
         total_output_tokens = 0
+        ai_semaphore = asyncio.Semaphore(max(1, settings.COMPARISON_AI_CONCURRENCY))
 
-        with db_manager.sync_session_context() as session:
-            for competitor_id in competitor_ids:
+        async def _compare_competitor(competitor_id, competitor_webpage, competitor_audit):
+            """Reporte + análisis de IA de un competidor: (reporte, usage) o None si falla."""
+            try:
+                # Generar comparación
+                comparison_report = comparator.generate_comparison_report(
+                    base_audit=base_audit,
+                    compare_audit=competitor_audit,
+                    base_url=base_webpage.url,
+                    compare_url=competitor_webpage.url
+                )
+            except Exception as e:
+                print(f"❌ Error procesando competidor {competitor_id}: {e}")
+                return None
+
+            usage = {}
+            # Análisis de IA si se solicita
+            if include_ai and token:
                 try:
-                    competitor_webpage = session.get(WebPage, competitor_id)
-                    if not competitor_webpage:
-                        print(f"⚠️  Target {competitor_id} no encontrado")
-                        continue
-
-                    # Obtener auditoría del competidor
-                    competitor_audit_stmt = select(AuditReport).options(joinedload(AuditReport.web_page)).where(
-                        AuditReport.web_page_id == competitor_id,
-                        sql_cast(AuditReport.status, String) == AuditStatus.COMPLETED.value
-                    ).order_by(desc(AuditReport.created_at)).limit(1)
-
-                    competitor_audit_result = session.execute(competitor_audit_stmt)
-                    competitor_audit = competitor_audit_result.scalars().first()
-
-                    if not competitor_audit:
-                        print(f"⚠️  No hay auditoría para {competitor_webpage.url}")
-                        continue
-
-                    # Generar comparación
-                    comparison_report = comparator.generate_comparison_report(
+                    async with ai_semaphore:
+                        ai_analysis = await comparator.generate_ai_comparison(
+                            base_audit=base_audit,
+                            compare_audit=competitor_audit,
+                            base_url=base_webpage.url,
+                            compare_url=competitor_webpage.url,
+                            documentation_context=documentation_context,
+                            token=token
+                        )
+                    # Handle AI response format
+                    if isinstance(ai_analysis, dict):
+                        usage = ai_analysis.get('usage', {}) or {}
+                        comparison_report['ai_analysis'] = ai_analysis.get('content', '')
+                    else:
+                        comparison_report['ai_analysis'] = ai_analysis
+
+                except Exception as e:
+                    print(f"⚠️ Error en IA para {competitor_webpage.url}: {e}")
+                    comparison_report['ai_analysis'] = None
+
+            return comparison_report, usage
+
+        async def _schema_comparison():
+            """Comparación de schemas con IA: (texto, usage)."""
+            try:
+                async with ai_semaphore:
+                    ai_schema_comparison = await comparator.generate_ai_schema_comparison(
                         base_audit=base_audit,
-                        compare_audit=competitor_audit,
+                        compare_audits=[audit for _, _, audit in competitors],
+                        token=token,
                         base_url=base_webpage.url,
-                        compare_url=competitor_webpage.url
+                        documentation_context=documentation_context
                     )
 
-                    # Análisis de IA si se solicita
-                    if include_ai and token:
-                        try:
-                            req_ai_analysis_params = dict(
-                                base_url=base_webpage.url,
-                                compare_url=competitor_webpage.url,
-                                documentation_context=documentation_context
-                            )
-                            ai_analysis = await _cache.loadFromCacheAsync(
-                                params=req_ai_analysis_params,
-                                prefix="ai_analysis_compare_",
-                                ttl=36000,
-                                callback_async=comparator.generate_ai_comparison,
-                                **req_ai_analysis_params,
-                                base_audit=base_audit,
-                                compare_audit=competitor_audit,
-                                documentation_context=documentation_context,
-                                token=token
-                            )
-                            # Handle AI response format
-                            if isinstance(ai_analysis, dict):
-                                content = ai_analysis.get('content', '')
-                                usage = ai_analysis.get('usage', {}) or {}
-                                total_input_tokens += usage.get('prompt_tokens', 0)
-                                total_output_tokens += usage.get('completion_tokens', 0)
-                                comparison_report['ai_analysis'] = content
-                            else:
-                                comparison_report['ai_analysis'] = ai_analysis
-
-                        except Exception as e:
-                            print(f"⚠️ Error en IA para {competitor_webpage.url}: {e}")
-                            comparison_report['ai_analysis'] = None
-
-                    comparisons.append(comparison_report)
-                    competitors_audit.append(competitor_audit)
+                if isinstance(ai_schema_comparison, dict):
+                    return ai_schema_comparison.get('content', ''), ai_schema_comparison.get('usage', {}) or {}
+                return str(ai_schema_comparison), {}
+            except Exception as e:
+                print(f"⚠️ Error generando comparación de schemas con IA: {e}")
+                return f"No se pudo generar el análisis de IA para schemas debido a un error en el servicio. {e}", {}
 
-                except Exception as e:
-                    print(f"❌ Error procesando competidor {competitor_id}: {e}")
-                    continue
+        if not competitors:
+            raise Exception("No se pudieron generar comparaciones")
+
+        # Competidores y comparación de schemas en paralelo (acotados por el semáforo);
+        # el job tarda lo que el competidor más lento, no la suma de todos
+        schema_task = asyncio.create_task(_schema_comparison())
+        try:
+            competitor_results = await asyncio.gather(
+                *(_compare_competitor(*competitor) for competitor in competitors)
+            )
+        except BaseException:
+            schema_task.cancel()
+            raise
+
+        comparisons = []
+        for result in competitor_results:
+            if result is None:
+                continue
+            comparison_report, usage = result
+            comparisons.append(comparison_report)
+            total_input_tokens += usage.get('prompt_tokens', 0)
+            total_output_tokens += usage.get('completion_tokens', 0)
 
         if not comparisons:
+            schema_task.cancel()
             raise Exception("No se pudieron generar comparaciones")
 
         # Generar resumen general
         overall_summary = _generate_overall_summary(base_audit, comparisons)
 
-        # Generar comparación de schemas con IA
-        ai_schema_comparison_text = ""
-        try:
-            ai_schema_comparison = await comparator.generate_ai_schema_comparison(
-                base_audit=base_audit,
-                compare_audits=competitors_audit,
-                token=token,
-                base_url=base_webpage.url,
-                documentation_context=documentation_context
-            )
-
-            if isinstance(ai_schema_comparison, dict):
-                ai_schema_comparison_text = ai_schema_comparison.get('content', '')
-                schema_usage = ai_schema_comparison.get('usage', {}) or {}
-                total_input_tokens += schema_usage.get('prompt_tokens', 0)
-                total_output_tokens += schema_usage.get('completion_tokens', 0)
-            else:
-                ai_schema_comparison_text = str(ai_schema_comparison)
-        except Exception as e:
-             print(f"⚠️ Error generando comparación de schemas con IA: {e}")
-             ai_schema_comparison_text = f"No se pudo generar el análisis de IA para schemas debido a un error en el servicio. {e}"
+        ai_schema_comparison_text, schema_usage = await schema_task
+        total_input_tokens += schema_usage.get('prompt_tokens', 0)
+        total_output_tokens += schema_usage.get('completion_tokens', 0)
 
         # Extract base schemas for report
         base_schemas = []
@@ -337,122 +547,127 @@ async def run_comparison_task(
             "comparisons": comparisons,
             "overall_summary": overall_summary,
             "ai_schema_comparison": ai_schema_comparison_text,
-            "raw_schemas": {"base": base_schemas}
+            "raw_schemas": {"base": base_schemas},
+            "refreshed_audits": refreshed_audits
         }
 
         # Guardar resultado
-        with db_manager.sync_session_context() as session:
-            comparison = session.get(AuditComparison, comparison_id)
-            if comparison:
-                comparison.status = ComparisonStatus.COMPLETED
-                comparison.comparison_result = comparison_result
-                comparison.completed_at = datetime.utcnow()
+        def _save_results():
+            with db_manager.sync_session_context() as session:
+                comparison = session.get(AuditComparison, comparison_id)
+                if comparison:
+                    comparison.status = ComparisonStatus.COMPLETED
+                    comparison.comparison_result = comparison_result
+                    comparison.completed_at = datetime.utcnow()
 
-                # Guardar tokens
-                comparison.input_tokens = total_input_tokens
-                comparison.output_tokens = total_output_tokens
+                    # Guardar tokens
+                    comparison.input_tokens = total_input_tokens
+                    comparison.output_tokens = total_output_tokens
 
-                comparison.report_pdf_path = None
-                comparison.report_word_path = None
-                comparison.report_excel_path = None
+                    comparison.report_pdf_path = None
+                    comparison.report_word_path = None
+                    comparison.report_excel_path = None
 
-                comparison.proposal_report_pdf_path = None
-                comparison.proposal_report_word_path = None
+                    comparison.proposal_report_pdf_path = None
+                    comparison.proposal_report_word_path = None
 
-                session.add(comparison)
+                    session.add(comparison)
+
+        await run_db(_save_results)
 
         print(f"✅ Comparación completada: {comparison_id}")
     except Exception as e:
         print(f"❌ Error en comparación {comparison_id}: {str(e)}")
         import traceback
         traceback.print_exc()
+        if reraise:
+            raise
 
         # Guardar estado de error
         try:
-            with db_manager.sync_session_context() as session:
-                if comparison is None:
-                    comparison = session.get(AuditComparison, comparison_id)
-
-                if comparison:
-                    comparison.status = ComparisonStatus.FAILED
-                    comparison.error_message = str(e)
-                    comparison.completed_at = datetime.utcnow()
-                    session.add(comparison)
+            await run_db(_mark_failed_sync, AuditComparison, comparison_id, str(e))
         except Exception as inner_error:
             print(f"❌ Error al guardar estado de fallo: {inner_error}")
 
 
 async def run_schema_audit_task(
     schema_audit_id: UUID,
-    token: str
+    token: str,
+    reraise: bool = False
 ):
     """
-    Ejecutar auditoría de schemas en segundo plano.
+    Ejecutar auditoría de schemas en segundo plano (``reraise``: ver ``run_audit_task``).
     """
-    schema_audit = None
-
     try:
-        with db_manager.sync_session_context() as session:
-            schema_audit = session.get(AuditSchemaReview, schema_audit_id)
-            if not schema_audit:
-                print(f"❌ No se encontró schema_audit {schema_audit_id}")
-                return
-
-            schema_audit.status = SchemaAuditStatus.IN_PROGRESS
-            session.add(schema_audit)
+        schema_audit = await run_db(
+            _set_status_sync, AuditSchemaReview, schema_audit_id, SchemaAuditStatus.IN_PROGRESS
+        )
+        if not schema_audit:
+            print(f"❌ No se encontró schema_audit {schema_audit_id}")
+            return
 
         service = get_schema_audit_service()
         total_input_tokens = 0
         total_output_tokens = 0
 
-        with db_manager.sync_session_context() as session:
-            schema_audit = session.get(AuditSchemaReview, schema_audit_id)
-            if not schema_audit:
-                raise Exception("Schema audit no encontrado")
+        original_schema = schema_audit.original_schema_json
+        proposed_schema = schema_audit.proposed_schema_json
+        incoming_schema = schema_audit.incoming_schema_json
 
-            original_schema = schema_audit.original_schema_json
-            proposed_schema = schema_audit.proposed_schema_json
-            incoming_schema = schema_audit.incoming_schema_json
+        # Validación JSON-LD (expansión PyLD) en el pool de procesos
+        original_validation, proposed_validation, incoming_validation = await asyncio.gather(
+            run_cpu(validate_schema_payload, original_schema, "original"),
+            run_cpu(validate_schema_payload, proposed_schema, "proposed"),
+            run_cpu(validate_schema_payload, incoming_schema, "incoming")
+        )
+        validations = {
+            "original": original_validation,
+            "proposed": proposed_validation,
+            "incoming": incoming_validation
+        }
 
-            validations = {
-                "original": service.validate_schema_payload(original_schema, "original"),
-                "proposed": service.validate_schema_payload(proposed_schema, "proposed"),
-                "incoming": service.validate_schema_payload(incoming_schema, "incoming")
-            }
+        if not validations["proposed"]["is_valid"]:
+            raise Exception("El esquema propuesto final no es válido o no está presente")
+        if not validations["incoming"]["is_valid"]:
+            raise Exception("El esquema nuevo recibido no cumple validación base de schema.org")
 
-            schema_audit.schema_org_validation_result = validations
+        structural_result = await run_cpu(
+            build_structural_comparison,
+            original_schema=original_schema,
+            proposed_schema=proposed_schema,
+            incoming_schema=incoming_schema
+        )
 
-            if not validations["proposed"]["is_valid"]:
-                raise Exception("El esquema propuesto final no es válido o no está presente")
-            if not validations["incoming"]["is_valid"]:
-                raise Exception("El esquema nuevo recibido no cumple validación base de schema.org")
+        progress_report = {
+            "implemented": structural_result.get("delta", {}).get("implemented_from_proposed", []),
+            "pending": structural_result.get("delta", {}).get("pending_from_proposed", []),
+            "out_of_scope": structural_result.get("delta", {}).get("new_not_in_proposed", []),
+            "comparison_table": structural_result.get("comparison_table", {}),
+            "original_integrity": structural_result.get("original_integrity", {})
+        }
 
-            structural_result = service.build_structural_comparison(
-                original_schema=original_schema,
-                proposed_schema=proposed_schema,
-                incoming_schema=incoming_schema
-            )
+        def _save_structural():
+            with db_manager.sync_session_context() as session:
+                schema_audit = session.get(AuditSchemaReview, schema_audit_id)
+                if not schema_audit:
+                    raise Exception("Schema audit no encontrado")
 
-            schema_audit.triple_comparison_result = structural_result
-            schema_audit.progress_report = {
-                "implemented": structural_result.get("delta", {}).get("implemented_from_proposed", []),
-                "pending": structural_result.get("delta", {}).get("pending_from_proposed", []),
-                "out_of_scope": structural_result.get("delta", {}).get("new_not_in_proposed", []),
-                "comparison_table": structural_result.get("comparison_table", {}),
-                "original_integrity": structural_result.get("original_integrity", {})
-            }
+                schema_audit.schema_org_validation_result = validations
+                schema_audit.triple_comparison_result = structural_result
+                schema_audit.progress_report = progress_report
+                session.add(schema_audit)
 
-            session.add(schema_audit)
+        await run_db(_save_structural)
 
         ai_triple_report = None
         ai_cqrs_model = None
 
         if schema_audit.include_ai_analysis:
             ai_triple_report = await service.generate_triple_comparison_ai(
-                original_schema=schema_audit.original_schema_json,
-                proposed_schema=schema_audit.proposed_schema_json,
-                incoming_schema=schema_audit.incoming_schema_json,
-                structural_result=schema_audit.triple_comparison_result,
+                original_schema=original_schema,
+                proposed_schema=proposed_schema,
+                incoming_schema=incoming_schema,
+                structural_result=structural_result,
                 token=token
             )
             usage_1 = ai_triple_report.get("usage", {})
@@ -460,8 +675,8 @@ async def run_schema_audit_task(
             total_output_tokens += usage_1.get("completion_tokens", 0)
 
             ai_cqrs_model = await service.generate_cqrs_solid_model_ai(
-                proposed_schema=schema_audit.proposed_schema_json,
-                incoming_schema=schema_audit.incoming_schema_json,
+                proposed_schema=proposed_schema,
+                incoming_schema=incoming_schema,
                 programming_language=schema_audit.programming_language,
                 token=token
             )
@@ -469,44 +684,41 @@ async def run_schema_audit_task(
             total_input_tokens += usage_2.get("prompt_tokens", 0)
             total_output_tokens += usage_2.get("completion_tokens", 0)
 
-        with db_manager.sync_session_context() as session:
-            schema_audit = session.get(AuditSchemaReview, schema_audit_id)
-            if not schema_audit:
-                raise Exception("Schema audit no encontrado al finalizar")
-
-            ai_report_text = ai_triple_report.get("content", "") if ai_triple_report else ""
-            cqrs_text = ai_cqrs_model.get("content", "") if ai_cqrs_model else ""
-
-            schema_audit.cqrs_solid_model_text = cqrs_text
-            schema_audit.progress_report = {
-                **(schema_audit.progress_report or {}),
-                "ai_report": ai_report_text
-            }
-
-            schema_audit.report_pdf_path = None
-            schema_audit.report_word_path = None
-            schema_audit.input_tokens = total_input_tokens
-            schema_audit.output_tokens = total_output_tokens
-            schema_audit.status = SchemaAuditStatus.COMPLETED
-            schema_audit.completed_at = datetime.utcnow()
-            session.add(schema_audit)
+        def _save_results():
+            with db_manager.sync_session_context() as session:
+                schema_audit = session.get(AuditSchemaReview, schema_audit_id)
+                if not schema_audit:
+                    raise Exception("Schema audit no encontrado al finalizar")
+
+                ai_report_text = ai_triple_report.get("content", "") if ai_triple_report else ""
+                cqrs_text = ai_cqrs_model.get("content", "") if ai_cqrs_model else ""
+
+                schema_audit.cqrs_solid_model_text = cqrs_text
+                schema_audit.progress_report = {
+                    **(schema_audit.progress_report or {}),
+                    "ai_report": ai_report_text
+                }
+
+                schema_audit.report_pdf_path = None
+                schema_audit.report_word_path = None
+                schema_audit.input_tokens = total_input_tokens
+                schema_audit.output_tokens = total_output_tokens
+                schema_audit.status = SchemaAuditStatus.COMPLETED
+                schema_audit.completed_at = datetime.utcnow()
+                session.add(schema_audit)
+
+        await run_db(_save_results)
 
         print(f"✅ Auditoría de schemas completada: {schema_audit_id}")
     except Exception as e:
         print(f"❌ Error en auditoría de schemas {schema_audit_id}: {e}")
         import traceback
         traceback.print_exc()
+        if reraise:
+            raise
 
         try:
-            with db_manager.sync_session_context() as session:
-                if schema_audit is None:
-                    schema_audit = session.get(AuditSchemaReview, schema_audit_id)
-
-                if schema_audit:
-                    schema_audit.status = SchemaAuditStatus.FAILED
-                    schema_audit.error_message = str(e)
-                    schema_audit.completed_at = datetime.utcnow()
-                    session.add(schema_audit)
+            await run_db(_mark_failed_sync, AuditSchemaReview, schema_audit_id, str(e))
         except Exception as inner_error:
             print(f"❌ Error al guardar estado de fallo schema audit: {inner_error}")
 
@@ -519,141 +731,231 @@ async def run_url_validation_task(
     description_validation: str,
     ai_instruction: str,
     token: str,
+    reraise: bool = False,
 ):
     """
-    Ejecutar validación de schemas por URL en segundo plano.
-    Procesa cada URL individualmente con lapsos aleatorios.
-    Si una URL falla, continúa con las siguientes.
+    Ejecutar validación de schemas por URL en segundo plano (``reraise``: ver
+    ``run_audit_task``).
+    Las URLs se procesan con UrlPipelineScheduler (ventana adaptativa y
+    límite de peticiones por host). Si una URL falla, continúa con las siguientes.
     """
-    import asyncio
-    import random
-    from app.services.url_validation_service import get_url_validation_service
-
-    validation = None
+    from app.services.url_validation_service import URL_PLACEHOLDER, get_url_validation_service
 
     try:
         # Actualizar estado a IN_PROGRESS
-        with db_manager.sync_session_context() as session:
-            validation = session.get(AuditUrlValidation, validation_id)
-            if not validation:
-                print(f"❌ No se encontró url_validation {validation_id}")
-                return
-            validation.status = UrlValidationStatus.IN_PROGRESS
-            session.add(validation)
+        validation = await run_db(
+            _set_status_sync, AuditUrlValidation, validation_id, UrlValidationStatus.IN_PROGRESS
+        )
+        if not validation:
+            print(f"❌ No se encontró url_validation {validation_id}")
+            return
 
         service = get_url_validation_service()
-        total_input_tokens = 0
-        total_output_tokens = 0
-        results = []
-
-        BATCH_SIZE = 5
         total_urls = len(urls)
-        chunks = [urls[i:i + BATCH_SIZE] for i in range(0, total_urls, BATCH_SIZE)]
 
-        print(f"🚀 Iniciando validación de {total_urls} URLs en {len(chunks)} grupos de {BATCH_SIZE} — {name_validation}")
+        # Reanudación: conservar resultados ya guardados (sin error) de un
+        # intento anterior y procesar solo las URLs restantes.
+        done_by_url = {
+            entry["url"]: entry
+            for entry in (validation.results_json or [])
+            if isinstance(entry, dict) and entry.get("url") in urls and not entry.get("error")
+        }
+        if done_by_url:
+            total_input_tokens = validation.input_tokens or 0
+            total_output_tokens = validation.output_tokens or 0
+        else:
+            total_input_tokens = 0
+            total_output_tokens = 0
+        pending_urls = [url for url in urls if url not in done_by_url]
+
+        print(
+            f"🚀 Iniciando validación de {total_urls} URLs — {name_validation}"
+            + (f" (reanudando: {len(done_by_url)} ya procesadas)" if done_by_url else "")
+        )
+
+        # Análisis IA por huella de schema: la primera URL del grupo envía a la
+        # IA la plantilla del schema (valores como marcadores) y el resto espera
+        # y reutiliza ese reporte; cada URL lo rellena con sus propios valores.
+        # Al reanudar se siembran los grupos con las plantillas ya guardadas.
+        ai_groups: Dict[str, asyncio.Future] = {}
+        for entry in done_by_url.values():
+            fingerprint = entry.get("schema_fingerprint")
+            if (
+                fingerprint
+                and fingerprint not in ai_groups
+                and entry.get("ai_report_template")
+                and not entry.get("ai_report_shared_from")
+            ):
+                seeded = asyncio.get_running_loop().create_future()
+                seeded.set_result((entry["url"], {"content": entry["ai_report_template"]}))
+                ai_groups[fingerprint] = seeded
+
+        async def _group_analysis(fingerprint: str, url: str, template: Any, validation_result: dict) -> tuple:
+            """Devuelve (url_origen, resultado_ia de la plantilla, compartido)."""
+            while (group := ai_groups.get(fingerprint)) is not None:
+                try:
+                    source_url, ai_result = await asyncio.shield(group)
+                except _GroupLeaderCancelled:
+                    # Se canceló la URL que analizaba el grupo: la siguiente en espera toma el relevo
+                    continue
+                return source_url, ai_result, True
 
-        async def _process_single_url(url: str, idx: int) -> tuple:
-            """Procesa una URL y devuelve (result_entry, input_tokens, output_tokens)."""
-            print(f"    → [{idx}/{total_urls}] Procesando: {url}")
+            group = asyncio.get_running_loop().create_future()
+            ai_groups[fingerprint] = group
+            try:
+                ai_result = await service.generate_url_analysis_ai(
+                    url=URL_PLACEHOLDER,
+                    url_schema=template,
+                    proposed_schema=proposed_schema,
+                    validation_errors=service.template_validation(url, validation_result),
+                    name_validation=name_validation,
+                    description_validation=description_validation,
+                    ai_instruction=ai_instruction,
+                    token=token,
+                    shared_template=True,
+                )
+            except asyncio.CancelledError:
+                ai_groups.pop(fingerprint, None)
+                group.set_exception(_GroupLeaderCancelled(fingerprint))
+                group.exception()
+                raise
+            except Exception as e:
+                # Las URLs que ya esperaban reciben el error; las siguientes reintentan
+                ai_groups.pop(fingerprint, None)
+                group.set_exception(e)
+                group.exception()
+                raise
+            group.set_result((url, ai_result))
+            return url, ai_result, False
+
+        async def _fetch_url(url: str) -> list:
+            """Fase de red: extraer schemas de la URL (con timeout 30s)."""
+            return await service.fetch_schema_for_url(url, timeout_ms=30_000)
+
+        async def _analyze_url(url: str, url_schemas: list) -> tuple:
+            """Fase de validación + IA. Devuelve (result_entry, input_tokens, output_tokens)."""
             result_entry = {"url": url}
             in_tok = 0
             out_tok = 0
 
-            try:
-                # 1. Extraer schemas de la URL (con timeout 30s)
-                url_schemas = await service.fetch_schema_for_url(url, timeout_ms=30_000)
-
-                if not url_schemas:
-                    result_entry["schema_types_found"] = []
-                    result_entry["validation_errors"] = {"errors": ["No se detectaron schemas en la URL"]}
-                    result_entry["severity"] = "warning"
-                    result_entry["ai_report"] = ""
-                    result_entry["comparison_table"] = {}
-                    print(f"    ⚠️  Sin schemas en {url}")
-                    return result_entry, in_tok, out_tok
-
-                # 2. Extraer tipos encontrados
-                types_found = []
-                url_schemas = filter_open_graph_schemas(url_schemas)
-
-                for schema in url_schemas:
-                    if isinstance(schema, dict):
-                        stype = schema.get("@type")
-                        if isinstance(stype, str):
-                            types_found.append(stype)
-                        elif isinstance(stype, list):
-                            types_found.extend([t for t in stype if isinstance(t, str)])
-                        # Buscar en @graph
-                        graph = schema.get("@graph", [])
-                        if isinstance(graph, list):
-                            for node in graph:
-                                if isinstance(node, dict):
-                                    ntype = node.get("@type")
-                                    if isinstance(ntype, str):
-                                        types_found.append(ntype)
-                                    elif isinstance(ntype, list):
-                                        types_found.extend([t for t in ntype if isinstance(t, str)])
+            if not url_schemas:
+                result_entry["schema_types_found"] = []
+                result_entry["validation_errors"] = {"errors": ["No se detectaron schemas en la URL"]}
+                result_entry["severity"] = "warning"
+                result_entry["ai_report"] = ""
+                result_entry["comparison_table"] = {}
+                print(f"    ⚠️  Sin schemas en {url}")
+                return result_entry, in_tok, out_tok
+
+            # 2. Extraer tipos encontrados
+            types_found = []
+            url_schemas = filter_open_graph_schemas(url_schemas)
+
+            for schema in url_schemas:
+                if isinstance(schema, dict):
+                    stype = schema.get("@type")
+                    if isinstance(stype, str):
+                        types_found.append(stype)
+                    elif isinstance(stype, list):
+                        types_found.extend([t for t in stype if isinstance(t, str)])
+                    # Buscar en @graph
+                    graph = schema.get("@graph", [])
+                    if isinstance(graph, list):
+                        for node in graph:
+                            if isinstance(node, dict):
+                                ntype = node.get("@type")
+                                if isinstance(ntype, str):
+                                    types_found.append(ntype)
+                                elif isinstance(ntype, list):
+                                    types_found.extend([t for t in ntype if isinstance(t, str)])
 
-                result_entry["schema_types_found"] = sorted(set(types_found))
-                result_entry["extracted_schemas"] = url_schemas
+            result_entry["schema_types_found"] = sorted(set(types_found))
+            result_entry["extracted_schemas"] = url_schemas
 
-                # 3. Validación estructural
-                validation_result = service.validate_url_schema(url_schemas, url)
-                result_entry["validation_errors"] = validation_result
+            # 3. Validación estructural
+            validation_result = await run_cpu(validate_schema_payload, url_schemas, url)
+            result_entry["validation_errors"] = validation_result
 
-                # 4. Análisis IA
-                try:
-                    ai_result = await service.generate_url_analysis_ai(
-                        url=url,
-                        url_schema=url_schemas,
-                        proposed_schema=proposed_schema,
-                        validation_errors=validation_result,
-                        name_validation=name_validation,
-                        description_validation=description_validation,
-                        ai_instruction=ai_instruction,
-                        token=token,
-                    )
+            # 4. Análisis IA (uno por grupo de URLs con la misma huella)
+            fingerprint = service.schema_fingerprint(url, url_schemas, validation_result)
+            result_entry["schema_fingerprint"] = fingerprint
+            try:
+                template, values = service.schema_template(url_schemas)
+                source_url, ai_result, shared = await _group_analysis(
+                    fingerprint, url, template, validation_result
+                )
 
-                    ai_content = ai_result.get("content", "")
+                template_report = ai_result.get("content", "")
+                if shared:
+                    ai_content = service.fill_shared_report(template_report, url, values, source_url)
+                    result_entry["ai_report_shared_from"] = source_url
+                else:
+                    ai_content = service.fill_shared_report(template_report, url, values)
+                    result_entry["ai_report_template"] = template_report
                     usage = ai_result.get("usage", {})
                     in_tok += usage.get("prompt_tokens", 0)
                     out_tok += usage.get("completion_tokens", 0)
 
-                    result_entry["ai_report"] = ai_content
-                    result_entry["severity"] = service.extract_severity_from_ai(ai_content)
-
-                except Exception as ai_err:
-                    print(f"    ⚠️  Error IA para {url}: {ai_err}")
-                    result_entry["ai_report"] = f"Error en análisis IA: {ai_err}"
-                    result_entry["severity"] = "warning"
+                result_entry["ai_report"] = ai_content
+                result_entry["severity"] = service.extract_severity_from_ai(ai_content)
 
-            except Exception as url_err:
-                print(f"    ❌ Error procesando {url}: {url_err}")
-                result_entry["error"] = str(url_err)
+            except Exception as ai_err:
+                print(f"    ⚠️  Error IA para {url}: {ai_err}")
+                result_entry["ai_report"] = f"Error en análisis IA: {ai_err}"
                 result_entry["severity"] = "warning"
 
             return result_entry, in_tok, out_tok
 
-        # Procesar URLs en grupos de BATCH_SIZE en paralelo
-        processed = 0
-        for batch_num, chunk in enumerate(chunks, 1):
-            print(f"  🔄 Grupo {batch_num}/{len(chunks)}: {len(chunk)} URLs en paralelo")
-            tasks = [
-                _process_single_url(url, processed + i + 1)
-                for i, url in enumerate(chunk)
-            ]
-            batch_results = await asyncio.gather(*tasks)
-            for entry, in_tok, out_tok in batch_results:
-                results.append(entry)
-                total_input_tokens += in_tok
-                total_output_tokens += out_tok
-            processed += len(chunk)
-
-            # Delay entre grupos (no dentro del grupo)
-            if batch_num < len(chunks):
-                delay = random.uniform(2, 5)
-                print(f"  ⏳ Esperando {delay:.1f}s antes del siguiente grupo...")
-                await asyncio.sleep(delay)
+        def _url_error(url: str, url_err: Exception) -> tuple:
+            print(f"    ❌ Error procesando {url}: {url_err}")
+            return {"url": url, "error": str(url_err), "severity": "warning"}, 0, 0
+
+        checkpoint_lock = asyncio.Lock()
+        unsaved = 0
+        last_checkpoint = time.monotonic()
+
+        async def _checkpoint():
+            nonlocal unsaved, last_checkpoint
+            async with checkpoint_lock:
+                if not unsaved:
+                    return
+                ordered = [done_by_url[u] for u in urls if u in done_by_url]
+                unsaved = 0
+                last_checkpoint = time.monotonic()
+                await run_db(
+                    _checkpoint_url_validation_sync,
+                    validation_id,
+                    ordered,
+                    total_urls,
+                    total_input_tokens,
+                    total_output_tokens,
+                )
+
+        async def _on_url_done(index: int, url: str, result: tuple):
+            nonlocal unsaved, total_input_tokens, total_output_tokens
+            entry, in_tok, out_tok = result
+            done_by_url[url] = entry
+            total_input_tokens += in_tok
+            total_output_tokens += out_tok
+            unsaved += 1
+            print(f"    → [{len(done_by_url)}/{total_urls}] Completada: {url}")
+            if (
+                unsaved >= settings.URL_VALIDATION_CHECKPOINT_EVERY
+                or time.monotonic() - last_checkpoint >= settings.URL_VALIDATION_CHECKPOINT_SECONDS
+            ):
+                await _checkpoint()
+
+        # Ventana deslizante adaptativa + token bucket por host; la IA de una
+        # URL se solapa con el fetch de las siguientes.
+        scheduler = UrlPipelineScheduler(
+            fetch_stage=_fetch_url,
+            analyze_stage=_analyze_url,
+            error_stage=_url_error,
+            on_result=_on_url_done,
+        )
+        await scheduler.run(pending_urls)
+        await _checkpoint()
+        results = [done_by_url[u] for u in urls if u in done_by_url]
 
         # Calcular severidad global
         global_severity = service.compute_global_severity(results)
@@ -680,37 +982,37 @@ async def run_url_validation_task(
             traceback.print_exc()
 
         # Guardar resultados finales
-        with db_manager.sync_session_context() as session:
-            validation = session.get(AuditUrlValidation, validation_id)
-            if validation:
-                validation.status = UrlValidationStatus.COMPLETED
-                validation.results_json = results
-                validation.global_severity = global_severity
-                validation.input_tokens = total_input_tokens
-                validation.output_tokens = total_output_tokens
-                validation.report_pdf_path = None
-                validation.report_word_path = None
-                validation.global_report_pdf_path = None
-                validation.global_report_word_path = None
-                validation.global_report_ai_text = global_report_ai_text
-                validation.completed_at = datetime.utcnow()
-                session.add(validation)
+        def _save_results():
+            with db_manager.sync_session_context() as session:
+                validation = session.get(AuditUrlValidation, validation_id)
+                if validation:
+                    validation.status = UrlValidationStatus.COMPLETED
+                    validation.results_json = results
+                    validation.processed_urls = len(results)
+                    validation.total_urls = total_urls
+                    validation.global_severity = global_severity
+                    validation.input_tokens = total_input_tokens
+                    validation.output_tokens = total_output_tokens
+                    validation.report_pdf_path = None
+                    validation.report_word_path = None
+                    validation.global_report_pdf_path = None
+                    validation.global_report_word_path = None
+                    validation.global_report_ai_text = global_report_ai_text
+                    validation.completed_at = datetime.utcnow()
+                    session.add(validation)
+
+        await run_db(_save_results)
 
         print(f"✅ Validación de URLs completada: {validation_id} — Severidad global: {global_severity}")
     except Exception as e:
         print(f"❌ Error en validación de URLs {validation_id}: {e}")
         import traceback
         traceback.print_exc()
+        if reraise:
+            raise
 
         try:
-            with db_manager.sync_session_context() as session:
-                if validation is None:
-                    validation = session.get(AuditUrlValidation, validation_id)
-                if validation:
-                    validation.status = UrlValidationStatus.FAILED
-                    validation.error_message = str(e)
-                    validation.completed_at = datetime.utcnow()
-                    session.add(validation)
+            await run_db(_mark_failed_sync, AuditUrlValidation, validation_id, str(e))
         except Exception as inner_error:
             print(f"❌ Error al guardar estado de fallo url_validation: {inner_error}")
 
@@ -781,22 +1083,23 @@ async def run_url_validation_single_url_task(
     description_validation: str,
     ai_instruction: str,
     token: str,
+    reraise: bool = False,
 ):
     """
-    Vuelve a analizar una única URL dentro de una AuditUrlValidation existente.
+    Vuelve a analizar una única URL dentro de una AuditUrlValidation existente
+    (``reraise``: ver ``run_audit_task``).
     Actualiza solo la entrada correspondiente en results_json y recalcula global_severity.
     El resto de los resultados se conserva intacto.
     """
     from app.services.url_validation_service import get_url_validation_service
 
     try:
-        with db_manager.sync_session_context() as session:
-            validation = session.get(AuditUrlValidation, validation_id)
-            if not validation:
-                print(f"❌ run_url_validation_single_url_task: validación {validation_id} no encontrada")
-                return
-            validation.status = UrlValidationStatus.IN_PROGRESS
-            session.add(validation)
+        validation = await run_db(
+            _set_status_sync, AuditUrlValidation, validation_id, UrlValidationStatus.IN_PROGRESS
+        )
+        if not validation:
+            print(f"❌ run_url_validation_single_url_task: validación {validation_id} no encontrada")
+            return
 
         service = get_url_validation_service()
         print(f"🔁 Re-analizando URL individual: {target_url} — {name_validation}")
@@ -837,7 +1140,7 @@ async def run_url_validation_single_url_task(
                 result_entry["schema_types_found"] = sorted(set(types_found))
                 result_entry["extracted_schemas"] = url_schemas
 
-                validation_result = service.validate_url_schema(url_schemas, target_url)
+                validation_result = await run_cpu(validate_schema_payload, url_schemas, target_url)
                 result_entry["validation_errors"] = validation_result
 
                 try:
@@ -868,48 +1171,272 @@ async def run_url_validation_single_url_task(
             result_entry["severity"] = "warning"
 
         # Actualizar solo la entrada de esa URL en results_json
-        with db_manager.sync_session_context() as session:
-            validation = session.get(AuditUrlValidation, validation_id)
-            if not validation:
-                return
-
-            current_results: list = list(validation.results_json or [])
-
-            # Reemplazar la entrada existente o añadirla si no estaba
-            updated = False
-            for idx, item in enumerate(current_results):
-                if isinstance(item, dict) and item.get("url") == target_url:
-                    current_results[idx] = result_entry
-                    updated = True
-                    break
-            if not updated:
-                current_results.append(result_entry)
-
-            new_global_severity = service.compute_global_severity(current_results)
-
-            validation.results_json = current_results
-            validation.global_severity = new_global_severity
-            validation.input_tokens = (validation.input_tokens or 0) + in_tok
-            validation.output_tokens = (validation.output_tokens or 0) + out_tok
-            validation.report_pdf_path = None
-            validation.report_word_path = None
-            validation.global_report_pdf_path = None
-            validation.global_report_word_path = None
-            validation.status = UrlValidationStatus.COMPLETED
-            validation.completed_at = datetime.utcnow()
-            session.add(validation)
+        def _merge_result():
+            with db_manager.sync_session_context() as session:
+                validation = session.get(AuditUrlValidation, validation_id)
+                if not validation:
+                    return
+
+                current_results: list = list(validation.results_json or [])
+
+                # Reemplazar la entrada existente o añadirla si no estaba
+                updated = False
+                for idx, item in enumerate(current_results):
+                    if isinstance(item, dict) and item.get("url") == target_url:
+                        current_results[idx] = result_entry
+                        updated = True
+                        break
+                if not updated:
+                    current_results.append(result_entry)
+
+                new_global_severity = service.compute_global_severity(current_results)
+
+                validation.results_json = current_results
+                validation.processed_urls = len(current_results)
+                validation.global_severity = new_global_severity
+                validation.input_tokens = (validation.input_tokens or 0) + in_tok
+                validation.output_tokens = (validation.output_tokens or 0) + out_tok
+                validation.report_pdf_path = None
+                validation.report_word_path = None
+                validation.global_report_pdf_path = None
+                validation.global_report_word_path = None
+                validation.status = UrlValidationStatus.COMPLETED
+                validation.completed_at = datetime.utcnow()
+                session.add(validation)
+
+        await run_db(_merge_result)
 
         print(f"✅ Re-análisis de URL individual completado: {target_url} — validación {validation_id}")
     except Exception as e:
         print(f"❌ Error en re-análisis de URL individual {validation_id}/{target_url}: {e}")
         import traceback
         traceback.print_exc()
+        if reraise:
+            raise
         try:
-            with db_manager.sync_session_context() as session:
-                validation = session.get(AuditUrlValidation, validation_id)
-                if validation:
-                    validation.status = UrlValidationStatus.FAILED
-                    validation.error_message = str(e)
-                    session.add(validation)
+            await run_db(_mark_failed_sync, AuditUrlValidation, validation_id, str(e), set_completed_at=False)
         except Exception as inner:
             print(f"❌ Error al guardar estado de fallo: {inner}")
+
+
+# ---------------------------------------------------------------------------
+# Cola de trabajos: registro de handlers, despacho y recuperación
+# ---------------------------------------------------------------------------
+
+class JobType(str, Enum):
+    """Tipos de trabajo que procesa el worker"""
+    AUDIT = "audit"
+    COMPARISON = "comparison"
+    SCHEMA_AUDIT = "schema_audit"
+    URL_VALIDATION = "url_validation"
+    URL_VALIDATION_SINGLE = "url_validation_single"
+
+
+def _get_row_sync(model: Type, entity_id: UUID) -> Optional[Any]:
+    with db_manager.sync_session_context() as session:
+        return session.get(model, entity_id)
+
+
+async def _audit_job(
+    audit_id: str,
+    web_page_id: str,
+    include_ai: bool,
+    token: str,
+    sample_runs: Optional[int] = None,
+    reraise: bool = False
+):
+    webpage = await run_db(_get_row_sync, WebPage, UUID(web_page_id))
+    if not webpage:
+        print(f"❌ No se encontró target {web_page_id} para audit {audit_id}")
+        return
+    await run_audit_task(
+        audit_id=UUID(audit_id),
+        webpage=webpage,
+        include_ai=include_ai,
+        token=token,
+        sample_runs=sample_runs,
+        reraise=reraise
+    )
+
+
+async def _comparison_job(
+    comparison_id: str,
+    base_web_page_id: str,
+    competitor_ids: List[str],
+    include_ai: bool,
+    token: str,
+    user_id: str,
+    max_audit_age_hours: Optional[float] = None,
+    reraise: bool = False
+):
+    await run_comparison_task(
+        comparison_id=UUID(comparison_id),
+        base_web_page_id=UUID(base_web_page_id),
+        competitor_ids=[UUID(c) for c in competitor_ids],
+        include_ai=include_ai,
+        token=token,
+        user_id=UUID(user_id),
+        max_audit_age_hours=max_audit_age_hours,
+        reraise=reraise
+    )
+
+
+async def _schema_audit_job(schema_audit_id: str, token: str, reraise: bool = False):
+    await run_schema_audit_task(schema_audit_id=UUID(schema_audit_id), token=token, reraise=reraise)
+
+
+async def _url_validation_job(validation_id: str, **kwargs):
+    await run_url_validation_task(validation_id=UUID(validation_id), **kwargs)
+
+
+async def _url_validation_single_job(validation_id: str, **kwargs):
+    await run_url_validation_single_url_task(validation_id=UUID(validation_id), **kwargs)
+
+
+# tipo -> (handler, modelo de la fila cuyo estado refleja el trabajo)
+JOB_HANDLERS: Dict[str, Tuple[Callable, Type]] = {
+    JobType.AUDIT.value: (_audit_job, AuditReport),
+    JobType.COMPARISON.value: (_comparison_job, AuditComparison),
+    JobType.SCHEMA_AUDIT.value: (_schema_audit_job, AuditSchemaReview),
+    JobType.URL_VALIDATION.value: (_url_validation_job, AuditUrlValidation),
+    JobType.URL_VALIDATION_SINGLE.value: (_url_validation_single_job, AuditUrlValidation),
+}
+
+
+async def dispatch_job(
+    background_tasks: BackgroundTasks,
+    job_type: JobType,
+    entity_id: UUID,
+    **payload: Any
+):
+    """
+    Encola un trabajo en Redis para el worker. Si la cola está deshabilitada
+    (o Redis no responde) lo ejecuta con BackgroundTasks dentro del API; con la
+    cola habilitada esa ejecución se registra en ella (``_run_in_process``).
+    """
+    handler, model = JOB_HANDLERS[job_type.value]
+    # Normalizar (UUID -> str) para que ambos caminos reciban el mismo payload
+    payload = json.loads(json.dumps(payload, default=str))
+
+    if settings.JOB_QUEUE_ENABLED:
+        try:
+            await get_job_queue().enqueue(
+                job_type.value,
+                payload,
+                entity_table=model.__tablename__,
+                entity_id=str(entity_id),
+            )
+            return
+        except Exception as e:
+            print(f"⚠️  No se pudo encolar {job_type.value} ({entity_id}), se ejecuta en el API: {e}")
+            background_tasks.add_task(_run_in_process, job_type, model, entity_id, handler, payload)
+            return
+
+    background_tasks.add_task(handler, **payload)
+
+
+async def _run_in_process(
+    job_type: JobType,
+    model: Type,
+    entity_id: UUID,
+    handler: Callable,
+    payload: Dict[str, Any]
+):
+    """
+    Ejecuta en el API un trabajo que no se pudo encolar y lo registra en la
+    cola como trabajo en curso (reintentando hasta que Redis responda) con
+    heartbeats. Así la recuperación del worker no toma su fila por huérfana
+    y, si el API se reinicia a mitad, el trabajo vuelve a la cola.
+    """
+    queue = get_job_queue()
+    job: Optional[Dict[str, Any]] = None
+
+    async def keep_alive():
+        nonlocal job
+        interval = max(1.0, settings.JOB_VISIBILITY_TIMEOUT_SECONDS / 3)
+        while True:
+            try:
+                if job is None:
+                    job = await queue.start_local(job_type.value, payload, model.__tablename__, str(entity_id))
+                else:
+                    await queue.heartbeat(job)
+            except Exception as e:
+                print(f"⚠️  No se pudo registrar {job_type.value} ({entity_id}) en la cola: {e}")
+            await asyncio.sleep(interval)
+
+    heartbeat = asyncio.create_task(keep_alive())
+    try:
+        await handler(**payload)
+    finally:
+        heartbeat.cancel()
+        try:
+            await heartbeat
+        except asyncio.CancelledError:
+            pass
+        if job is not None:
+            try:
+                await queue.ack(job)
+            except Exception as e:
+                print(f"⚠️  No se pudo cerrar {job_type.value} ({entity_id}) en la cola: {e}")
+
+
+def mark_job_entity_failed(entity_table: str, entity_id: str, error_message: str):
+    """Marca como FAILED la fila asociada a un trabajo que no se completará."""
+    models = {model.__tablename__: model for _, model in JOB_HANDLERS.values()}
+    model = models.get(entity_table)
+    if model is None:
+        return
+
+    _mark_failed_sync(model, UUID(entity_id), error_message, only_if_active=True)
+
+
+async def recover_stuck_jobs():
+    """
+    Recuperación periódica (la ejecuta el worker):
+    1. Re-encola trabajos cuyo worker (o API, en el fallback en proceso) murió
+       (visibility timeout expirado). Todos los handlers son re-ejecutables:
+       reescriben su fila o, en las validaciones de URLs, reanudan desde el
+       último checkpoint.
+    2. Marca como FAILED las filas IN_PROGRESS que llevan más de
+       JOB_ORPHAN_GRACE_SECONDS sin trabajo vivo, contado desde la primera
+       vez que se vieron así (no desde ``created_at``: una fila re-ejecutada
+       conserva su fecha de creación). Sin payload en la cola no se pueden
+       re-encolar.
+    """
+    queue = get_job_queue()
+
+    for job in await queue.requeue_expired():
+        if job.get("entity_table") and job.get("entity_id"):
+            await run_db(
+                mark_job_entity_failed,
+                job["entity_table"],
+                job["entity_id"],
+                f"La tarea se interrumpió y agotó sus reintentos: {job.get('last_error')}"
+            )
+
+    grace = settings.JOB_ORPHAN_GRACE_SECONDS
+
+    def _in_progress_ids(model: Type) -> List[UUID]:
+        with db_manager.sync_session_context() as session:
+            return session.execute(
+                select(model.id).where(sql_cast(model.status, String) == "in_progress")
+            ).scalars().all()
+
+    for model in {model for _, model in JOB_HANDLERS.values()}:
+        in_progress_ids = await run_db(_in_progress_ids, model)
+
+        for entity_id in in_progress_ids:
+            if await queue.has_live_job(model.__tablename__, str(entity_id)):
+                await queue.clear_orphaned(model.__tablename__, str(entity_id))
+                continue
+            orphaned_since = await queue.orphaned_since(model.__tablename__, str(entity_id), ttl=grace * 4)
+            if time.time() - orphaned_since < grace:
+                continue
+            await queue.clear_orphaned(model.__tablename__, str(entity_id))
+            print(f"🧹 {model.__tablename__} {entity_id} atascado en IN_PROGRESS sin trabajo vivo")
+            await run_db(
+                mark_job_entity_failed,
+                model.__tablename__,
+                str(entity_id),
+                "La tarea se interrumpió (reinicio del servidor). Vuelve a ejecutarla."
+            )
@@ -0,0 +1,328 @@
+"""
+Pool compartido de navegadores Chromium (Playwright).
+
+En lugar de lanzar y matar un Chromium por cada URL, el pool mantiene
+``BROWSER_POOL_SIZE`` navegadores vivos y presta contextos aislados
+(``BrowserContext``) a quien los solicite:
+
+- Cada navegador atiende como máximo ``BROWSER_POOL_CONTEXTS_PER_BROWSER``
+  contextos simultáneos; si todos están llenos, ``lease()`` espera.
+- Tras ``BROWSER_POOL_MAX_PAGES_PER_BROWSER`` contextos servidos (o si el
+  proceso se desconecta/crashea) el navegador se retira: deja de recibir
+  contextos nuevos y se cierra cuando el último contexto activo se libera.
+- ``stats()`` expone el estado del pool para monitoreo.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from playwright.async_api import async_playwright, Browser, BrowserContext, Playwright
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+)
+
+BROWSER_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-infobars',
+    '--window-position=0,0',
+    '--ignore-certificate-errors',
+    '--disable-extensions',
+    '--disable-dev-shm-usage',
+    f'--user-agent={DEFAULT_USER_AGENT}'
+]
+
+
+class _PooledBrowser:
+    """Estado de un navegador dentro del pool."""
+
+    def __init__(self, slot_id: int, browser: Browser):
+        self.slot_id = slot_id
+        self.browser = browser
+        self.active_contexts = 0
+        self.contexts_served = 0
+        self.launched_at = datetime.utcnow()
+        self.crashed = False
+        self.retiring = False
+
+    @property
+    def is_healthy(self) -> bool:
+        return not self.crashed and self.browser.is_connected()
+
+
+class BrowserPool:
+    """
+    Pool de navegadores Chromium con presupuesto de contextos por navegador.
+    Seguro para uso concurrente desde múltiples tareas del mismo event loop.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        contexts_per_browser: int,
+        max_contexts_per_browser_lifetime: int,
+        headless: bool = True,
+    ):
+        self.size = max(1, size)
+        self.contexts_per_browser = max(1, contexts_per_browser)
+        self.max_contexts_per_browser_lifetime = max(1, max_contexts_per_browser_lifetime)
+        self.headless = headless
+
+        self._playwright: Optional[Playwright] = None
+        self._slots: List[Optional[_PooledBrowser]] = [None] * self.size
+        self._launching: set = set()
+        self._condition = asyncio.Condition()
+        self._closed = False
+
+        # Métricas acumuladas
+        self._leases_total = 0
+        self._launches_total = 0
+        self._recycled_total = 0
+        self._crashes_total = 0
+        self._waits_total = 0
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        """Arranca el driver de Playwright (los navegadores se lanzan bajo demanda)."""
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+            self._closed = False
+            logger.info(
+                f"🧭 BrowserPool iniciado (browsers={self.size}, "
+                f"contexts/browser={self.contexts_per_browser}, "
+                f"recycle_after={self.max_contexts_per_browser_lifetime})"
+            )
+
+    async def close(self):
+        """Cierra todos los navegadores y detiene Playwright."""
+        async with self._condition:
+            self._closed = True
+            slots = [slot for slot in self._slots if slot is not None]
+            self._slots = [None] * self.size
+            self._condition.notify_all()
+
+        for slot in slots:
+            await self._close_browser(slot)
+
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception as e:
+                logger.warning(f"⚠️ Error deteniendo Playwright: {e}")
+            self._playwright = None
+
+    async def _launch(self, slot_id: int) -> _PooledBrowser:
+        await self.start()
+        browser = await self._playwright.chromium.launch(
+            headless=self.headless,
+            args=BROWSER_ARGS
+        )
+        slot = _PooledBrowser(slot_id, browser)
+        browser.on("disconnected", lambda _: self._mark_crashed(slot))
+        self._launches_total += 1
+        logger.info(f"🚀 BrowserPool: navegador #{slot_id} lanzado")
+        return slot
+
+    def _mark_crashed(self, slot: _PooledBrowser):
+        if not slot.retiring:
+            slot.crashed = True
+            self._crashes_total += 1
+            logger.warning(f"💥 BrowserPool: navegador #{slot.slot_id} desconectado inesperadamente")
+
+    async def _close_browser(self, slot: _PooledBrowser):
+        slot.retiring = True
+        try:
+            if slot.browser.is_connected():
+                await slot.browser.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Error cerrando navegador #{slot.slot_id}: {e}")
+
+    # ------------------------------------------------------------------
+    # Préstamo de contextos
+    # ------------------------------------------------------------------
+
+    def _pick_slot(self) -> Optional[_PooledBrowser]:
+        """Navegador sano con capacidad libre y menos carga."""
+        candidates = [
+            slot for slot in self._slots
+            if slot is not None
+            and not slot.retiring
+            and slot.is_healthy
+            and slot.active_contexts < self.contexts_per_browser
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda s: s.active_contexts)
+
+    def _free_slot_id(self) -> Optional[int]:
+        for slot_id, slot in enumerate(self._slots):
+            if slot is None and slot_id not in self._launching:
+                return slot_id
+        return None
+
+    async def _acquire(self) -> _PooledBrowser:
+        waited = False
+        async with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("BrowserPool cerrado")
+
+                # Retirar navegadores caídos sin contextos activos
+                for slot in list(self._slots):
+                    if slot is not None and not slot.is_healthy and slot.active_contexts == 0:
+                        self._slots[slot.slot_id] = None
+
+                slot = self._pick_slot()
+                if slot is not None:
+                    slot.active_contexts += 1
+                    self._leases_total += 1
+                    if waited:
+                        self._waits_total += 1
+                    return slot
+
+                slot_id = self._free_slot_id()
+                if slot_id is not None:
+                    self._launching.add(slot_id)
+                    break
+
+                waited = True
+                await self._condition.wait()
+
+        # Lanzar fuera del lock para no bloquear a los demás solicitantes
+        try:
+            slot = await self._launch(slot_id)
+        except Exception:
+            async with self._condition:
+                self._launching.discard(slot_id)
+                self._condition.notify_all()
+            raise
+
+        async with self._condition:
+            self._launching.discard(slot_id)
+            self._slots[slot_id] = slot
+            slot.active_contexts += 1
+            self._leases_total += 1
+            if waited:
+                self._waits_total += 1
+            self._condition.notify_all()
+        return slot
+
+    async def _release(self, slot: _PooledBrowser):
+        to_close = None
+        async with self._condition:
+            slot.active_contexts -= 1
+            slot.contexts_served += 1
+
+            if not slot.retiring and (
+                not slot.is_healthy
+                or slot.contexts_served >= self.max_contexts_per_browser_lifetime
+            ):
+                slot.retiring = True
+                self._recycled_total += 1
+                logger.info(
+                    f"♻️ BrowserPool: reciclando navegador #{slot.slot_id} "
+                    f"(servidos={slot.contexts_served}, crashed={slot.crashed})"
+                )
+
+            if slot.retiring and slot.active_contexts == 0:
+                if self._slots[slot.slot_id] is slot:
+                    self._slots[slot.slot_id] = None
+                to_close = slot
+
+            self._condition.notify_all()
+
+        if to_close is not None:
+            await self._close_browser(to_close)
+
+    @asynccontextmanager
+    async def lease(self, **context_options: Any) -> AsyncIterator[BrowserContext]:
+        """
+        Presta un BrowserContext aislado. Se cierra al salir del bloque.
+
+        Uso:
+            async with get_browser_pool().lease(locale='es-MX') as context:
+                page = await context.new_page()
+        """
+        slot = await self._acquire()
+        context: Optional[BrowserContext] = None
+        try:
+            context = await slot.browser.new_context(**context_options)
+            yield context
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            await self._release(slot)
+
+    # ------------------------------------------------------------------
+    # Monitoreo
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado actual y contadores acumulados del pool."""
+        browsers = [
+            {
+                "slot": slot.slot_id,
+                "active_contexts": slot.active_contexts,
+                "contexts_served": slot.contexts_served,
+                "healthy": slot.is_healthy,
+                "retiring": slot.retiring,
+                "launched_at": slot.launched_at.isoformat(),
+            }
+            for slot in self._slots
+            if slot is not None
+        ]
+        return {
+            "size": self.size,
+            "contexts_per_browser": self.contexts_per_browser,
+            "recycle_after": self.max_contexts_per_browser_lifetime,
+            "running_browsers": len(browsers),
+            "active_contexts": sum(b["active_contexts"] for b in browsers),
+            "leases_total": self._leases_total,
+            "launches_total": self._launches_total,
+            "recycled_total": self._recycled_total,
+            "crashes_total": self._crashes_total,
+            "waits_total": self._waits_total,
+            "browsers": browsers,
+        }
+
+
+# Singleton Pattern
+_browser_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    global _browser_pool
+    if _browser_pool is None:
+        settings = get_settings()
+        _browser_pool = BrowserPool(
+            size=settings.BROWSER_POOL_SIZE,
+            contexts_per_browser=settings.BROWSER_POOL_CONTEXTS_PER_BROWSER,
+            max_contexts_per_browser_lifetime=settings.BROWSER_POOL_MAX_PAGES_PER_BROWSER,
+        )
+    return _browser_pool
+
+
+async def init_browser_pool() -> None:
+    await get_browser_pool().start()
+
+
+async def close_browser_pool() -> None:
+    global _browser_pool
+    if _browser_pool is not None:
+        await _browser_pool.close()
+        _browser_pool = None
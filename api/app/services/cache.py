@@ -1,13 +1,27 @@
+import asyncio
+import copy
+import hashlib
 import json
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable
 
 import numpy as np
 import pandas as pd
 import redis
 import redis.asyncio as aioredis
+from prometheus_client import Counter, Histogram
 
-from app.helpers import encode_to_base64_key, serialize_response_data
+from app.helpers import serialize_response_data
 from app.core.config import settings
+from app.core.redis_client import get_async_redis, get_sync_redis
+from app.services.cache_codec import (
+    collect_blob_refs,
+    decode_blob,
+    decode_value,
+    encode_blob,
+    encode_value,
+    extract_blobs,
+    resolve_blobs,
+)
 
 # Definir la raíz del proyecto
 import os
@@ -16,28 +30,149 @@ cache_dir = os.path.join(project_root, 'storage', 'cache')
 
 
 def _build_redis_url() -> str:
-    password_part = f":{settings.REDIS_PASSWORD}@" if settings.REDIS_PASSWORD else ""
-    return f"redis://{password_part}{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}"
+    return settings.REDIS_URL
+
+
+# Los blobs (HTML y otros strings grandes) se guardan una sola vez por hash
+BLOB_KEY_PREFIX = "cache:blob:"
+
+# Escribe el blob si no existe y extiende su TTL hasta max(TTL actual, ARGV[2]):
+# un blob compartido vive tanto como la entrada más longeva que lo referencia y
+# nunca queda persistente (TTL -1 de versiones anteriores se corrige aquí).
+# Devuelve 1 si el blob se creó.
+_BLOB_WRITE_SCRIPT = """
+local created = redis.call('SET', KEYS[1], ARGV[1], 'NX')
+local ttl = tonumber(ARGV[2])
+if redis.call('TTL', KEYS[1]) < ttl then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+if created then return 1 end
+return 0
+"""
+
+# Set por tabla con las llaves escritas: invalidar una tabla recorre solo sus
+# llaves (SSCAN) en lugar de todo el keyspace (KEYS). Las entradas sin TTL
+# van a un set aparte que no expira.
+TAG_KEY_PREFIX = "cache:tag:"
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Lecturas de caché por tabla y resultado",
+    ["table", "result"],
+)
+CACHE_BYTES = Counter(
+    "cache_bytes_total",
+    "Bytes leídos/escritos en Redis por tabla (entrada + blobs nuevos)",
+    ["table", "direction"],
+)
+CACHE_SINGLE_FLIGHT_WAITS = Counter(
+    "cache_single_flight_waits_total",
+    "Fallos de caché que esperaron el callback de otra petición en curso",
+    ["table"],
+)
+CACHE_INVALIDATED_KEYS = Counter(
+    "cache_invalidated_keys_total",
+    "Llaves eliminadas al invalidar una tabla de caché",
+    ["table"],
+)
+CACHE_ENTRY_BYTES = Histogram(
+    "cache_entry_bytes",
+    "Tamaño comprimido de las entradas de caché escritas",
+    ["table"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
 
 
 class CacheProvider:
-    def __init__(self):
-        self._client: redis.Redis = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            db=settings.REDIS_DB,
-            password=settings.REDIS_PASSWORD or None,
-            decode_responses=True,
-        )
+    """
+    Acceso a Redis para ``Cache``. Usa los clientes compartidos del proceso
+    (app/core/redis_client.py): no abre conexiones propias.
+    """
 
-    def upload_data(self, key: str, data, ttl: int = 0):
+    def __init__(self, table: str = "default"):
+        self.table = table
+
+    @property
+    def _client(self) -> redis.Redis:
+        return get_sync_redis()
+
+    @property
+    def _aclient(self) -> aioredis.Redis:
+        return get_async_redis()
+
+    def _encode(self, data):
+        """(valor binario, {llave_blob: bytes}) listos para escribir."""
         serialized_data = serialize_response_data(data)
-        payload = json.dumps({"result": serialized_data}, ensure_ascii=False)
+        with_refs, blobs = extract_blobs(serialized_data, settings.CACHE_BLOB_MIN_BYTES)
+        encoded_blobs = {f"{BLOB_KEY_PREFIX}{digest}": encode_blob(text) for digest, text in blobs.items()}
+        return encode_value(with_refs), encoded_blobs
+
+    def _decode(self, raw: bytes, blob_values: Dict[str, Optional[bytes]]):
+        data = decode_value(raw)
+        refs = collect_blob_refs(data)
+        if not refs:
+            return data
+        blobs = {}
+        for digest in refs:
+            value = blob_values.get(digest)
+            if value is None:
+                # Blob expirado: se trata como fallo de caché
+                return None
+            blobs[digest] = decode_blob(value)
+        return resolve_blobs(data, blobs)
+
+    @staticmethod
+    def _blob_refs(raws: List[Optional[bytes]]) -> List[str]:
+        refs = set()
+        for raw in raws:
+            if raw is not None:
+                collect_blob_refs(decode_value(raw), refs)
+        return sorted(refs)
+
+    def _record_read(self, raw: Optional[bytes], blob_values: Dict[str, Optional[bytes]], hit: bool):
+        CACHE_REQUESTS.labels(self.table, "hit" if hit else "miss").inc()
+        size = len(raw or b"") + sum(len(v) for v in blob_values.values() if v)
+        if size:
+            CACHE_BYTES.labels(self.table, "read").inc(size)
+
+    @staticmethod
+    def _tag_keys(table: str) -> List[str]:
+        """Sets de etiqueta de una tabla: entradas con TTL y entradas persistentes."""
+        return [f"{TAG_KEY_PREFIX}{table}", f"{TAG_KEY_PREFIX}{table}:persistent"]
+
+    def _queue_write(self, pipe, key: str, payload: bytes, blobs: Dict[str, bytes], ttl: int):
+        """Encola la escritura en un pipeline (sync o async, la API es la misma)."""
+        # Las entradas sin TTL no fijan la vida del blob: si expira antes, la
+        # entrada se lee como fallo y se recalcula
+        blob_ttl = ttl if ttl and ttl > 0 else settings.CACHE_PERSISTENT_BLOB_TTL_SECONDS
+        for blob_key, blob in blobs.items():
+            pipe.eval(_BLOB_WRITE_SCRIPT, 1, blob_key, blob, blob_ttl)
+        expiring_tag, persistent_tag = self._tag_keys(self.table)
+        if ttl and ttl > 0:
+            pipe.setex(key, ttl, payload)
+            pipe.sadd(expiring_tag, key)
+            # Cada escritura renueva el set: nunca expira antes que sus llaves
+            pipe.expire(expiring_tag, max(ttl, settings.CACHE_TAG_TTL_SECONDS))
+        else:
+            pipe.set(key, payload)
+            pipe.sadd(persistent_tag, key)
+
+    def _record_write(self, payload: bytes, blobs: Dict[str, bytes], results: list):
+        created = results[:len(blobs)]
+        written_blobs = sum(len(blob) for blob, was_created in zip(blobs.values(), created) if was_created)
+        CACHE_BYTES.labels(self.table, "write").inc(len(payload) + written_blobs)
+        CACHE_ENTRY_BYTES.labels(self.table).observe(len(payload) + sum(len(b) for b in blobs.values()))
+
+    # ------------------------------------------------------------------
+    # API síncrona
+    # ------------------------------------------------------------------
+
+    def upload_data(self, key: str, data, ttl: int = 0):
+        payload, blobs = self._encode(data)
         try:
-            if ttl and ttl > 0:
-                self._client.setex(key, ttl, payload)
-            else:
-                self._client.set(key, payload)
+            pipe = self._client.pipeline(transaction=False)
+            self._queue_write(pipe, key, payload, blobs, ttl)
+            self._record_write(payload, blobs, pipe.execute())
             return {"status": "ok", "key": key}
         except redis.RedisError as e:
             print(f"Error uploading data to Redis: {e}")
@@ -47,32 +182,81 @@ class CacheProvider:
         try:
             raw = self._client.get(key)
             if raw is None:
+                self._record_read(None, {}, hit=False)
                 return []
-            data = json.loads(raw)
-            return data.get("result", [])
+            refs = self._blob_refs([raw])
+            blob_values = dict(zip(refs, self._client.mget([f"{BLOB_KEY_PREFIX}{r}" for r in refs]))) if refs else {}
+            data = self._decode(raw, blob_values)
+            self._record_read(raw, blob_values, hit=data is not None)
+            return [] if data is None else data
         except redis.RedisError as e:
             print(f"Error getting data from Redis: {e}")
             return None
 
+    # ------------------------------------------------------------------
+    # API asíncrona (pool compartido del proceso)
+    # ------------------------------------------------------------------
+
     async def get_data_async(self, key: str):
+        results = await self.get_many_async([key])
+        return None if results is None else results[0]
+
+    async def get_many_async(self, keys: List[str]) -> Optional[List[Any]]:
+        """
+        Lectura en lote: un pipeline de GET para las entradas y otro para
+        todos sus blobs (dos round-trips en total, válido también en Redis
+        Cluster). Devuelve ``[]`` para cada llave ausente (None si Redis falla).
+        """
+        if not keys:
+            return []
         try:
-            async_client = aioredis.Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                db=settings.REDIS_DB,
-                password=settings.REDIS_PASSWORD or None,
-                decode_responses=True,
-            )
-            async with async_client:
-                raw = await async_client.get(key)
-            if raw is None:
-                return []
-            data = json.loads(raw)
-            return data.get("result", [])
+            raws = await self._pipelined_get(keys)
+            refs = self._blob_refs(raws)
+            blob_values = {}
+            if refs:
+                values = await self._pipelined_get([f"{BLOB_KEY_PREFIX}{r}" for r in refs])
+                blob_values = dict(zip(refs, values))
         except Exception as e:
             print(f"Error getting data asynchronously from Redis: {e}")
             return None
 
+        results = []
+        for raw in raws:
+            if raw is None:
+                self._record_read(None, {}, hit=False)
+                results.append([])
+                continue
+            data = self._decode(raw, blob_values)
+            own_blobs = {r: blob_values.get(r) for r in self._blob_refs([raw])}
+            self._record_read(raw, own_blobs, hit=data is not None)
+            results.append([] if data is None else data)
+        return results
+
+    async def _pipelined_get(self, keys: List[str]) -> List[Optional[bytes]]:
+        async with self._aclient.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.get(key)
+            return await pipe.execute()
+
+    async def upload_data_async(self, key: str, data, ttl: int = 0):
+        payload, blobs = self._encode(data)
+        try:
+            async with self._aclient.pipeline(transaction=False) as pipe:
+                self._queue_write(pipe, key, payload, blobs, ttl)
+                self._record_write(payload, blobs, await pipe.execute())
+            return {"status": "ok", "key": key}
+        except Exception as e:
+            print(f"Error uploading data asynchronously to Redis: {e}")
+            return None
+
+    async def delete_data_async(self, key: str):
+        try:
+            deleted = await self._aclient.unlink(key)
+            return {"status": "ok", "deleted": deleted}
+        except Exception as e:
+            print(f"Error deleting data asynchronously from Redis: {e}")
+            return None
+
     def delete_data(self, key: str):
         try:
             deleted = self._client.delete(key)
@@ -81,21 +265,99 @@ class CacheProvider:
             print(f"Error deleting data from Redis: {e}")
             return None
 
-    def search_delete(self, table: str):
-        pattern = f"*{table}*"
+    # ------------------------------------------------------------------
+    # Invalidación por etiqueta
+    # ------------------------------------------------------------------
+    #
+    # Las llaves se borran con un UNLINK por llave dentro de un pipeline no
+    # transaccional (válido en Redis Cluster, donde las llaves de una tabla
+    # caen en slots distintos) y se retiran del set en el mismo lote. No se
+    # borra el set entero: una escritura concurrente sigue registrada y Redis
+    # elimina el set cuando queda vacío.
+
+    def _queue_unlink(self, pipe, tag_key: str, keys: List[bytes]):
+        for key in keys:
+            pipe.unlink(key)
+        pipe.srem(tag_key, *keys)
+
+    def invalidate_table(self, table: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        table = table or self.table
+        batch_size = settings.CACHE_INVALIDATION_BATCH_SIZE
+        deleted = 0
         try:
-            keys = self._client.keys(pattern)
-            deleted = self._client.delete(*keys) if keys else 0
-            return {"status": "ok", "deleted": deleted, "pattern": pattern}
+            for tag_key in self._tag_keys(table):
+                batch: List[bytes] = []
+                for key in self._client.sscan_iter(tag_key, count=batch_size):
+                    batch.append(key)
+                    if len(batch) >= batch_size:
+                        deleted += self._unlink_batch(tag_key, batch)
+                        batch = []
+                if batch:
+                    deleted += self._unlink_batch(tag_key, batch)
         except redis.RedisError as e:
-            print(f"Error in search_delete from Redis: {e}")
+            print(f"Error invalidating cache table {table} in Redis: {e}")
+            return None
+        CACHE_INVALIDATED_KEYS.labels(table).inc(deleted)
+        return {"status": "ok", "deleted": deleted, "table": table}
+
+    def _unlink_batch(self, tag_key: str, keys: List[bytes]) -> int:
+        pipe = self._client.pipeline(transaction=False)
+        self._queue_unlink(pipe, tag_key, keys)
+        return sum(pipe.execute()[:len(keys)])
+
+    async def invalidate_table_async(self, table: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        table = table or self.table
+        batch_size = settings.CACHE_INVALIDATION_BATCH_SIZE
+        deleted = 0
+        try:
+            for tag_key in self._tag_keys(table):
+                batch: List[bytes] = []
+                async for key in self._aclient.sscan_iter(tag_key, count=batch_size):
+                    batch.append(key)
+                    if len(batch) >= batch_size:
+                        deleted += await self._unlink_batch_async(tag_key, batch)
+                        batch = []
+                if batch:
+                    deleted += await self._unlink_batch_async(tag_key, batch)
+        except Exception as e:
+            print(f"Error invalidating cache table {table} asynchronously in Redis: {e}")
             return None
+        CACHE_INVALIDATED_KEYS.labels(table).inc(deleted)
+        return {"status": "ok", "deleted": deleted, "table": table}
+
+    async def _unlink_batch_async(self, tag_key: str, keys: List[bytes]) -> int:
+        async with self._aclient.pipeline(transaction=False) as pipe:
+            self._queue_unlink(pipe, tag_key, keys)
+            results = await pipe.execute()
+        return sum(results[:len(keys)])
+
+    def search_delete(self, table: str):
+        """Compatibilidad: invalida la tabla por etiqueta (ya no usa KEYS)."""
+        return self.invalidate_table(table)
+
+
+# Callbacks en curso por llave (single-flight dentro del proceso)
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+class _LeaderCancelled(Exception):
+    """El callback compartido se canceló: quien esperaba lo vuelve a ejecutar."""
+
+
+def _is_cacheable(res) -> bool:
+    return (
+        (isinstance(res, pd.DataFrame) and not res.empty) or
+        (isinstance(res, dict) and bool(res)) or
+        (isinstance(res, list) and len(res) > 0) or
+        (isinstance(res, np.ndarray) and res.size > 0) or
+        (res is not None)
+    )
 
 
 class Cache:
 
     def __init__(self, table_name: str, relations: Optional[list[str]] = None):
-        self.cacheProvider = CacheProvider()  # Inicializar CacheProvider aquí
+        self.cacheProvider = CacheProvider(table=table_name)  # Inicializar CacheProvider aquí
         self.table = table_name
         self.relationsTable = relations
 
@@ -113,10 +375,10 @@ class Cache:
             return obj
 
     def getCacheKey(self, params: Dict[str, Any]):
-        # Ordenamos las claves para garantizar consistencia
-        sorted_data = json.dumps(self.convert_non_serializable(params), sort_keys=True)
-        #hash_object = hashlib.sha256(sorted_data.encode(), usedforsecurity=False)
-        return encode_to_base64_key(sorted_data)
+        # Ordenamos las claves para garantizar consistencia; el digest mantiene
+        # la llave en tamaño fijo aunque los params incluyan HTML completo
+        sorted_data = json.dumps(self.convert_non_serializable(params), sort_keys=True, default=str)
+        return hashlib.sha256(sorted_data.encode("utf-8")).hexdigest()
 
     def saveToCache(self, data, cache_key: str, ttl: int = 0):
         """Saves data to a cache file based on the cache key."""
@@ -136,51 +398,87 @@ class Cache:
         elif callback:
             print("NOT FOUND not loaded will search in callback")
             res = callback(*args, **kwargs)
-            if (
-                    (isinstance(res, pd.DataFrame) and not res.empty) or
-                    (isinstance(res, dict) and bool(res)) or
-                    (isinstance(res, list) and len(res) > 0) or
-                    (isinstance(res, np.ndarray) and res.size > 0) or
-                    (res is not None)
-            ):
+            if _is_cacheable(res):
                 self.saveToCache(data=res, cache_key=cache_key, ttl=ttl)
             return self.to_dataframe(res=res)
         return pd.DataFrame([])  # Return an empty DataFrame if no cache and no callback response
 
     async def loadFromCacheAsync(self, params: Dict[str, Any], prefix='', ttl: Optional[int] = 1200,
                                  callback_async: Optional[Callable] = None,
+                                 cache_if: Optional[Callable[[Any], bool]] = None,
                                  *args, **kwargs):
-        """Loads data from a cache file if it exists, otherwise executes a callback."""
+        """
+        Loads data from the cache if it exists, otherwise executes a callback.
+        Fallos simultáneos sobre la misma llave ejecutan el callback una sola vez.
+        ``cache_if`` permite descartar resultados que no deben guardarse.
+        """
         cache_key = self.table + prefix + self.getCacheKey(params)
-        data = self.cacheProvider.get_data(cache_key)
+        data = await self.cacheProvider.get_data_async(cache_key)
 
         if data is not None and len(data) > 0:
             print("Loaded data from:", cache_key)
             return data
 
-        elif callback_async:
+        if not callback_async:
+            return pd.DataFrame([])  # Return an empty DataFrame if no cache and no callback response
+
+        # Quien espera recibe su propia copia: el resultado del líder es mutable
+        # (p. ej. run_audit_task hace pop del HTML) y no debe compartirse
+        while (inflight := _inflight.get(cache_key)) is not None:
+            CACHE_SINGLE_FLIGHT_WAITS.labels(self.table).inc()
+            try:
+                return copy.deepcopy(await asyncio.shield(inflight))
+            except _LeaderCancelled:
+                # El líder se canceló (p. ej. por un deadline): otro intento toma su lugar
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        _inflight[cache_key] = future
+        try:
             res = await callback_async(*args, **kwargs)
-            if (
-                    (isinstance(res, pd.DataFrame) and not res.empty) or
-                    (isinstance(res, dict) and bool(res)) or
-                    (isinstance(res, list) and len(res) > 0) or
-                    (isinstance(res, np.ndarray) and res.size > 0) or
-                    (res is not None)
-            ):
-                self.saveToCache(data=res, cache_key=cache_key, ttl=ttl)
+            if _is_cacheable(res) and (cache_if is None or cache_if(res)):
+                await self.cacheProvider.upload_data_async(key=cache_key, data=res, ttl=ttl)
+            # Instantánea antes de devolver: el llamador del líder puede mutar ``res``
+            # antes de que los que esperan se reanuden
+            future.set_result(copy.deepcopy(res))
             return res
-        return pd.DataFrame([])  # Return an empty DataFrame if no cache and no callback response
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled(cache_key))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # evitar "exception was never retrieved" sin esperas
+            raise
+        finally:
+            _inflight.pop(cache_key, None)
+
+    async def loadManyFromCacheAsync(self, params_list: List[Dict[str, Any]], prefix='') -> List[Optional[Any]]:
+        """Consulta en lote (pipeline MGET). None para cada entrada ausente."""
+        keys = [self.table + prefix + self.getCacheKey(params) for params in params_list]
+        results = await self.cacheProvider.get_many_async(keys) or [[] for _ in keys]
+        return [data if data is not None and len(data) > 0 else None for data in results]
 
     def removeCacheTable(self, table: str):
-        self.cacheProvider.search_delete(table=table)
+        return self.cacheProvider.invalidate_table(table)
+
+    async def removeCacheTableAsync(self, table: str):
+        return await self.cacheProvider.invalidate_table_async(table)
 
     def checkCache(self, table: str = None):
+        """Invalida la tabla y sus tablas relacionadas."""
         if table is None:
             table = self.table
         self.removeCacheTable(table)
-        if self.relationsTable is not None:
-            for index, relation in self.relationsTable:
-                self.removeCacheTable(relation)
+        for relation in self.relationsTable or []:
+            self.removeCacheTable(relation)
+
+    async def checkCacheAsync(self, table: str = None):
+        if table is None:
+            table = self.table
+        await self.removeCacheTableAsync(table)
+        for relation in self.relationsTable or []:
+            await self.removeCacheTableAsync(relation)
 
     def to_dataframe(self, res):
         try:
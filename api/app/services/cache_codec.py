@@ -0,0 +1,152 @@
+"""
+Codificación binaria de valores de caché.
+
+Formato de cada valor en Redis::
+
+    b"C1" + <serializador> + <compresión> + payload
+
+- serializador: ``m`` msgpack, ``j`` JSON (si msgpack no está instalado).
+- compresión:   ``z`` zstd, ``l`` lz4, ``d`` zlib, ``n`` sin comprimir
+  (valores pequeños). Se usa la mejor librería disponible al escribir; al
+  leer se respeta la marca del valor, así que conviven valores de distintos
+  entornos.
+
+Los strings grandes (HTML, ``html_content`` / ``html_content_raw``…) se
+extraen a blobs direccionados por su sha256 y se sustituyen por
+``{"__blob__": <sha256>}``: el mismo HTML se guarda una sola vez aunque
+aparezca repetido en el resultado o en varias entradas.
+
+Los valores antiguos (JSON plano ``{"result": ...}``) se siguen leyendo.
+"""
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+# Dependencias opcionales: sin ellas se usa JSON + zlib
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+    _zstd_compressor = zstandard.ZstdCompressor(level=3)
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+MAGIC = b"C1"
+BLOB_MARKER = "__blob__"
+
+# Por debajo de este tamaño no compensa comprimir
+_COMPRESS_MIN_BYTES = 512
+
+
+def _compress(raw: bytes) -> Tuple[bytes, bytes]:
+    if len(raw) < _COMPRESS_MIN_BYTES:
+        return b"n", raw
+    if zstandard is not None:
+        return b"z", _zstd_compressor.compress(raw)
+    if lz4_frame is not None:
+        return b"l", lz4_frame.compress(raw)
+    return b"d", zlib.compress(raw, 6)
+
+
+def _decompress(method: bytes, payload: bytes) -> bytes:
+    if method == b"n":
+        return payload
+    if method == b"z":
+        return _zstd_decompressor.decompress(payload)
+    if method == b"l":
+        return lz4_frame.decompress(payload)
+    if method == b"d":
+        return zlib.decompress(payload)
+    raise ValueError(f"Compresión de caché desconocida: {method!r}")
+
+
+def _serialize(data: Any) -> Tuple[bytes, bytes]:
+    if msgpack is not None:
+        return b"m", msgpack.packb(data, use_bin_type=True, default=str)
+    return b"j", json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _deserialize(method: bytes, raw: bytes) -> Any:
+    if method == b"m":
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    if method == b"j":
+        return json.loads(raw)
+    raise ValueError(f"Serializador de caché desconocido: {method!r}")
+
+
+def encode_value(data: Any) -> bytes:
+    serializer, raw = _serialize(data)
+    compression, payload = _compress(raw)
+    return MAGIC + serializer + compression + payload
+
+
+def decode_value(value: bytes) -> Any:
+    """Decodifica un valor binario o un valor legado ``{"result": ...}``."""
+    if value[:2] != MAGIC:
+        return json.loads(value).get("result", [])
+    return _deserialize(value[2:3], _decompress(value[3:4], value[4:]))
+
+
+def encode_blob(text: str) -> bytes:
+    compression, payload = _compress(text.encode("utf-8"))
+    return compression + payload
+
+
+def decode_blob(value: bytes) -> str:
+    return _decompress(value[:1], value[1:]).decode("utf-8")
+
+
+def extract_blobs(data: Any, min_bytes: int, blobs: Optional[Dict[str, str]] = None) -> Tuple[Any, Dict[str, str]]:
+    """
+    Sustituye los strings de al menos ``min_bytes`` por referencias a blob.
+
+    Returns:
+        (datos con referencias, {sha256: texto})
+    """
+    if blobs is None:
+        blobs = {}
+    if isinstance(data, dict):
+        return {k: extract_blobs(v, min_bytes, blobs)[0] for k, v in data.items()}, blobs
+    if isinstance(data, (list, tuple)):
+        return [extract_blobs(v, min_bytes, blobs)[0] for v in data], blobs
+    if isinstance(data, str) and len(data) >= min_bytes:
+        digest = hashlib.sha256(data.encode("utf-8")).hexdigest()
+        blobs[digest] = data
+        return {BLOB_MARKER: digest}, blobs
+    return data, blobs
+
+
+def collect_blob_refs(data: Any, refs: Optional[set] = None) -> set:
+    if refs is None:
+        refs = set()
+    if isinstance(data, dict):
+        if len(data) == 1 and BLOB_MARKER in data:
+            refs.add(data[BLOB_MARKER])
+        else:
+            for v in data.values():
+                collect_blob_refs(v, refs)
+    elif isinstance(data, list):
+        for v in data:
+            collect_blob_refs(v, refs)
+    return refs
+
+
+def resolve_blobs(data: Any, blobs: Dict[str, str]) -> Any:
+    """Reemplaza las referencias a blob por su contenido (KeyError si falta alguno)."""
+    if isinstance(data, dict):
+        if len(data) == 1 and BLOB_MARKER in data:
+            return blobs[data[BLOB_MARKER]]
+        return {k: resolve_blobs(v, blobs) for k, v in data.items()}
+    if isinstance(data, list):
+        return [resolve_blobs(v, blobs) for v in data]
+    return data
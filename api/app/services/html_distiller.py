@@ -0,0 +1,223 @@
+"""
+Destilado de páginas HTML para los prompts de IA.
+
+El HTML crudo (scripts, CSS inline, SVGs, snippets de tracking) dispara el
+tamaño del prompt sin aportar al análisis SEO. ``distill_page`` lo reduce a
+una representación compacta:
+
+- metadatos del ``<head>`` (title, description, canonical, robots, lang, OG)
+- esquema de encabezados (h1-h3)
+- texto del contenido principal (trafilatura)
+- estadísticas de enlaces e imágenes
+- bloques JSON-LD / Microdata / RDFa
+
+``fit_page_digest`` lo renderiza como texto ajustándolo a un techo de tokens:
+primero recorta el texto principal, después los schemas y por último el
+esquema de encabezados.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import trafilatura
+from bs4 import BeautifulSoup
+
+from app.services.seo_analyzer import SEOAnalyzer
+
+# Etiquetas que no aportan texto ni estructura al análisis
+_NOISE_TAGS = ["script", "style", "noscript", "svg", "template", "iframe"]
+
+_MAX_HEADINGS = 80
+_MAX_HEADING_CHARS = 120
+_MAX_SCHEMA_CHARS = 4000
+_OG_PROPERTIES = ("og:title", "og:description", "og:type", "og:image", "og:url")
+
+
+def _meta(soup: BeautifulSoup, **attrs) -> Optional[str]:
+    tag = soup.find("meta", attrs=attrs)
+    content = tag.get("content") if tag else None
+    return content.strip() if content else None
+
+
+def _head_metadata(soup: BeautifulSoup) -> Dict[str, Any]:
+    canonical = soup.find("link", rel="canonical")
+    html_tag = soup.find("html")
+    return {
+        "title": soup.title.get_text(strip=True) if soup.title else None,
+        "meta_description": _meta(soup, name="description"),
+        "canonical": canonical.get("href") if canonical else None,
+        "robots": _meta(soup, name="robots"),
+        "lang": html_tag.get("lang") if html_tag else None,
+        "hreflang_count": len(soup.find_all("link", rel="alternate", hreflang=True)),
+        "open_graph": {
+            prop: value for prop in _OG_PROPERTIES
+            if (value := _meta(soup, property=prop))
+        },
+    }
+
+
+def _heading_outline(soup: BeautifulSoup) -> List[Dict[str, Any]]:
+    outline = []
+    for tag in soup.find_all(["h1", "h2", "h3"]):
+        text = " ".join(tag.get_text(" ", strip=True).split())
+        if text:
+            outline.append({"level": int(tag.name[1]), "text": text[:_MAX_HEADING_CHARS]})
+        if len(outline) >= _MAX_HEADINGS:
+            break
+    return outline
+
+
+def _link_stats(soup: BeautifulSoup, domain: str) -> Dict[str, int]:
+    internal = external = nofollow = 0
+    links = soup.find_all("a", href=True)
+    for link in links:
+        href = link["href"]
+        if href.startswith("/") or domain in href:
+            internal += 1
+        elif href.startswith("http"):
+            external += 1
+        if "nofollow" in (link.get("rel") or []):
+            nofollow += 1
+    return {"total": len(links), "internal": internal, "external": external, "nofollow": nofollow}
+
+
+def _image_stats(soup: BeautifulSoup) -> Dict[str, int]:
+    images = soup.find_all("img")
+    return {
+        "total": len(images),
+        "without_alt": sum(1 for img in images if not (img.get("alt") or "").strip()),
+        "lazy": sum(1 for img in images if img.get("loading") == "lazy"),
+    }
+
+
+def _main_text(html: str, soup: BeautifulSoup) -> str:
+    text = trafilatura.extract(html) or ""
+    if not text:
+        body = soup.body or soup
+        text = body.get_text(" ", strip=True)
+    return " ".join(text.split())
+
+
+def distill_page(url: str, html: str, seo_analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Extrae la representación compacta de la página. Si se recibe el
+    ``seo_analysis`` ya calculado por la auditoría se reutilizan sus schemas.
+    Función de nivel módulo (picklable) para ``run_cpu``.
+    """
+    if not html:
+        return {"url": url, "empty": True}
+
+    soup = BeautifulSoup(html, "lxml")
+    schemas = (seo_analysis or {}).get("schema_markup")
+    if schemas is None:
+        schemas = SEOAnalyzer.extract_schemas_from_html(html, url)
+
+    main_text = _main_text(html, soup)
+    for tag in soup(_NOISE_TAGS):
+        tag.decompose()
+
+    return {
+        "url": url,
+        "html_bytes": len(html.encode("utf-8")),
+        "head": _head_metadata(soup),
+        "outline": _heading_outline(soup),
+        "links": _link_stats(soup, urlparse(url).netloc),
+        "images": _image_stats(soup),
+        "main_text": main_text,
+        "word_count": len(main_text.split()),
+        "json_ld": schemas or [],
+    }
+
+
+def render_page_digest(
+    digest: Dict[str, Any],
+    text_chars: Optional[int] = None,
+    max_schemas: Optional[int] = None,
+    max_headings: Optional[int] = None
+) -> str:
+    """Texto del resumen con los límites indicados (None = sin recortar)."""
+    if digest.get("empty"):
+        return "No se pudo obtener el HTML de la página."
+
+    head = digest["head"]
+    lines = [
+        "### Metadatos",
+        f"- Title: {head.get('title') or 'N/A'}",
+        f"- Meta description: {head.get('meta_description') or 'N/A'}",
+        f"- Canonical: {head.get('canonical') or 'N/A'}",
+        f"- Meta robots: {head.get('robots') or 'N/A'}",
+        f"- Idioma: {head.get('lang') or 'N/A'}",
+        f"- Enlaces hreflang: {head.get('hreflang_count', 0)}",
+    ]
+    for prop, value in head.get("open_graph", {}).items():
+        lines.append(f"- {prop}: {value}")
+
+    outline = digest["outline"]
+    shown_outline = outline if max_headings is None else outline[:max_headings]
+    lines.append("")
+    lines.append("### Encabezados")
+    lines.extend(f"{'  ' * (h['level'] - 1)}- H{h['level']}: {h['text']}" for h in shown_outline)
+    if len(shown_outline) < len(outline):
+        lines.append(f"- ({len(outline) - len(shown_outline)} encabezados omitidos)")
+
+    links, images = digest["links"], digest["images"]
+    lines.extend([
+        "",
+        "### Enlaces e imágenes",
+        f"- Enlaces: {links['total']} (internos {links['internal']}, externos {links['external']}, nofollow {links['nofollow']})",
+        f"- Imágenes: {images['total']} (sin alt {images['without_alt']}, lazy {images['lazy']})",
+        f"- Palabras en contenido principal: {digest['word_count']}",
+    ])
+
+    schemas = digest["json_ld"]
+    shown_schemas = schemas if max_schemas is None else schemas[:max_schemas]
+    lines.append("")
+    lines.append("### Datos estructurados (JSON-LD / Microdata / RDFa)")
+    if not schemas:
+        lines.append("- No se encontraron datos estructurados.")
+    for schema in shown_schemas:
+        block = json.dumps(schema, ensure_ascii=False, separators=(",", ":"), default=str)
+        if len(block) > _MAX_SCHEMA_CHARS:
+            block = block[:_MAX_SCHEMA_CHARS] + "…(truncado)"
+        lines.append(block)
+    if len(shown_schemas) < len(schemas):
+        lines.append(f"- ({len(schemas) - len(shown_schemas)} bloques omitidos por tamaño)")
+
+    text = digest["main_text"]
+    shown_text = text if text_chars is None else text[:text_chars]
+    lines.append("")
+    lines.append("### Contenido principal")
+    lines.append(shown_text or "(sin contenido principal)")
+    if len(shown_text) < len(text):
+        lines.append(f"…(texto truncado: {len(shown_text)} de {len(text)} caracteres)")
+
+    return "\n".join(lines)
+
+
+def fit_page_digest(digest: Dict[str, Any], max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """
+    Renderiza el resumen sin superar ``max_tokens`` (medidos con
+    ``count_tokens``). Recorta en orden: texto principal, schemas, encabezados.
+    """
+    text_chars = len(digest.get("main_text", ""))
+    max_schemas = len(digest.get("json_ld", []))
+    max_headings = len(digest.get("outline", []))
+
+    rendered = render_page_digest(digest)
+    for _ in range(12):
+        tokens = count_tokens(rendered)
+        if tokens <= max_tokens:
+            return rendered
+        # Reducción proporcional al exceso, con margen para no iterar de más
+        ratio = max_tokens / tokens * 0.95
+        if text_chars > 0:
+            overflow_chars = int(len(rendered) * (1 - ratio))
+            text_chars = max(0, text_chars - max(overflow_chars, 1))
+        elif max_schemas > 0:
+            max_schemas = int(max_schemas * ratio)
+        elif max_headings > 0:
+            max_headings = int(max_headings * ratio)
+        else:
+            break
+        rendered = render_page_digest(digest, text_chars, max_schemas, max_headings)
+    return rendered
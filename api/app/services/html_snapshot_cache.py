@@ -0,0 +1,219 @@
+"""
+Caché de snapshots HTML direccionada por contenido.
+
+Evita volver a lanzar un navegador para una URL renderizada hace poco:
+``AuditEngine.fetch_html`` (validación de URLs, re-análisis individual,
+endpoint público de HTML) consulta aquí antes de navegar, y
+``run_lighthouse_audit`` deposita el HTML que ya renderizó.
+
+Estructura en Redis:
+
+- ``html_snapshot:ref:<sha256(url normalizada|perfil)>``  hash con el sha256
+  del contenido, la URL y el momento del fetch.
+- ``html_snapshot:blob:<sha256(html)>``  HTML comprimido (zlib). Páginas con
+  contenido idéntico (redirecciones, perfiles equivalentes) comparten blob.
+
+La frescura se decide al leer (``max_age``); ambas llaves expiran tras
+``HTML_SNAPSHOT_RETENTION_SECONDS``.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from app.core.config import get_settings
+from app.core.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+_REF_PREFIX = "html_snapshot:ref:"
+_BLOB_PREFIX = "html_snapshot:blob:"
+
+# Parámetros de tracking que no cambian el HTML servido
+_TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "yclid", "mc_cid", "mc_eid", "_ga"}
+
+DEFAULT_RENDER_PROFILE = "desktop"
+
+
+class _RenderCancelled(Exception):
+    """Se canceló el render compartido: quien esperaba lo vuelve a lanzar."""
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normaliza una URL para usarla como llave: esquema/host en minúsculas,
+    sin puerto por defecto ni fragmento, query ordenada y sin parámetros de tracking.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not (
+        (scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)
+    ):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+@dataclass
+class HtmlSnapshot:
+    url: str
+    html: str
+    content_hash: str
+    fetched_at: float
+
+    @property
+    def age_seconds(self) -> float:
+        return max(0.0, time.time() - self.fetched_at)
+
+
+class HtmlSnapshotCache:
+    """Snapshots HTML comprimidos en Redis con single-flight por proceso."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._redis = get_async_redis()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def close(self):
+        # El pool es del proceso (close_redis_pool); aquí solo se sueltan los renders en curso
+        self._inflight.clear()
+
+    @staticmethod
+    def _ref_key(url: str, profile: str) -> str:
+        digest = hashlib.sha256(f"{normalize_url(url)}|{profile}".encode("utf-8")).hexdigest()
+        return f"{_REF_PREFIX}{digest}"
+
+    async def get(
+        self,
+        url: str,
+        profile: str = DEFAULT_RENDER_PROFILE,
+        max_age: Optional[float] = None
+    ) -> Optional[HtmlSnapshot]:
+        """Snapshot más reciente si es más nuevo que ``max_age`` segundos."""
+        if max_age is None:
+            max_age = self.settings.HTML_SNAPSHOT_FRESHNESS_SECONDS
+        try:
+            ref = await self._redis.hgetall(self._ref_key(url, profile))
+            if not ref:
+                return None
+            fetched_at = float(ref[b"fetched_at"])
+            if time.time() - fetched_at > max_age:
+                return None
+            content_hash = ref[b"sha256"].decode()
+            blob = await self._redis.get(f"{_BLOB_PREFIX}{content_hash}")
+            if blob is None:
+                return None
+            return HtmlSnapshot(
+                url=ref[b"url"].decode(),
+                html=zlib.decompress(blob).decode("utf-8"),
+                content_hash=content_hash,
+                fetched_at=fetched_at,
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ HtmlSnapshotCache.get falló para {url}: {e}")
+            return None
+
+    async def put(self, url: str, html: str, profile: str = DEFAULT_RENDER_PROFILE) -> Optional[str]:
+        """Guarda el HTML y devuelve su hash de contenido."""
+        if not html:
+            return None
+        raw = html.encode("utf-8")
+        content_hash = hashlib.sha256(raw).hexdigest()
+        retention = self.settings.HTML_SNAPSHOT_RETENTION_SECONDS
+        blob_key = f"{_BLOB_PREFIX}{content_hash}"
+        ref_key = self._ref_key(url, profile)
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                # nx: si el blob ya existe solo se renueva su TTL
+                pipe.set(blob_key, zlib.compress(raw, 6), ex=retention, nx=True)
+                pipe.expire(blob_key, retention)
+                pipe.hset(ref_key, mapping={
+                    "sha256": content_hash,
+                    "url": url,
+                    "fetched_at": time.time(),
+                    "size": len(raw),
+                })
+                pipe.expire(ref_key, retention)
+                await pipe.execute()
+            return content_hash
+        except Exception as e:
+            logger.warning(f"⚠️ HtmlSnapshotCache.put falló para {url}: {e}")
+            return None
+
+    async def get_or_render(
+        self,
+        url: str,
+        render: Callable[[], Awaitable[str]],
+        profile: str = DEFAULT_RENDER_PROFILE,
+        max_age: Optional[float] = None
+    ) -> str:
+        """
+        Devuelve el HTML fresco de la caché o ejecuta ``render``. Peticiones
+        simultáneas de la misma URL/perfil comparten un único render; si la
+        petición que renderiza se cancela, la siguiente en espera lo relanza.
+        """
+        snapshot = await self.get(url, profile, max_age)
+        if snapshot is not None:
+            self.hits += 1
+            logger.info(f"♻️ [html_snapshot] {url} desde caché (edad {snapshot.age_seconds:.0f}s)")
+            return snapshot.html
+
+        key = self._ref_key(url, profile)
+        while (inflight := self._inflight.get(key)) is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except _RenderCancelled:
+                continue
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            html = await render()
+            await self.put(url, html, profile)
+            future.set_result(html)
+            return html
+        except asyncio.CancelledError:
+            # Los que esperan no se cancelan: reciben _RenderCancelled y uno toma el relevo
+            future.set_exception(_RenderCancelled(key))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evitar "Future exception was never retrieved" si nadie esperaba
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "inflight": len(self._inflight)}
+
+
+# Singleton Pattern
+_html_snapshot_cache: Optional[HtmlSnapshotCache] = None
+
+
+def get_html_snapshot_cache() -> HtmlSnapshotCache:
+    global _html_snapshot_cache
+    if _html_snapshot_cache is None:
+        _html_snapshot_cache = HtmlSnapshotCache()
+    return _html_snapshot_cache
+
+
+async def close_html_snapshot_cache() -> None:
+    global _html_snapshot_cache
+    if _html_snapshot_cache is not None:
+        await _html_snapshot_cache.close()
+        _html_snapshot_cache = None
@@ -0,0 +1,365 @@
+"""
+Cola de trabajos durable respaldada por Redis.
+
+Sustituye a ``BackgroundTasks`` de FastAPI para el trabajo pesado (auditorías,
+comparaciones, validaciones de URLs): los trabajos sobreviven a reinicios del
+API y se consumen desde un proceso ``worker`` independiente (ver app/worker.py).
+
+Estructura en Redis (todas las llaves comparten el hash tag ``{jobs}`` para
+que los scripts Lua sean válidos también en Redis Cluster):
+
+- ``{jobs}:job:<id>``        JSON con tipo, payload, intentos y entidad asociada.
+- ``{jobs}:ready:<tipo>``    ZSET de ids listos; score = momento disponible
+                             (permite reintentos diferidos con backoff).
+- ``{jobs}:inflight``        ZSET de ids en ejecución; score = deadline de
+                             visibilidad. El worker lo extiende con heartbeats;
+                             si expira, el trabajo vuelve a ``ready``.
+- ``{jobs}:entity:<tabla>:<id>``  SET de ids de trabajos vivos para una fila
+                             de BD (una validación puede tener a la vez el trabajo
+                             completo y el de una URL); cada trabajo retira solo
+                             su propio id. Se usa para recuperar filas atascadas
+                             en IN_PROGRESS.
+- ``{jobs}:dead``            lista (acotada) de ids que agotaron sus intentos.
+- ``{jobs}:orphan:<tabla>:<id>``  momento en que la recuperación vio por primera
+                             vez la fila IN_PROGRESS sin trabajo vivo.
+
+Los trabajos que el API ejecuta en su propio proceso (fallback de
+``dispatch_job``) se registran con ``start_local`` directamente en
+``inflight``, como si un worker los hubiera reclamado.
+
+El JSON del trabajo y el SET de la entidad expiran (``JOB_PAYLOAD_TTL_SECONDS``,
+renovado al reclamar, en cada heartbeat y al reprogramar) para que un trabajo
+abandonado no deje el token del usuario en Redis indefinidamente. Los trabajos
+en dead-letter se guardan sin token.
+"""
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+import redis.asyncio as aioredis
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_PREFIX = "{jobs}"
+_DEAD_LETTER_TTL_SECONDS = 7 * 24 * 60 * 60
+_DEAD_LETTER_MAX_JOBS = 1000
+# Campos del payload que no se conservan una vez que el trabajo es terminal
+_SENSITIVE_PAYLOAD_FIELDS = ("token",)
+
+# Mueve atómicamente el primer id disponible de ready -> inflight.
+_CLAIM_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 1)
+if #ids == 0 then
+    return false
+end
+redis.call('ZREM', KEYS[1], ids[1])
+redis.call('ZADD', KEYS[2], ARGV[2], ids[1])
+return ids[1]
+"""
+
+
+class JobQueue:
+    """
+    Cola de trabajos con visibilidad temporal, reintentos y dead-letter.
+    """
+
+    def __init__(self, redis_url: str):
+        self.settings = get_settings()
+        self._redis = aioredis.from_url(redis_url, decode_responses=True)
+        self._claim = self._redis.register_script(_CLAIM_SCRIPT)
+
+    async def close(self):
+        await self._redis.aclose()
+
+    # ------------------------------------------------------------------
+    # Llaves
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"{_PREFIX}:job:{job_id}"
+
+    @staticmethod
+    def _ready_key(job_type: str) -> str:
+        return f"{_PREFIX}:ready:{job_type}"
+
+    @staticmethod
+    def _inflight_key() -> str:
+        return f"{_PREFIX}:inflight"
+
+    @staticmethod
+    def _entity_key(entity_table: str, entity_id: str) -> str:
+        return f"{_PREFIX}:entity:{entity_table}:{entity_id}"
+
+    @staticmethod
+    def _dead_key() -> str:
+        return f"{_PREFIX}:dead"
+
+    @staticmethod
+    def _orphan_key(entity_table: str, entity_id: str) -> str:
+        return f"{_PREFIX}:orphan:{entity_table}:{entity_id}"
+
+    def _state_ttl(self) -> int:
+        """TTL del estado de un trabajo: nunca menor que un deadline de visibilidad más el backoff máximo."""
+        return int(max(
+            self.settings.JOB_PAYLOAD_TTL_SECONDS,
+            self.settings.JOB_VISIBILITY_TIMEOUT_SECONDS + self.settings.JOB_RETRY_BACKOFF_MAX_SECONDS,
+        ))
+
+    def _entity_key_of(self, job: Dict[str, Any]) -> Optional[str]:
+        if job.get("entity_table") and job.get("entity_id"):
+            return self._entity_key(job["entity_table"], job["entity_id"])
+        return None
+
+    # ------------------------------------------------------------------
+    # Productor
+    # ------------------------------------------------------------------
+
+    async def enqueue(
+        self,
+        job_type: str,
+        payload: Dict[str, Any],
+        entity_table: Optional[str] = None,
+        entity_id: Optional[str] = None,
+        max_attempts: Optional[int] = None,
+    ) -> str:
+        """Encola un trabajo y devuelve su id."""
+        job = self._new_job(job_type, payload, entity_table, entity_id, max_attempts)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            self._queue_job_state(pipe, job)
+            pipe.zadd(self._ready_key(job_type), {job["id"]: time.time()})
+            await pipe.execute()
+
+        logger.info(f"📥 Job encolado: {job_type} ({job['id']})")
+        return job["id"]
+
+    async def start_local(
+        self,
+        job_type: str,
+        payload: Dict[str, Any],
+        entity_table: Optional[str] = None,
+        entity_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Registra un trabajo que el API ejecuta en su propio proceso como
+        reclamado (primer intento). Mientras reciba heartbeats cuenta como
+        trabajo vivo de su fila; si el proceso muere, el deadline expira y
+        ``requeue_expired`` lo devuelve a la cola para un worker.
+        """
+        job = self._new_job(job_type, payload, entity_table, entity_id)
+        job["attempts"] = 1
+        async with self._redis.pipeline(transaction=True) as pipe:
+            self._queue_job_state(pipe, job)
+            pipe.zadd(
+                self._inflight_key(),
+                {job["id"]: time.time() + self.settings.JOB_VISIBILITY_TIMEOUT_SECONDS},
+            )
+            await pipe.execute()
+        return job
+
+    def _new_job(
+        self,
+        job_type: str,
+        payload: Dict[str, Any],
+        entity_table: Optional[str],
+        entity_id: Optional[str],
+        max_attempts: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        return {
+            "id": uuid4().hex,
+            "type": job_type,
+            "payload": payload,
+            "attempts": 0,
+            "max_attempts": max_attempts or self.settings.JOB_MAX_ATTEMPTS,
+            "entity_table": entity_table,
+            "entity_id": str(entity_id) if entity_id is not None else None,
+            "enqueued_at": time.time(),
+            "last_error": None,
+        }
+
+    def _queue_job_state(self, pipe, job: Dict[str, Any]):
+        """Encola en ``pipe`` el JSON del trabajo y su id en el SET de la entidad."""
+        ttl = self._state_ttl()
+        pipe.set(self._job_key(job["id"]), json.dumps(job, default=str), ex=ttl)
+        entity_key = self._entity_key_of(job)
+        if entity_key:
+            pipe.sadd(entity_key, job["id"])
+            pipe.expire(entity_key, ttl)
+
+    # ------------------------------------------------------------------
+    # Consumidor
+    # ------------------------------------------------------------------
+
+    async def claim(self, job_type: str) -> Optional[Dict[str, Any]]:
+        """Toma el siguiente trabajo disponible del tipo indicado (o None)."""
+        now = time.time()
+        deadline = now + self.settings.JOB_VISIBILITY_TIMEOUT_SECONDS
+        job_id = await self._claim(
+            keys=[self._ready_key(job_type), self._inflight_key()],
+            args=[now, deadline],
+        )
+        if not job_id:
+            return None
+
+        job = await self.get(job_id)
+        if job is None:
+            # Datos perdidos: descartar la referencia huérfana
+            await self._redis.zrem(self._inflight_key(), job_id)
+            return None
+
+        job["attempts"] += 1
+        await self._save(job)
+        return job
+
+    async def heartbeat(self, job: Dict[str, Any]):
+        """Extiende el deadline de visibilidad (y el TTL del estado) de un trabajo en ejecución."""
+        deadline = time.time() + self.settings.JOB_VISIBILITY_TIMEOUT_SECONDS
+        ttl = self._state_ttl()
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(self._inflight_key(), {job["id"]: deadline}, xx=True)
+            pipe.expire(self._job_key(job["id"]), ttl)
+            entity_key = self._entity_key_of(job)
+            if entity_key:
+                pipe.expire(entity_key, ttl)
+            await pipe.execute()
+
+    async def ack(self, job: Dict[str, Any]):
+        """Marca un trabajo como terminado y elimina su estado."""
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self._inflight_key(), job["id"])
+            pipe.delete(self._job_key(job["id"]))
+            entity_key = self._entity_key_of(job)
+            if entity_key:
+                pipe.srem(entity_key, job["id"])
+            await pipe.execute()
+
+    async def fail(self, job: Dict[str, Any], error: str) -> bool:
+        """
+        Registra un fallo. Reprograma con backoff exponencial si quedan
+        intentos; de lo contrario lo mueve a dead-letter.
+
+        Returns:
+            True si el trabajo será reintentado.
+        """
+        job["last_error"] = error
+        if not await self._redis.zrem(self._inflight_key(), job["id"]):
+            # Otro proceso ya lo recuperó (visibilidad expirada)
+            return True
+        return await self._reschedule(job)
+
+    async def _reschedule(self, job: Dict[str, Any]) -> bool:
+        if job["attempts"] < job["max_attempts"]:
+            delay = min(
+                self.settings.JOB_RETRY_BACKOFF_SECONDS * (2 ** (job["attempts"] - 1)),
+                self.settings.JOB_RETRY_BACKOFF_MAX_SECONDS,
+            )
+            await self._save(job)
+            await self._redis.zadd(self._ready_key(job["type"]), {job["id"]: time.time() + delay})
+            logger.warning(
+                f"🔁 Job {job['type']} ({job['id']}) reintentará en {delay:.0f}s "
+                f"[{job['attempts']}/{job['max_attempts']}]: {job['last_error']}"
+            )
+            return True
+
+        # El trabajo ya no se ejecutará: no conservar credenciales del usuario
+        for field in _SENSITIVE_PAYLOAD_FIELDS:
+            job["payload"].pop(field, None)
+
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._job_key(job["id"]), json.dumps(job, default=str), ex=_DEAD_LETTER_TTL_SECONDS)
+            pipe.lpush(self._dead_key(), job["id"])
+            pipe.ltrim(self._dead_key(), 0, _DEAD_LETTER_MAX_JOBS - 1)
+            entity_key = self._entity_key_of(job)
+            if entity_key:
+                pipe.srem(entity_key, job["id"])
+            await pipe.execute()
+        logger.error(f"☠️ Job {job['type']} ({job['id']}) agotó sus intentos: {job['last_error']}")
+        return False
+
+    async def requeue_expired(self) -> List[Dict[str, Any]]:
+        """
+        Devuelve a la cola los trabajos cuyo worker dejó de enviar heartbeats.
+
+        Returns:
+            Trabajos que agotaron sus intentos (para marcarlos como fallidos).
+        """
+        exhausted: List[Dict[str, Any]] = []
+        expired_ids = await self._redis.zrangebyscore(self._inflight_key(), "-inf", time.time())
+        for job_id in expired_ids:
+            # Solo un proceso gana el ZREM
+            if not await self._redis.zrem(self._inflight_key(), job_id):
+                continue
+            job = await self.get(job_id)
+            if job is None:
+                continue
+            job["last_error"] = "Visibility timeout expirado (worker caído o bloqueado)"
+            if not await self._reschedule(job):
+                exhausted.append(job)
+        return exhausted
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(self._job_key(job_id))
+        return json.loads(raw) if raw else None
+
+    async def _save(self, job: Dict[str, Any]):
+        await self._redis.set(self._job_key(job["id"]), json.dumps(job, default=str), ex=self._state_ttl())
+
+    async def has_live_job(self, entity_table: str, entity_id: str) -> bool:
+        """True si la fila tiene algún trabajo pendiente o en ejecución."""
+        entity_key = self._entity_key(entity_table, str(entity_id))
+        for job_id in await self._redis.smembers(entity_key):
+            job = await self.get(job_id)
+            if job is not None:
+                if await self._redis.zscore(self._inflight_key(), job_id) is not None:
+                    return True
+                if await self._redis.zscore(self._ready_key(job["type"]), job_id) is not None:
+                    return True
+            # Id sin estado (expirado o perdido): limpiarlo
+            await self._redis.srem(entity_key, job_id)
+        return False
+
+    async def orphaned_since(self, entity_table: str, entity_id: str, ttl: int) -> float:
+        """
+        Momento en que se vio por primera vez la fila sin trabajo vivo (lo
+        registra si es la primera vez). ``ttl`` acota la marca si la fila deja
+        de consultarse.
+        """
+        orphan_key = self._orphan_key(entity_table, str(entity_id))
+        await self._redis.set(orphan_key, time.time(), nx=True, ex=ttl)
+        return float(await self._redis.get(orphan_key) or time.time())
+
+    async def clear_orphaned(self, entity_table: str, entity_id: str):
+        await self._redis.delete(self._orphan_key(entity_table, str(entity_id)))
+
+    async def stats(self, job_types: List[str]) -> Dict[str, Any]:
+        return {
+            "ready": {t: await self._redis.zcard(self._ready_key(t)) for t in job_types},
+            "inflight": await self._redis.zcard(self._inflight_key()),
+            "dead": await self._redis.llen(self._dead_key()),
+        }
+
+
+# Singleton Pattern
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(redis_url=get_settings().REDIS_URL)
+    return _job_queue
+
+
+async def close_job_queue() -> None:
+    global _job_queue
+    if _job_queue is not None:
+        await _job_queue.close()
+        _job_queue = None
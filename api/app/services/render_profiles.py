@@ -0,0 +1,155 @@
+"""
+Perfiles de render para Playwright.
+
+Cada perfil define qué recursos se bloquean (vía ``page.route``) y cómo se
+espera a que la página esté lista:
+
+- ``schema_only``:   extracción de schemas en la validación de URLs. Sin
+  imágenes, fuentes, media, CSS ni trackers; ``domcontentloaded`` y espera
+  a que aparezca un ``<script type="application/ld+json">``.
+- ``html_snapshot``: captura de HTML (endpoint público, re-análisis). Sin
+  imágenes, fuentes, media ni trackers; espera ``load``.
+- ``full_audit``:    auditoría de rendimiento. No bloquea nada y espera
+  ``networkidle``: las métricas deben reflejar la carga real.
+
+``snapshot_key`` es el perfil con el que se guarda el HTML en la caché de
+snapshots: ``html_snapshot`` y ``full_audit`` producen el mismo DOM y
+comparten entrada; ``schema_only`` puede quedarse corto y usa la suya.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import FrozenSet, Optional
+from urllib.parse import urlsplit
+
+from playwright.async_api import Page, Route
+
+from app.services.html_snapshot_cache import DEFAULT_RENDER_PROFILE
+
+logger = logging.getLogger(__name__)
+
+JSON_LD_SELECTOR = 'script[type="application/ld+json"]'
+
+# Dominios de analítica/publicidad que no aportan al HTML ni a los schemas.
+# googletagmanager.com NO se bloquea: muchos sitios inyectan su JSON-LD desde GTM.
+TRACKER_DOMAINS = (
+    "google-analytics.com",
+    "analytics.google.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "facebook.net",
+    "connect.facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "bat.bing.com",
+    "segment.io",
+    "cdn.segment.com",
+    "mixpanel.com",
+    "fullstory.com",
+    "analytics.tiktok.com",
+    "snap.licdn.com",
+    "criteo.com",
+    "criteo.net",
+    "taboola.com",
+    "outbrain.com",
+    "js-agent.newrelic.com",
+    "nr-data.net",
+)
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    name: str
+    blocked_resource_types: FrozenSet[str]
+    block_trackers: bool
+    wait_until: str
+    wait_for_selector: Optional[str] = None
+    selector_timeout_ms: int = 0
+    settle_ms: int = 0
+    snapshot_key: str = DEFAULT_RENDER_PROFILE
+
+    @property
+    def blocks_requests(self) -> bool:
+        return bool(self.blocked_resource_types) or self.block_trackers
+
+
+RENDER_PROFILES = {
+    "schema_only": RenderProfile(
+        name="schema_only",
+        blocked_resource_types=frozenset({"image", "media", "font", "stylesheet"}),
+        block_trackers=True,
+        wait_until="domcontentloaded",
+        wait_for_selector=JSON_LD_SELECTOR,
+        selector_timeout_ms=4000,
+        snapshot_key="schema_only",
+    ),
+    "html_snapshot": RenderProfile(
+        name="html_snapshot",
+        blocked_resource_types=frozenset({"image", "media", "font"}),
+        block_trackers=True,
+        wait_until="load",
+        settle_ms=500,
+    ),
+    "full_audit": RenderProfile(
+        name="full_audit",
+        blocked_resource_types=frozenset(),
+        block_trackers=False,
+        wait_until="networkidle",
+        settle_ms=2000,
+    ),
+}
+
+
+def get_render_profile(name: str) -> RenderProfile:
+    try:
+        return RENDER_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Perfil de render desconocido: {name}")
+
+
+def is_tracker(url: str) -> bool:
+    host = (urlsplit(url).hostname or "").lower()
+    return any(host == domain or host.endswith(f".{domain}") for domain in TRACKER_DOMAINS)
+
+
+async def apply_render_profile(page: Page, profile: RenderProfile) -> None:
+    """Instala el bloqueo de recursos del perfil (antes de navegar)."""
+    if not profile.blocks_requests:
+        return
+
+    async def _route(route: Route):
+        request = route.request
+        if request.resource_type in profile.blocked_resource_types or (
+            profile.block_trackers and is_tracker(request.url)
+        ):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await page.route("**/*", _route)
+
+
+async def navigate_with_profile(page: Page, url: str, profile: RenderProfile, timeout_ms: int):
+    """
+    Navega con la estrategia de espera del perfil. Devuelve la respuesta de
+    ``goto`` o None si la navegación expiró (se trabaja con lo cargado).
+    """
+    try:
+        response = await page.goto(url, wait_until=profile.wait_until, timeout=timeout_ms)
+    except Exception as e:
+        logger.info(f"[render:{profile.name}] goto incompleto para {url}: {e}")
+        response = None
+
+    if profile.wait_for_selector:
+        try:
+            await page.wait_for_selector(
+                profile.wait_for_selector, state="attached", timeout=profile.selector_timeout_ms
+            )
+        except Exception:
+            # Páginas sin JSON-LD (solo microdata/RDFa o sin schemas)
+            pass
+
+    if profile.settle_ms:
+        await asyncio.sleep(profile.settle_ms / 1000)
+    return response
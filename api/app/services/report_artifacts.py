@@ -0,0 +1,181 @@
+"""
+Almacén de reportes direccionado por contenido.
+
+Cada reporte PDF/Word se guarda en ``<STORAGE_PATH>/reports/artifacts/<aa>/<clave>/``
+donde la clave es el SHA-256 de sus datos de origen (campos de la auditoría
+que lee ``ReportGenerator``, payload de comparación / texto de IA), la versión
+de plantilla y el formato. Con las mismas entradas se reutiliza el archivo
+aunque la entidad haya perdido su ruta, y dos reportes nunca colisionan por
+nombre. La expulsión es LRU (último acceso) bajo ``REPORT_STORE_MAX_BYTES``.
+
+``build_artifact`` es el punto de entrada picklable que se ejecuta en el pool
+de procesos de reportes: calcula la clave, sirve el archivo existente o lo
+renderiza y publica de forma atómica.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.core.config import get_settings
+from app.services.report_generator import (
+    REPORT_SOURCE_FIELDS,
+    REPORT_TEMPLATE_VERSION,
+    render_report,
+)
+
+log = logging.getLogger(__name__)
+
+_STAGING_DIR = ".staging"
+# Directorios de staging huérfanos (proceso muerto a mitad de render)
+_STAGING_MAX_AGE_SECONDS = 60 * 60
+
+
+def artifact_key(kind: str, audit_data: Dict[str, Any], payload: Any = None) -> str:
+    """Clave estable del reporte: versión de plantilla + formato + datos de origen."""
+    source = {
+        "template": REPORT_TEMPLATE_VERSION,
+        "kind": kind,
+        "audit": {name: audit_data.get(name) for name in REPORT_SOURCE_FIELDS},
+        "payload": payload,
+    }
+    canonical = json.dumps(source, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ReportArtifactStore:
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _artifact_dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def contains(self, file_path: Path) -> bool:
+        return self.root.resolve() in file_path.resolve().parents
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Ruta del artefacto si existe (y lo marca como usado)."""
+        artifact_dir = self._artifact_dir(key)
+        if not artifact_dir.is_dir():
+            return None
+        for file_path in artifact_dir.iterdir():
+            if file_path.is_file():
+                self.touch(file_path)
+                return str(file_path)
+        return None
+
+    def touch(self, file_path: Path) -> None:
+        """Actualiza solo el atime (orden LRU); el mtime sigue siendo la fecha del render."""
+        try:
+            stat = file_path.stat()
+            os.utime(file_path, ns=(time.time_ns(), stat.st_mtime_ns))
+        except OSError:
+            pass
+
+    def staging_dir(self) -> Path:
+        staging = self.root / _STAGING_DIR / uuid.uuid4().hex
+        staging.mkdir(parents=True, exist_ok=True)
+        return staging
+
+    def publish(self, key: str, staged_file: Path) -> str:
+        """Mueve el render al directorio de su clave; si otro proceso ganó, se usa el suyo."""
+        artifact_dir = self._artifact_dir(key)
+        artifact_dir.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.rename(staged_file.parent, artifact_dir)
+        except OSError:
+            shutil.rmtree(staged_file.parent, ignore_errors=True)
+            existing = self.lookup(key)
+            if existing:
+                return existing
+            raise
+        return str(artifact_dir / staged_file.name)
+
+    def etag(self, file_path: Path) -> str:
+        """ETag fuerte: la clave de contenido, o tamaño+mtime fuera del almacén."""
+        if self.contains(file_path):
+            return f'"{file_path.parent.name}"'
+        stat = file_path.stat()
+        return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Borra los artefactos menos usados hasta quedar bajo el presupuesto."""
+        if not self.root.exists():
+            return 0
+
+        entries = []
+        total = 0
+        now = time.time()
+        for shard in self.root.iterdir():
+            if not shard.is_dir():
+                continue
+            if shard.name == _STAGING_DIR:
+                for staging in shard.iterdir():
+                    try:
+                        if now - staging.stat().st_mtime > _STAGING_MAX_AGE_SECONDS:
+                            shutil.rmtree(staging, ignore_errors=True)
+                    except OSError:
+                        continue
+                continue
+            for artifact_dir in shard.iterdir():
+                try:
+                    files = [f for f in artifact_dir.iterdir() if f.is_file()]
+                    size = sum(f.stat().st_size for f in files)
+                    last_used = max((f.stat().st_atime for f in files), default=0)
+                except OSError:
+                    continue
+                total += size
+                entries.append((last_used, size, artifact_dir))
+
+        evicted = 0
+        for _last_used, size, artifact_dir in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            if artifact_dir.name == keep:
+                continue
+            shutil.rmtree(artifact_dir, ignore_errors=True)
+            total -= size
+            evicted += 1
+
+        if evicted:
+            log.info("Almacén de reportes: %s artefactos expulsados (LRU)", evicted)
+        return evicted
+
+
+_report_artifact_store: Optional[ReportArtifactStore] = None
+
+
+def get_report_artifact_store() -> ReportArtifactStore:
+    global _report_artifact_store
+    if _report_artifact_store is None:
+        settings = get_settings()
+        _report_artifact_store = ReportArtifactStore(
+            root=Path(settings.STORAGE_PATH) / "reports" / "artifacts",
+            max_bytes=settings.REPORT_STORE_MAX_BYTES,
+        )
+    return _report_artifact_store
+
+
+def build_artifact(kind: str, audit_data: Dict[str, Any], payload: Any = None) -> str:
+    """Devuelve el reporte del almacén o lo renderiza (se ejecuta en el pool de reportes)."""
+    store = get_report_artifact_store()
+    key = artifact_key(kind, audit_data, payload)
+    existing = store.lookup(key)
+    if existing:
+        return existing
+
+    staging = store.staging_dir()
+    try:
+        staged_file = Path(render_report(kind, audit_data, payload, output_dir=staging))
+        file_path = store.publish(key, staged_file)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    store.evict(keep=key)
+    return file_path
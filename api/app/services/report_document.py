@@ -0,0 +1,189 @@
+"""
+Modelo intermedio de documento para los reportes.
+
+El markdown que devuelve la IA se convierte una vez en una lista de bloques
+(encabezados, párrafos, elementos de lista, tablas y bloques de código) que
+después consumen los escritores de cada formato: ``ReportGenerator`` los
+convierte en flowables de ReportLab para el PDF y ``DocxReportWriter`` los
+escribe directamente en Word y el Excel toma de ellos las tablas y los
+bloques JSON. El texto de los bloques conserva el formato inline de markdown
+(``**negritas**`` y ``código``); cada escritor lo aplica a partir de
+``inline_spans``.
+
+El análisis es de una sola pasada y se cachea por texto: un reporte de
+comparación usa el mismo texto de IA en el PDF, el Word y el Excel (y varias
+veces dentro de cada uno), y solo se tokeniza la primera vez.
+"""
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple, Union
+
+_TABLE_SEPARATOR = re.compile(r'\|?[\s-]+\|[\s-]+\|?')
+_INLINE = re.compile(r'(\*\*.*?\*\*|`.*?`)')
+
+
+@dataclass(frozen=True)
+class HeadingBlock:
+    level: int
+    text: str
+
+
+@dataclass(frozen=True)
+class ParagraphBlock:
+    text: str
+
+
+@dataclass(frozen=True)
+class ListItemBlock:
+    text: str
+
+
+@dataclass(frozen=True)
+class TableBlock:
+    # La primera fila es el encabezado
+    rows: Tuple[Tuple[str, ...], ...]
+
+
+@dataclass(frozen=True)
+class CodeBlock:
+    text: str
+    # False si el texto terminó sin cerrar el bloque ```
+    closed: bool = True
+    # Lenguaje de la cerca (```json -> "json")
+    language: str = ""
+
+
+Block = Union[HeadingBlock, ParagraphBlock, ListItemBlock, TableBlock, CodeBlock]
+Blocks = Tuple[Block, ...]
+
+
+def markdown_text(text: Union[str, dict, Any]) -> str:
+    """Normaliza el contenido de IA (dict de respuestas antiguas o str) a texto."""
+    if not text:
+        return ""
+    if isinstance(text, dict):
+        text = text.get('content', '') or text.get('analysis', '') or str(text)
+    if not isinstance(text, str):
+        text = str(text)
+    return text
+
+
+def _split_row(stripped: str) -> Tuple[str, ...]:
+    # "| Col1 | Col2 |" -> ("Col1", "Col2")
+    return tuple(c.strip() for c in stripped.strip('|').split('|'))
+
+
+def parse_markdown_blocks(text: Union[str, dict, Any]) -> Blocks:
+    """Convierte markdown en bloques. Soporta encabezados, listas, código y tablas."""
+    text = markdown_text(text)
+    if not text:
+        return ()
+    return _tokenize(text)
+
+
+@lru_cache(maxsize=128)
+def _tokenize(text: str) -> Blocks:
+    blocks: List[Block] = []
+    code_buffer: List[str] = []
+    table_buffer: List[Tuple[str, ...]] = []
+    code_language = ""
+    in_code = False
+
+    def flush_table():
+        if table_buffer:
+            blocks.append(TableBlock(rows=tuple(table_buffer)))
+            table_buffer.clear()
+
+    for line in text.split('\n'):
+        stripped = line.strip()
+
+        # 1. Bloques de código
+        if stripped.startswith("```"):
+            if in_code:
+                blocks.append(CodeBlock(text="\n".join(code_buffer), language=code_language))
+                code_buffer = []
+                in_code = False
+            else:
+                flush_table()
+                in_code = True
+                code_language = stripped[3:].strip().lower()
+            continue
+
+        if in_code:
+            code_buffer.append(line)
+            continue
+
+        # 2. Tablas (líneas que empiezan con | y tienen más separadores)
+        if stripped.startswith('|') and '|' in stripped[1:]:
+            if not _TABLE_SEPARATOR.match(stripped):
+                table_buffer.append(_split_row(stripped))
+            continue
+
+        flush_table()
+
+        if not stripped:
+            continue
+
+        # 3. Encabezados, listas y párrafos
+        if stripped.startswith("#"):
+            level = len(stripped) - len(stripped.lstrip('#'))
+            blocks.append(HeadingBlock(level=level, text=stripped.strip('# ').strip()))
+        elif stripped.startswith("- ") or stripped.startswith("* "):
+            blocks.append(ListItemBlock(text=stripped[2:]))
+        else:
+            blocks.append(ParagraphBlock(text=stripped))
+
+    # Texto que termina dentro de una tabla o un bloque de código
+    flush_table()
+    if in_code and code_buffer:
+        blocks.append(CodeBlock(text="\n".join(code_buffer), closed=False, language=code_language))
+
+    return tuple(blocks)
+
+
+def table_blocks(blocks: Blocks) -> List[TableBlock]:
+    return [block for block in blocks if isinstance(block, TableBlock)]
+
+
+def json_objects(blocks: Blocks) -> List[Dict]:
+    """
+    Objetos JSON de los bloques ```json cerrados; si no hay ninguno, de los
+    bloques de código genéricos cuyo contenido empieza por ``{`` o ``[``.
+    """
+    closed = [block for block in blocks if isinstance(block, CodeBlock) and block.closed]
+    objects = _json_from_code(b for b in closed if b.language == "json")
+    if not objects:
+        objects = _json_from_code(b for b in closed if b.text.strip().startswith(('{', '[')))
+    return objects
+
+
+def _json_from_code(code_blocks) -> List[Dict]:
+    objects: List[Dict] = []
+    for block in code_blocks:
+        try:
+            parsed = json.loads(block.text.strip())
+        except ValueError:
+            continue
+        if isinstance(parsed, list):
+            objects.extend(item for item in parsed if isinstance(item, dict))
+        elif isinstance(parsed, dict):
+            objects.append(parsed)
+    return objects
+
+
+@lru_cache(maxsize=4096)
+def inline_spans(text: str) -> Tuple[Tuple[str, str], ...]:
+    """Divide texto con formato inline en (texto, estilo): ``plain``, ``bold`` o ``code``."""
+    spans = []
+    for part in _INLINE.split(text):
+        if not part:
+            continue
+        if len(part) >= 4 and part.startswith('**') and part.endswith('**'):
+            spans.append((part[2:-2], 'bold'))
+        elif len(part) >= 2 and part.startswith('`') and part.endswith('`'):
+            spans.append((part[1:-1], 'code'))
+        else:
+            spans.append((part, 'plain'))
+    return tuple(spans)
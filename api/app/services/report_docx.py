@@ -0,0 +1,225 @@
+"""
+Escritor nativo de reportes Word (python-docx).
+
+Escribe los mismos bloques del modelo intermedio (``report_document``) que
+el PDF convierte en flowables, con el mismo estilo corporativo. Sustituye a
+la conversión PDF -> Word con pdf2docx, que analizaba el layout página por
+página y era lenta y costosa en memoria con reportes largos.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Union
+
+from docx import Document
+from docx.enum.table import WD_TABLE_ALIGNMENT
+from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_BREAK
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Inches, Pt, RGBColor
+
+from app.services.report_document import (
+    Block,
+    CodeBlock,
+    HeadingBlock,
+    ListItemBlock,
+    ParagraphBlock,
+    TableBlock,
+    inline_spans,
+)
+
+# Paleta del PDF (ReportGenerator._setup_pdf_styles)
+COLOR_PRIMARY = "102A43"
+COLOR_SECONDARY = "334E68"
+COLOR_H3 = "486581"
+COLOR_TEXT = "243B53"
+COLOR_BG_LIGHT = "F0F4F8"
+COLOR_CODE_BG = "F5F7FA"
+
+_BODY_FONT = "Helvetica"
+_CODE_FONT = "Courier New"
+
+# Tamaño, color e itálica por nivel de encabezado (H1, H2, H3+)
+_HEADING_STYLES = {
+    1: (18, COLOR_PRIMARY, False),
+    2: (15, COLOR_SECONDARY, False),
+    3: (13, COLOR_H3, True),
+}
+
+
+@dataclass(frozen=True)
+class DocxCell:
+    """Celda con formato explícito (por defecto las celdas son texto markdown)."""
+    text: str
+    color: Optional[str] = None
+    bold: bool = False
+
+
+Cell = Union[str, DocxCell]
+
+
+def _shade(element, hex_color: str) -> None:
+    """Fondo de una celda o párrafo (w:shd)."""
+    props = element.get_or_add_tcPr() if hasattr(element, "get_or_add_tcPr") else element.get_or_add_pPr()
+    shading = OxmlElement("w:shd")
+    shading.set(qn("w:val"), "clear")
+    shading.set(qn("w:color"), "auto")
+    shading.set(qn("w:fill"), hex_color)
+    props.append(shading)
+
+
+class DocxReportWriter:
+    def __init__(self):
+        self.document = Document()
+        for section in self.document.sections:
+            section.top_margin = Pt(40)
+            section.bottom_margin = Pt(40)
+            section.left_margin = Inches(0.5)
+            section.right_margin = Inches(0.5)
+
+        normal = self.document.styles["Normal"]
+        normal.font.name = _BODY_FONT
+        normal.font.size = Pt(11)
+        normal.font.color.rgb = RGBColor.from_string(COLOR_TEXT)
+        normal.paragraph_format.space_after = Pt(8)
+
+    # ------------------------------------------------------------------
+    # Primitivas
+    # ------------------------------------------------------------------
+
+    def _add_inline(self, paragraph, text: str, color: Optional[str] = None, bold: bool = False) -> None:
+        for span, style in inline_spans(text):
+            run = paragraph.add_run(span)
+            run.bold = bold or style == "bold"
+            if style == "code":
+                run.font.name = _CODE_FONT
+                run.font.size = Pt(9)
+            if color:
+                run.font.color.rgb = RGBColor.from_string(color)
+
+    def title(self, text: str) -> None:
+        paragraph = self.document.add_paragraph()
+        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        paragraph.paragraph_format.space_before = Pt(40)
+        paragraph.paragraph_format.space_after = Pt(40)
+        run = paragraph.add_run(text)
+        run.bold = True
+        run.font.size = Pt(28)
+        run.font.color.rgb = RGBColor.from_string(COLOR_PRIMARY)
+
+    def heading(self, text: str, level: int = 1) -> None:
+        size, color, italic = _HEADING_STYLES[min(max(level, 1), 3)]
+        paragraph = self.document.add_heading(level=min(max(level, 1), 3))
+        paragraph.paragraph_format.space_before = Pt(size + 6)
+        paragraph.paragraph_format.space_after = Pt(size // 2 + 2)
+        for span, style in inline_spans(text):
+            run = paragraph.add_run(span)
+            run.bold = True
+            run.italic = italic
+            run.font.name = _CODE_FONT if style == "code" else _BODY_FONT
+            run.font.size = Pt(size)
+            run.font.color.rgb = RGBColor.from_string(color)
+
+    def paragraph(self, text: str, justify: bool = True) -> None:
+        paragraph = self.document.add_paragraph()
+        if justify:
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+        self._add_inline(paragraph, text)
+
+    def label(self, label: str, value: str) -> None:
+        """Línea ``**Etiqueta:** valor`` de los metadatos del reporte."""
+        paragraph = self.document.add_paragraph()
+        paragraph.add_run(f"{label}: ").bold = True
+        paragraph.add_run(value)
+
+    def bullet(self, text: str) -> None:
+        paragraph = self.document.add_paragraph(style="List Bullet")
+        self._add_inline(paragraph, text)
+
+    def code(self, text: str) -> None:
+        paragraph = self.document.add_paragraph()
+        paragraph.paragraph_format.left_indent = Pt(6)
+        paragraph.paragraph_format.right_indent = Pt(6)
+        paragraph.paragraph_format.space_before = Pt(5)
+        paragraph.paragraph_format.space_after = Pt(5)
+        _shade(paragraph._p, COLOR_CODE_BG)
+        lines = text.split("\n")
+        for idx, line in enumerate(lines):
+            run = paragraph.add_run(line)
+            run.font.name = _CODE_FONT
+            run.font.size = Pt(8)
+            run.font.color.rgb = RGBColor.from_string(COLOR_PRIMARY)
+            if idx < len(lines) - 1:
+                run.add_break()
+
+    def table(
+        self,
+        rows: Sequence[Sequence[Cell]],
+        header: bool = True,
+        zebra: bool = True,
+        col_widths: Optional[Sequence[float]] = None,
+        center: bool = False,
+    ) -> None:
+        """Tabla con encabezado oscuro y filas alternas, como en el PDF."""
+        if not rows:
+            return
+        col_count = max(len(row) for row in rows)
+        table = self.document.add_table(rows=len(rows), cols=col_count)
+        table.style = "Table Grid"
+        table.alignment = WD_TABLE_ALIGNMENT.CENTER
+
+        for r_idx, row in enumerate(rows):
+            is_header = header and r_idx == 0
+            for c_idx in range(col_count):
+                raw = row[c_idx] if c_idx < len(row) else ""
+                cell_value = raw if isinstance(raw, DocxCell) else DocxCell(text=str(raw))
+                cell = table.cell(r_idx, c_idx)
+                if col_widths:
+                    cell.width = Inches(col_widths[c_idx])
+                paragraph = cell.paragraphs[0]
+                paragraph.paragraph_format.space_after = Pt(0)
+                if is_header or center:
+                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                self._add_inline(
+                    paragraph,
+                    cell_value.text,
+                    color="FFFFFF" if is_header else cell_value.color,
+                    bold=is_header or cell_value.bold,
+                )
+                if is_header:
+                    _shade(cell._tc, COLOR_PRIMARY)
+                elif zebra and r_idx % 2 == 0:
+                    _shade(cell._tc, COLOR_BG_LIGHT)
+
+        self.document.add_paragraph()
+
+    def page_break(self) -> None:
+        self.document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+
+    # ------------------------------------------------------------------
+    # Modelo intermedio
+    # ------------------------------------------------------------------
+
+    def blocks(self, blocks: Iterable[Block]) -> None:
+        for block in blocks:
+            if isinstance(block, HeadingBlock):
+                self.heading(block.text, block.level)
+            elif isinstance(block, ListItemBlock):
+                self.bullet(block.text)
+            elif isinstance(block, TableBlock):
+                self.table(block.rows)
+            elif isinstance(block, CodeBlock):
+                self.code(block.text)
+            elif isinstance(block, ParagraphBlock):
+                self.paragraph(block.text)
+
+    def italic_note(self, text: str) -> None:
+        self.document.add_paragraph().add_run(text).italic = True
+
+    def save(self, path: Union[str, Path]) -> str:
+        self.document.save(str(path))
+        return str(path)
+
+
+def dataframe_rows(df) -> List[List[str]]:
+    """Filas (encabezado + datos) de un DataFrame para ``DocxReportWriter.table``."""
+    return [[str(c) for c in df.columns]] + [["" if v is None else str(v) for v in row] for row in df.values.tolist()]
@@ -2,13 +2,19 @@ import re
 import json
 import pandas as pd
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
+from uuid import uuid4
 from typing import List, Union, Any, Dict, Optional
 import openpyxl # Importar openpyxl para estilos
-from pdf2docx import Converter
 
 # Importamos tu modelo (ajusta la ruta según tu estructura)
 from app.models.audit import AuditReport
+from app.services.report_docx import DocxCell, DocxReportWriter, dataframe_rows
+from app.services.report_document import (
+    Blocks, CodeBlock, HeadingBlock, ListItemBlock, TableBlock,
+    inline_spans, json_objects, parse_markdown_blocks, table_blocks,
+)
 
 # ReportLab imports
 from reportlab.lib import colors
@@ -21,6 +27,164 @@ from reportlab.platypus import (
 )
 from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER, TA_LEFT
 
+# Colores Corporativos Sobrios (Dark Navy & Grey scales)
+COLOR_PRIMARY = colors.HexColor("#102A43")   # Azul marino oscuro profundo
+COLOR_SECONDARY = colors.HexColor("#334E68") # Azul acero
+COLOR_ACCENT = colors.HexColor("#D32F2F")    # Rojo oscuro para alertas
+COLOR_BG_LIGHT = colors.HexColor("#F0F4F8")  # Gris azulado muy claro
+
+_XML_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+
+@lru_cache(maxsize=1)
+def _pdf_stylesheet():
+    """Hoja de estilos del PDF (se construye una vez por proceso)."""
+    styles = getSampleStyleSheet()
+
+    # Estilo Normal Justificado
+    styles.add(ParagraphStyle(
+        name='Justify',
+        parent=styles['Normal'],
+        fontName='Helvetica',
+        alignment=TA_JUSTIFY,
+        leading=15,             # Interlineado más aireado
+        fontSize=11,            # Letra más legible
+        textColor=colors.HexColor("#243B53"),
+        spaceAfter=8
+    ))
+
+    # Listas Markdown
+    styles.add(ParagraphStyle(
+        name='MarkdownList',
+        parent=styles['Normal'],
+        fontName='Helvetica',
+        leftIndent=24,
+        firstLineIndent=0,
+        spaceAfter=6,
+        bulletIndent=12,
+        leading=14,
+        fontSize=11,
+        textColor=colors.HexColor("#243B53")
+    ))
+
+    # Bloques de Código (JSON/Code) - Estilo terminal limpio
+    styles.add(ParagraphStyle(
+        name='CodeBlock',
+        fontName='Courier',
+        fontSize=8, # Reducir un poco el tamaño
+        leading=10,
+        backColor=colors.HexColor("#F5F7FA"),
+        borderPadding=10,
+        leftIndent=6,
+        rightIndent=6,
+        textColor=colors.HexColor("#102A43"),
+        spaceBefore=5,
+        spaceAfter=5,
+        borderColor=colors.HexColor("#D9E2EC"),
+        borderWidth=0.5,
+        splitLongWords=True, # Permitir cortar palabras largas
+        allowWidows=0,
+        allowOrphans=0,
+        wordWrap='CJK' # wrap violento si es necesario
+    ))
+
+    # Títulos
+    styles.add(ParagraphStyle(
+        name='ReportTitle',
+        parent=styles['Title'],
+        fontSize=28,
+        fontName='Helvetica-Bold',
+        spaceBefore=40,
+        spaceAfter=50,
+        leading=36,
+        textColor=COLOR_PRIMARY,
+        alignment=TA_CENTER
+    ))
+
+    styles.add(ParagraphStyle(
+        name='H1',
+        fontSize=18,
+        fontName='Helvetica-Bold',
+        spaceBefore=24,
+        spaceAfter=12,
+        leading=22,
+        textColor=COLOR_PRIMARY,
+        borderPadding=0,
+        borderWidth=0
+    ))
+
+    styles.add(ParagraphStyle(
+        name='H2',
+        fontSize=15,
+        fontName='Helvetica-Bold',
+        spaceBefore=18,
+        spaceAfter=10,
+        leading=20,
+        textColor=COLOR_SECONDARY
+    ))
+
+    styles.add(ParagraphStyle(
+        name='H3',
+        fontSize=13,
+        fontName='Helvetica-BoldOblique',
+        spaceBefore=12,
+        spaceAfter=6,
+        leading=16,
+        textColor=colors.HexColor("#486581")
+    ))
+
+    # Estilos para celdas de tabla
+    styles.add(ParagraphStyle(
+        name='CellHeader',
+        fontSize=10,
+        fontName='Helvetica-Bold',
+        textColor=colors.white,
+        alignment=TA_CENTER,
+        leading=12
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CellBody',
+        fontSize=10,
+        fontName='Helvetica',
+        textColor=colors.HexColor("#102A43"),
+        alignment=TA_LEFT,
+        leading=13
+    ))
+
+    # Estilo para valores de scores
+    styles.add(ParagraphStyle(
+        name='ScoreVal',
+        fontSize=16,
+        fontName='Helvetica-Bold',
+        textColor=colors.black,
+        alignment=TA_CENTER,
+        leading=20
+    ))
+
+    return styles
+
+
+@lru_cache(maxsize=4096)
+def _reportlab_markup(raw_text: str) -> str:
+    """Markup de ReportLab a partir de los spans inline (texto escapado para XML)."""
+    parts = []
+    for span, style in inline_spans(raw_text):
+        safe = span.translate(_XML_ESCAPES)
+        if style == 'bold':
+            parts.append(f"<b>{safe}</b>")
+        elif style == 'code':
+            parts.append(f'<font name="Courier" backColor="#f0f0f0">{safe}</font>')
+        else:
+            parts.append(safe)
+    return "".join(parts)
+
+
+def _file_stamp() -> str:
+    # Segundos + sufijo aleatorio: dos reportes del mismo dominio en el mismo minuto no colisionan
+    return f"{datetime.now():%Y%m%d_%H%M%S}_{uuid4().hex[:6]}"
+
+
 class ReportGenerator:
     def __init__(self, audit: AuditReport):
         self.audit = audit
@@ -48,141 +212,21 @@ class ReportGenerator:
 
         self.base_dir = Path("storage/reports") / clean_domain
         self.base_dir.mkdir(parents=True, exist_ok=True)
-        self.timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+        self.timestamp = _file_stamp()
 
         # 3. Estilos
         self._setup_pdf_styles()
 
     def _setup_pdf_styles(self):
         """Define estilos visuales profesionales y sobrios (Corporate/Executive)."""
-        self.styles = getSampleStyleSheet()
+        # La hoja de estilos se construye una vez por proceso y se comparte (no se modifica)
+        self.styles = _pdf_stylesheet()
 
         # Colores Corporativos Sobrios (Dark Navy & Grey scales)
-        self.color_primary = colors.HexColor("#102A43")   # Azul marino oscuro profundo
-        self.color_secondary = colors.HexColor("#334E68") # Azul acero
-        self.color_accent = colors.HexColor("#D32F2F")    # Rojo oscuro para alertas
-        self.color_bg_light = colors.HexColor("#F0F4F8")  # Gris azulado muy claro
-
-        # Estilo Normal Justificado
-        self.styles.add(ParagraphStyle(
-            name='Justify',
-            parent=self.styles['Normal'],
-            fontName='Helvetica',
-            alignment=TA_JUSTIFY,
-            leading=15,             # Interlineado más aireado
-            fontSize=11,            # Letra más legible
-            textColor=colors.HexColor("#243B53"),
-            spaceAfter=8
-        ))
-
-        # Listas Markdown
-        self.styles.add(ParagraphStyle(
-            name='MarkdownList',
-            parent=self.styles['Normal'],
-            fontName='Helvetica',
-            leftIndent=24,
-            firstLineIndent=0,
-            spaceAfter=6,
-            bulletIndent=12,
-            leading=14,
-            fontSize=11,
-            textColor=colors.HexColor("#243B53")
-        ))
-
-        # Bloques de Código (JSON/Code) - Estilo terminal limpio
-        self.styles.add(ParagraphStyle(
-            name='CodeBlock',
-            fontName='Courier',
-            fontSize=8, # Reducir un poco el tamaño
-            leading=10,
-            backColor=colors.HexColor("#F5F7FA"),
-            borderPadding=10,
-            leftIndent=6,
-            rightIndent=6,
-            textColor=colors.HexColor("#102A43"),
-            spaceBefore=5,
-            spaceAfter=5,
-            borderColor=colors.HexColor("#D9E2EC"),
-            borderWidth=0.5,
-            splitLongWords=True, # Permitir cortar palabras largas
-            allowWidows=0,
-            allowOrphans=0,
-            wordWrap='CJK' # wrap violento si es necesario
-        ))
-
-        # Títulos
-        self.styles.add(ParagraphStyle(
-            name='ReportTitle',
-            parent=self.styles['Title'],
-            fontSize=28,
-            fontName='Helvetica-Bold',
-            spaceBefore=40,
-            spaceAfter=50,
-            leading=36,
-            textColor=self.color_primary,
-            alignment=TA_CENTER
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='H1',
-            fontSize=18,
-            fontName='Helvetica-Bold',
-            spaceBefore=24,
-            spaceAfter=12,
-            leading=22,
-            textColor=self.color_primary,
-            borderPadding=0,
-            borderWidth=0
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='H2',
-            fontSize=15,
-            fontName='Helvetica-Bold',
-            spaceBefore=18,
-            spaceAfter=10,
-            leading=20,
-            textColor=self.color_secondary
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='H3',
-            fontSize=13,
-            fontName='Helvetica-BoldOblique',
-            spaceBefore=12,
-            spaceAfter=6,
-            leading=16,
-            textColor=colors.HexColor("#486581")
-        ))
-
-        # Estilos para celdas de tabla
-        self.styles.add(ParagraphStyle(
-            name='CellHeader',
-            fontSize=10,
-            fontName='Helvetica-Bold',
-            textColor=colors.white,
-            alignment=TA_CENTER,
-            leading=12
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='CellBody',
-            fontSize=10,
-            fontName='Helvetica',
-            textColor=colors.HexColor("#102A43"),
-            alignment=TA_LEFT,
-            leading=13
-        ))
-
-        # Estilo para valores de scores
-        self.styles.add(ParagraphStyle(
-            name='ScoreVal',
-            fontSize=16,
-            fontName='Helvetica-Bold',
-            textColor=colors.black,
-            alignment=TA_CENTER,
-            leading=20
-        ))
+        self.color_primary = COLOR_PRIMARY
+        self.color_secondary = COLOR_SECONDARY
+        self.color_accent = COLOR_ACCENT
+        self.color_bg_light = COLOR_BG_LIGHT
 
     def _get_score_color(self, score: Union[float, None]):
         if score is None: return colors.grey
@@ -191,299 +235,108 @@ class ReportGenerator:
         return colors.HexColor("#A80000") # Rojo oscuro
 
     def _extract_json_blocks(self, text: Union[str, Dict, Any]) -> List[Dict]:
-        """Extrae bloques de código JSON del texto markdown."""
-        if not text: return []
-
-        # Safety check
-        if isinstance(text, dict):
-             text = text.get('content', '') or str(text)
+        """Objetos JSON de los bloques de código del markdown (usa el AST cacheado)."""
+        return json_objects(parse_markdown_blocks(text))
 
-        if not isinstance(text, str):
-            text = str(text)
-
-        json_blocks = []
-
-        # 1. Buscar bloques ```json
-        pattern = r"```json\s*([\s\S]*?)\s*```"
-        matches = re.findall(pattern, text)
-
-        for match in matches:
-            try:
-                clean_json = match.strip()
-                parsed = json.loads(clean_json)
-                if isinstance(parsed, list):
-                    json_blocks.extend([item for item in parsed if isinstance(item, dict)])
-                elif isinstance(parsed, dict):
-                    json_blocks.append(parsed)
-            except json.JSONDecodeError:
-                pass
-
-        # 2. Si no hay bloques explicito, buscar bloques de codigo genericos
-        if not json_blocks:
-            pattern_gen = r"```\s*([\s\S]*?)\s*```"
-            matches_gen = re.findall(pattern_gen, text)
-            for match in matches_gen:
-                try:
-                    clean_json = match.strip()
-                    if clean_json.startswith('{') or clean_json.startswith('['):
-                        parsed = json.loads(clean_json)
-                        if isinstance(parsed, list):
-                            json_blocks.extend([item for item in parsed if isinstance(item, dict)])
-                        elif isinstance(parsed, dict):
-                            json_blocks.append(parsed)
-                except:
-                    pass
-
-        return json_blocks
-
-    def _parse_markdown_to_flowables(self, text: Union[str, Dict, Any]) -> List:
-        """
-        Parser Avanzado: Convierte Markdown a elementos PDF.
-        Soporta: Headers, Listas, Bloques de Código y **TABLAS**.
-        """
-        if not text: return []
+    @staticmethod
+    def _format_inline(raw_text: str) -> str:
+        """Limpia XML y aplica formato inline (negritas, código) para ReportLab."""
+        return _reportlab_markup(raw_text)
+
+    def _table_flowable(self, rows) -> Optional[Table]:
+        """Convierte las filas de una tabla markdown en una ReportLab Table bonita."""
+        if not rows: return None
+
+        # Renderizar contenido de celda como Párrafo para permitir wrapping
+        data = []
+        for row in rows:
+            style = self.styles['CellHeader'] if (len(data) == 0) else self.styles['CellBody']
+            data.append([Paragraph(self._format_inline(col), style) for col in row])
+
+        # Calcular ancho dinámico (asumiendo ancho página LETTER - margenes 0.4 inch cada lado)
+        # Ancho disponible aprox 7.7 inch
+        col_count = len(data[0])
+        available_width = 7.7 * inch
+        col_width = available_width / col_count # Distribuir equitativamente
+
+        t = Table(data, colWidths=[col_width] * col_count)
+
+        # Estilo visual de la tabla
+        t_style = [
+            ('BACKGROUND', (0, 0), (-1, 0), self.color_primary), # Header oscuro
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('PADDING', (0, 0), (-1, -1), 6),
+        ]
 
-        # Safety check: If text is a dict (e.g. from old cache or unhandled return), extract content
-        if isinstance(text, dict):
-            text = text.get('content', '') or text.get('analysis', '') or str(text)
+        # Filas alternas (Zebra striping)
+        for i in range(1, len(data)):
+            bg = self.color_bg_light if i % 2 == 0 else colors.white
+            t_style.append(('BACKGROUND', (0, i), (-1, i), bg))
 
-        # Ensure text is string before splitting
-        if not isinstance(text, str):
-            text = str(text)
+        t.setStyle(TableStyle(t_style))
+        return t
 
+    def _blocks_to_flowables(self, blocks: Blocks) -> List:
+        """Convierte los bloques del modelo intermedio en elementos PDF."""
         flowables = []
-        lines = text.split('\n')
-
-        # Buffers para estados
-        in_code = False
-        code_buffer = []
-
-        in_table = False
-        table_buffer = []
-        table_headers = []
-
-        # --- Helpers ---
-        def clean_and_format(raw_text):
-            """Limpia XML y aplica formato inline (negritas, itálicas, código)."""
-            # 1. Escapar XML básico
-            safe = raw_text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-
-            # 2. Negritas: **texto** -> <b>texto</b>
-            safe = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', safe)
-
-            # 3. Código inline: `texto` -> <font name="Courier">texto</font>
-            safe = re.sub(r'`(.*?)`', r'<font name="Courier" backColor="#f0f0f0">\1</font>', safe)
-
-            return safe
-
-        def flush_table(buffer):
-            """Convierte el buffer de texto de tabla en una ReportLab Table bonita."""
-            if not buffer: return None
-
-            # Procesar filas
-            data = []
-            for row_str in buffer:
-                # Eliminar barras iniciales/finales y separar
-                # Ejemplo: "| Col1 | Col2 |" -> ["Col1", "Col2"]
-                cols = [c.strip() for c in row_str.strip('|').split('|')]
-
-                # Renderizar contenido de celda como Párrafo para permitir wrapping
-                formatted_cols = []
-                for idx, col in enumerate(cols):
-                    style = self.styles['CellHeader'] if (len(data) == 0) else self.styles['CellBody']
-                    formatted_cols.append(Paragraph(clean_and_format(col), style))
-
-                data.append(formatted_cols)
-
-            if not data: return None
-
-            # Calcular ancho dinámico (asumiendo ancho página LETTER - margenes 0.4 inch cada lado)
-            # Ancho disponible aprox 7.7 inch
-            col_count = len(data[0])
-            available_width = 7.7 * inch
-            col_width = available_width / col_count # Distribuir equitativamente
-
-            t = Table(data, colWidths=[col_width] * col_count)
-
-            # Estilo visual de la tabla
-            t_style = [
-                ('BACKGROUND', (0, 0), (-1, 0), self.color_primary), # Header oscuro
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('PADDING', (0, 0), (-1, -1), 6),
-            ]
-
-            # Filas alternas (Zebra striping)
-            for i in range(1, len(data)):
-                bg = self.color_bg_light if i % 2 == 0 else colors.white
-                t_style.append(('BACKGROUND', (0, i), (-1, i), bg))
-
-            t.setStyle(TableStyle(t_style))
-            return t
-
-        # --- Loop Principal ---
-        for line in lines:
-            stripped = line.strip()
-
-            # 1. Detección de Bloques de Código
-            if stripped.startswith("```"):
-                if in_code:
-                    # Fin del bloque
-                    content = "\n".join(code_buffer)
-                    # Escapar caracteres para preformatted
-                    content = content.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        for block in blocks:
+            if isinstance(block, CodeBlock):
+                # Escapar caracteres para preformatted
+                content = block.text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+                if block.closed:
                     flowables.append(Preformatted(content, self.styles["CodeBlock"]))
                     flowables.append(Spacer(1, 10))
-                    code_buffer = []
-                    in_code = False
                 else:
-                    # Inicio del bloque
-                    # Si estábamos en tabla, cerrarla antes
-                    if in_table:
-                        t = flush_table(table_buffer)
-                        if t: flowables.append(t)
-                        flowables.append(Spacer(1, 10))
-                        table_buffer = []
-                        in_table = False
-
-                    in_code = True
-                continue
-
-            if in_code:
-                code_buffer.append(line)
-                continue
-
-            # 2. Detección de Tablas (Líneas que empiezan y terminan con |)
-            # Regex básico: empieza con |, tiene contenido, termina con opcional |
-            is_table_row = stripped.startswith('|') and '|' in stripped[1:]
+                    # XPreformatted mantiene la indentación y permite wrap básico
+                    flowables.append(XPreformatted(content, self.styles["CodeBlock"]))
 
-            if is_table_row:
-                # Detectar fila separadora Markdown (ej: |---|---|)
-                if re.match(r'\|?[\s-]+\|[\s-]+\|?', stripped):
-                    continue # Ignorar la línea separadora
-
-                if not in_table:
-                    in_table = True
-                    table_buffer = []
-
-                table_buffer.append(stripped)
-                continue
-
-            # Si no es tabla pero estábamos en una, FLUSH
-            if in_table:
-                t = flush_table(table_buffer)
+            elif isinstance(block, TableBlock):
+                t = self._table_flowable(block.rows)
                 if t:
                     flowables.append(t)
                     flowables.append(Spacer(1, 12))
-                table_buffer = []
-                in_table = False
 
-            if not stripped: continue
-
-            # 3. Headers
-            if stripped.startswith("#"):
-                level = stripped.count('#')
-                txt = clean_and_format(stripped.strip('# ').strip())
-
-                if level == 1:
+            elif isinstance(block, HeadingBlock):
+                if block.level == 1:
                     style = self.styles["H1"]
-                elif level == 2:
+                elif block.level == 2:
                     style = self.styles["H2"]
                 else:
                     style = self.styles["H3"]
+                flowables.append(Paragraph(self._format_inline(block.text), style))
 
-                flowables.append(Paragraph(txt, style))
-
-            # 4. Listas
-            elif stripped.startswith("- ") or stripped.startswith("* "):
-                txt = clean_and_format(stripped[2:])
-                flowables.append(Paragraph(f"&bull; {txt}", self.styles["MarkdownList"]))
+            elif isinstance(block, ListItemBlock):
+                flowables.append(Paragraph(f"&bull; {self._format_inline(block.text)}", self.styles["MarkdownList"]))
 
-            # 5. Párrafo Normal
             else:
-                txt = clean_and_format(stripped)
-                flowables.append(Paragraph(txt, self.styles["Justify"]))
-
-        # Limpieza final (por si el texto termina en código o tabla)
-        if in_table and table_buffer:
-            t = flush_table(table_buffer)
-            if t: flowables.append(t)
-
-        if in_code and code_buffer:
-            content = "\n".join(code_buffer).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            # Usar Paragraph en lugar de Preformatted permite wrapping, pero pierde indentación si no se cuida
-            # XPreformatted es mejor opción para mantener indentación y permitir wrap básico
-            # Sin embargo, para JSON muy largo, Paragraph con <br/> y &nbsp; es lo más seguro o XPreformatted
-            # Vamos a intentar XPreformatted que es más flexible que Preformatted
-            flowables.append(XPreformatted(content, self.styles["CodeBlock"]))
+                flowables.append(Paragraph(self._format_inline(block.text), self.styles["Justify"]))
 
         return flowables
 
-    def _extract_tables_from_text(self, text: Union[str, Dict, Any]) -> List[pd.DataFrame]:
-        """Extrae tablas Markdown de un texto y devuelve una lista de DataFrames."""
-        if not text: return []
-
-        # Safety check
-        if isinstance(text, dict):
-            text = text.get('content', '') or str(text)
-
-        if not isinstance(text, str):
-            text = str(text)
+    def _parse_markdown_to_flowables(self, text: Union[str, Dict, Any]) -> List:
+        """
+        Parser Avanzado: Convierte Markdown a elementos PDF.
+        Soporta: Headers, Listas, Bloques de Código y **TABLAS**.
+        """
+        return self._blocks_to_flowables(parse_markdown_blocks(text))
 
+    def _extract_tables_from_text(self, text: Union[str, Dict, Any]) -> List[pd.DataFrame]:
+        """Tablas Markdown del texto como DataFrames (usa el AST cacheado)."""
         tables = []
-        lines = text.split('\n')
-        current_table = []
-        in_table = False
-        headers = None
-
-        for line in lines:
-            stripped = line.strip()
-            # Detectar fila de tabla
-            if stripped.startswith('|') and '|' in stripped[1:]:
-                # Detectar separador |---|---|
-                if re.match(r'\|?[\s-]+\|[\s-]+\|?', stripped):
-                    continue
-
-                # Limpiar celdas
-                cells = [c.strip() for c in stripped.strip('|').split('|')]
-
-                if not in_table:
-                    # Nueva tabla encontrada
-                    in_table = True
-                    headers = cells
-                else:
-                    # Fila de datos
-                    if headers and len(cells) != len(headers):
-                        if len(cells) < len(headers):
-                            cells.extend([''] * (len(headers) - len(cells)))
-                        else:
-                            cells = cells[:len(headers)]
-                    current_table.append(cells)
-            else:
-                if in_table:
-                    # Fin de tabla
-                    if headers:
-                        try:
-                            df = pd.DataFrame(current_table, columns=headers)
-                            if not df.empty:
-                                tables.append(df)
-                        except Exception as e:
-                            print(f"Error creando tabla excel: {e}")
-
-                    in_table = False
-                    current_table = []
-                    headers = None
-
-        if in_table and headers:
+        for block in table_blocks(parse_markdown_blocks(text)):
+            headers = list(block.rows[0])
+            # Filas de datos ajustadas al número de columnas del encabezado
+            rows = [(list(row) + [''] * len(headers))[:len(headers)] for row in block.rows[1:]]
             try:
-                df = pd.DataFrame(current_table, columns=headers)
-                if not df.empty:
-                    tables.append(df)
-            except:
-                pass
-
+                df = pd.DataFrame(rows, columns=headers)
+            except Exception as e:
+                print(f"Error creando tabla excel: {e}")
+                continue
+            if not df.empty:
+                tables.append(df)
         return tables
 
     def _write_dfs_to_sheet(self, writer, dfs: List[pd.DataFrame], sheet_name: str):
@@ -650,20 +503,52 @@ class ReportGenerator:
 
         return str(filename)
 
-    def generate_docx(self, pdf_path: Optional[Path] = None, keep_pdf: bool = True) -> str:
-        """Genera el reporte en Word (DOCX) convirtiendo el PDF."""
-        pdf_filename = pdf_path or self.base_dir / f"Reporte_SEO_{self.timestamp}.pdf"
-        docx_filename = pdf_filename.with_suffix(".docx")
-        generated_pdf = False
+    def generate_docx(self, filename: Optional[Path] = None) -> str:
+        """Genera el reporte individual en Word (DOCX) con el mismo contenido que el PDF."""
+        filename = filename or self.base_dir / f"Reporte_SEO_{self.timestamp}.docx"
+        writer = DocxReportWriter()
 
-        if not pdf_filename.exists():
-            self.generate_pdf(pdf_filename)
-            generated_pdf = True
+        # --- Encabezado ---
+        writer.title("Reporte de Auditoría SEO Integral")
+        writer.label("URL Objetivo", self.url)
+        writer.label("ID", str(self.audit.id))
+        writer.label("Generado", datetime.now().strftime('%d/%m/%Y %H:%M'))
 
-        self._convert_pdf_to_word(pdf_filename, docx_filename)
-        if generated_pdf and not keep_pdf:
-            self._delete_file(pdf_filename)
-        return str(docx_filename)
+        # --- Score Cards ---
+        scores = [
+            self.audit.performance_score, self.audit.seo_score,
+            self.audit.accessibility_score, self.audit.best_practices_score
+        ]
+        writer.table(
+            [
+                ['Performance', 'SEO', 'Accessibility', 'Best Practices'],
+                [
+                    DocxCell(str(score or 'N/A'), color=self._get_score_color(score).hexval()[2:], bold=True)
+                    for score in scores
+                ],
+            ],
+            zebra=False,
+            center=True,
+        )
+
+        # --- Análisis IA ---
+        writer.heading("Análisis de Inteligencia Artificial", 1)
+        analysis_text = self.ai_data.get('content', '') or self.ai_data.get('analysis', '')
+        if analysis_text:
+            writer.blocks(parse_markdown_blocks(analysis_text))
+        else:
+            writer.italic_note("No disponible.")
+
+        writer.page_break()
+
+        # --- Comparativa Global (Benchmarking) ---
+        global_comparison = self.seo_data.get('global_comparison', {})
+        if global_comparison:
+            writer.heading("Comparativa Global", 1)
+            for table in self._extract_tables_from_text(global_comparison.get('ai_analysis', '')):
+                writer.table(dataframe_rows(table), zebra=False)
+
+        return writer.save(filename)
 
     def generate_documents(self) -> Dict[str, str]:
         pdf_path = self.generate_pdf()
@@ -686,15 +571,14 @@ class ReportGenerator:
         else:
             data = comparison_data
 
-        ts = datetime.now().strftime("%Y%m%d_%H%M")
+        ts = _file_stamp()
         pdf_path = self.base_dir / f"Benchmark_Report_{ts}.pdf"
         xlsx_path = self.base_dir / f"Benchmark_Data_{ts}.xlsx"
         word_path = self.base_dir / f"Benchmark_Report_{ts}.docx"
 
         self._create_comparison_pdf(data, pdf_path)
         self._create_comparison_excel(data, xlsx_path)
-
-        self._convert_pdf_to_word(pdf_path, word_path)
+        self._create_comparison_docx(data, word_path)
 
         return {"pdf_path": str(pdf_path), "xlsx_path": str(xlsx_path), "word_path": str(word_path)}
 
@@ -706,12 +590,12 @@ class ReportGenerator:
         else:
             data = comparison_data
 
-        ts = datetime.now().strftime("%Y%m%d_%H%M")
+        ts = _file_stamp()
         pdf_path = self.base_dir / f"Benchmark_Report_{ts}.pdf"
         word_path = self.base_dir / f"Benchmark_Report_{ts}.docx"
 
         self._create_comparison_pdf(data, pdf_path)
-        self._convert_pdf_to_word(pdf_path, word_path)
+        self._create_comparison_docx(data, word_path)
 
         return {"pdf_path": str(pdf_path), "word_path": str(word_path)}
 
@@ -727,29 +611,23 @@ class ReportGenerator:
         self._create_comparison_pdf(data, pdf_path)
         return str(pdf_path)
 
-    def generate_comparison_word(
-        self,
-        comparison_data: Union[Dict, Any],
-        pdf_path: Optional[Path] = None,
-        keep_pdf: bool = True,
-    ) -> str:
-        source_pdf = pdf_path or self.base_dir / f"Benchmark_Report_{self.timestamp}.pdf"
-        generated_pdf = False
-        if not source_pdf.exists():
-            self.generate_comparison_pdf(comparison_data, source_pdf)
-            generated_pdf = True
-
-        word_path = source_pdf.with_suffix(".docx")
-        self._convert_pdf_to_word(source_pdf, word_path)
-        if generated_pdf and not keep_pdf:
-            self._delete_file(source_pdf)
+    def generate_comparison_word(self, comparison_data: Union[Dict, Any], filename: Optional[Path] = None) -> str:
+        if hasattr(comparison_data, 'model_dump'):
+            data = comparison_data.model_dump()
+        elif hasattr(comparison_data, 'dict'):
+            data = comparison_data.dict()
+        else:
+            data = comparison_data
+
+        word_path = filename or self.base_dir / f"Benchmark_Report_{self.timestamp}.docx"
+        self._create_comparison_docx(data, word_path)
         return str(word_path)
 
     def generate_detailed_proposal_reports(self, detailed_proposal_text: str) -> Dict[str, str]:
         """
         Genera los reportes (PDF y Word) para la propuesta detallada de esquemas.
         """
-        ts = datetime.now().strftime("%Y%m%d_%H%M")
+        ts = _file_stamp()
         pdf_path = self.base_dir / f"Esquema_Propuesta_Detalle_{ts}.pdf"
         word_path = self.base_dir / f"Esquema_Propuesta_Detalle_{ts}.docx"
 
@@ -780,8 +658,8 @@ class ReportGenerator:
 
         doc.build(story)
 
-        # 2. Generar Word (Convirtiendo PDF)
-        self._convert_pdf_to_word(pdf_path, word_path)
+        # 2. Generar Word (mismos bloques, sin pasar por el PDF)
+        self._create_detailed_proposal_docx(detailed_proposal_text, word_path)
 
         return {
             "pdf_path": str(pdf_path),
@@ -821,29 +699,81 @@ class ReportGenerator:
     def generate_detailed_proposal_word(
         self,
         detailed_proposal_text: str,
-        pdf_path: Optional[Path] = None,
-        keep_pdf: bool = True,
+        filename: Optional[Path] = None,
     ) -> str:
-        source_pdf = pdf_path or self.base_dir / f"Esquema_Propuesta_Detalle_{self.timestamp}.pdf"
-        generated_pdf = False
-        if not source_pdf.exists():
-            self.generate_detailed_proposal_pdf(detailed_proposal_text, source_pdf)
-            generated_pdf = True
-
-        word_path = source_pdf.with_suffix(".docx")
-        self._convert_pdf_to_word(source_pdf, word_path)
-        if generated_pdf and not keep_pdf:
-            self._delete_file(source_pdf)
+        word_path = filename or self.base_dir / f"Esquema_Propuesta_Detalle_{self.timestamp}.docx"
+        self._create_detailed_proposal_docx(detailed_proposal_text, word_path)
         return str(word_path)
 
-    def _convert_pdf_to_word(self, pdf_path: Path, word_path: Path):
-        """Convierte un archivo PDF a Word (DOCX) usando pdf2docx."""
-        try:
-            cv = Converter(str(pdf_path))
-            cv.convert(str(word_path), start=0, end=None)
-            cv.close()
-        except Exception as e:
-            raise RuntimeError(f"Error convirtiendo PDF a Word: {e}") from e
+    def _create_detailed_proposal_docx(self, detailed_proposal_text: str, filename: Path) -> str:
+        writer = DocxReportWriter()
+        writer.title("Informe Detallado de Propuesta de Esquema")
+        writer.label("URL Objetivo", self.url)
+        writer.label("Fecha", datetime.now().strftime('%d/%m/%Y'))
+
+        if detailed_proposal_text:
+            writer.blocks(parse_markdown_blocks(detailed_proposal_text))
+        else:
+            writer.italic_note("No se generó contenido detallado.")
+
+        return writer.save(filename)
+
+    def _create_comparison_docx(self, data: dict, filename: Path) -> str:
+        """Versión Word de ``_create_comparison_pdf``."""
+        writer = DocxReportWriter()
+        writer.title("Reporte de Benchmarking SEO")
+        writer.label("Base", data.get('base_url', 'Unknown URL'))
+        writer.label("Fecha", datetime.now().strftime('%d/%m/%Y'))
+
+        overall = data.get('overall_summary', {})
+        if overall:
+            writer.heading("Resumen", 1)
+            writer.table(
+                [
+                    [DocxCell("Total Competidores", bold=True), str(overall.get('total_competitors', 0))],
+                    [DocxCell("Ranking Performance", bold=True), str(overall.get('performance_rank', '-'))],
+                    [DocxCell("Ranking SEO", bold=True), str(overall.get('seo_rank', '-'))],
+                ],
+                header=False,
+                zebra=False,
+                col_widths=[2.5, 2.0],
+            )
+
+        ai_schema_md = data.get('ai_schema_comparison', '')
+        if ai_schema_md:
+            writer.blocks(parse_markdown_blocks(ai_schema_md))
+            writer.page_break()
+
+        metrics_map = {
+            'performance_score': 'Performance',
+            'seo_score': 'SEO',
+            'accessibility_score': 'Accesibilidad',
+            'best_practices_score': 'Best Practices'
+        }
+        for comp in data.get('comparisons', []):
+            writer.heading(f"VS: {comp.get('compare_url', 'N/A')}", 1)
+
+            scores = comp.get('performance', {}).get('scores', {})
+            rows = [['Métrica', 'Base', 'Competidor', 'Dif.']]
+            for key, label in metrics_map.items():
+                s_data = scores.get(key, {})
+                diff = s_data.get('difference', 0)
+                rows.append([
+                    label,
+                    f"{s_data.get('base', 0):.1f}",
+                    f"{s_data.get('compare', 0):.1f}",
+                    DocxCell(f"{'+' if diff >= 0 else ''}{diff:.1f}", color="008000" if diff >= 0 else "FF0000", bold=True),
+                ])
+            writer.table(rows, zebra=False, col_widths=[2.5, 1.5, 1.5, 1.5])
+
+            ai_analysis = comp.get('ai_analysis', '')
+            if ai_analysis:
+                writer.heading("Análisis Detallado", 2)
+                writer.blocks(parse_markdown_blocks(ai_analysis))
+
+            writer.page_break()
+
+        return writer.save(filename)
 
     @staticmethod
     def _delete_file(file_path: Path):
@@ -1101,3 +1031,54 @@ class ReportGenerator:
             **documents,
             "xlsx_path": self.generate_excel(),
         }
+
+
+# Versión de la plantilla de reportes: subirla cuando cambie el layout para
+# invalidar los artefactos del almacén (``report_artifacts``)
+REPORT_TEMPLATE_VERSION = "3"
+
+# Campos de la auditoría que leen los reportes (forman parte de la clave del artefacto)
+REPORT_SOURCE_FIELDS = (
+    "id",
+    "created_at",
+    "lighthouse_data",
+    "seo_analysis",
+    "ai_suggestions",
+    "performance_score",
+    "seo_score",
+    "accessibility_score",
+    "best_practices_score",
+)
+
+# Formatos que ``render_report`` sabe construir: método de ReportGenerator,
+# si recibe payload y nombre de archivo de descarga
+_RENDERERS = {
+    "audit_pdf": ("generate_pdf", False, "Reporte_SEO.pdf"),
+    "audit_word": ("generate_docx", False, "Reporte_SEO.docx"),
+    "comparison_pdf": ("generate_comparison_pdf", True, "Benchmark_Report.pdf"),
+    "comparison_word": ("generate_comparison_word", True, "Benchmark_Report.docx"),
+    "proposal_pdf": ("generate_detailed_proposal_pdf", True, "Esquema_Propuesta_Detalle.pdf"),
+    "proposal_word": ("generate_detailed_proposal_word", True, "Esquema_Propuesta_Detalle.docx"),
+}
+
+
+def render_report(
+    kind: str,
+    audit_data: Dict[str, Any],
+    payload: Any = None,
+    output_dir: Optional[Union[str, Path]] = None,
+) -> str:
+    """
+    Punto de entrada picklable para el pool de procesos de reportes.
+    Recibe la auditoría base serializada (``audit.model_dump()``) porque las
+    instancias ligadas a una sesión no cruzan procesos.
+    """
+    method_name, takes_payload, file_name = _RENDERERS[kind]
+    generator = ReportGenerator(audit=AuditReport(**audit_data))
+    filename = None
+    if output_dir:
+        # Nombre de descarga legible: "Reporte_SEO_<dominio>.pdf"
+        stem, suffix = file_name.rsplit(".", 1)
+        filename = Path(output_dir) / f"{stem}_{generator.base_dir.name}.{suffix}"
+    method = getattr(generator, method_name)
+    return method(payload, filename=filename) if takes_payload else method(filename=filename)
@@ -1,13 +1,34 @@
+"""
+Ciclo de vida de los reportes descargables (PDF/Word).
+
+Los reportes se construyen bajo demanda: el contexto (auditoría base, texto
+de IA...) se prepara en el event loop y el render corre en el pool de
+procesos de reportes (``run_report``), así una descarga pesada no bloquea
+el API. Las peticiones simultáneas del mismo reporte (entidad + formato)
+esperan a una única construcción en curso.
+
+Los PDF/Word viven en el almacén direccionado por contenido
+(``report_artifacts``): regenerar un reporte con los mismos datos de origen
+reutiliza el archivo existente. Como la ruta guardada lleva la clave (nombre
+de su directorio), cada solicitud recalcula la clave con los datos actuales
+(p. ej. la última auditoría base tras una re-auditoría) y reconstruye si ya no
+coincide. El barrido por antigüedad (``REPORT_TTL``)
+solo aplica a los archivos fuera del almacén (Excel y reportes antiguos).
+"""
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 
+from prometheus_client import Counter
 from sqlalchemy import String, cast as sql_cast, desc
 from sqlmodel import select
 
 from app.core.config import settings
+from app.core.database import db_manager
+from app.core.executors import run_report
 from app.models import (
     AuditComparison,
     AuditReport,
@@ -21,272 +42,259 @@ from app.models import (
     UrlValidationStatus,
 )
 from app.services.audit_comparator import get_audit_comparator
-from app.services.report_generator import ReportGenerator
+from app.services.report_artifacts import artifact_key, build_artifact, get_report_artifact_store
 from app.services.url_validation_service import get_url_validation_service
 
 log = logging.getLogger(__name__)
 
+REPORT_BUILDS = Counter(
+    "report_builds_total",
+    "Solicitudes de reportes PDF/Word según se construyeron, revalidaron o esperaron a una construcción en curso",
+    ["outcome"],
+)
+
+# (tipo de render, auditoría base, payload) que recibe ``render_report``
+ReportSpec = Tuple[str, AuditReport, Any]
+
+
+class _BuildCancelled(Exception):
+    """La construcción compartida se canceló: quien esperaba toma el relevo."""
+
 
 class ReportLifecycleService:
     REPORT_TTL = timedelta(hours=24)
     CLEANUP_INTERVAL_SECONDS = 24 * 60 * 60
     REPORT_EXTENSIONS = {".pdf", ".docx", ".xlsx"}
+    # Un error de construcción en segundo plano se informa solo durante este tiempo
+    FAILED_BUILD_TTL_SECONDS = 5 * 60
 
     def __init__(self) -> None:
         self.reports_root = Path(settings.STORAGE_PATH) / "reports"
+        self.artifact_store = get_report_artifact_store()
+        # Construcciones en curso por (tabla, id, atributo de ruta)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Construcciones lanzadas en segundo plano y su último error (mensaje, instante)
+        self._background: Dict[str, asyncio.Task] = {}
+        self._failed_builds: Dict[str, Tuple[str, float]] = {}
+
+    async def ensure_audit_pdf(
+        self,
+        session,
+        audit: AuditReport,
+        build: bool = True,
+    ) -> Optional[str]:
+        async def prepare():
+            self._assert_audit_ready(audit, "PDF")
+            return "audit_pdf", audit, None
 
-    async def ensure_audit_pdf(self, session, audit: AuditReport) -> str:
-        current_path = self._consume_existing_path(audit, "report_pdf_path")
-        if current_path:
-            return current_path
-
-        self._assert_completed(audit.status, "La auditoría aún no ha finalizado")
-        self._assert_has_source_data(
-            bool(audit.lighthouse_data or audit.seo_analysis or audit.ai_suggestions),
-            "La auditoría no tiene datos suficientes para generar el PDF",
-        )
-
-        pdf_path = ReportGenerator(audit=audit).generate_pdf()
-        self._replace_paths(
-            audit,
-            report_pdf_path=pdf_path,
-        )
-        await self._persist_async(session, audit)
-        return audit.report_pdf_path
-
-    async def ensure_audit_word(self, session, audit: AuditReport) -> str:
-        current_path = self._consume_existing_path(audit, "report_word_path")
-        if current_path:
-            return current_path
-
-        self._assert_completed(audit.status, "La auditoría aún no ha finalizado")
-        self._assert_has_source_data(
-            bool(audit.lighthouse_data or audit.seo_analysis or audit.ai_suggestions),
-            "La auditoría no tiene datos suficientes para generar el Word",
-        )
-
-        source_pdf_path = self._consume_existing_path(audit, "report_pdf_path")
-        word_path = ReportGenerator(audit=audit).generate_docx(
-            pdf_path=Path(source_pdf_path) if source_pdf_path else None,
-            keep_pdf=bool(source_pdf_path),
-        )
-        self._replace_paths(
-            audit,
-            report_word_path=word_path,
-        )
-        await self._persist_async(session, audit)
-        return audit.report_word_path
-
-    async def ensure_comparison_pdf(self, session, comparison: AuditComparison) -> str:
-        current_path = self._consume_existing_path(comparison, "report_pdf_path")
-        if current_path:
-            return current_path
-
-        self._assert_completed(comparison.status, "La comparación aún no ha finalizado")
-        self._assert_has_source_data(
-            bool(comparison.comparison_result),
-            "La comparación no tiene datos suficientes para generar el PDF",
-        )
+        return await self._ensure_report(session, audit, "report_pdf_path", prepare, build=build)
 
-        base_audit = await self._get_report_audit_for_comparison_async(session, comparison)
-        self._assert_has_source_data(
-            base_audit is not None,
-            "No se encontró una auditoría base para generar el PDF de comparación",
-        )
+    async def ensure_audit_word(
+        self,
+        session,
+        audit: AuditReport,
+        build: bool = True,
+    ) -> Optional[str]:
+        async def prepare():
+            self._assert_audit_ready(audit, "Word")
+            return "audit_word", audit, None
 
-        pdf_path = ReportGenerator(audit=base_audit).generate_comparison_pdf(comparison.comparison_result)
-        self._replace_paths(
-            comparison,
-            report_pdf_path=pdf_path,
-        )
-        await self._persist_async(session, comparison)
-        return comparison.report_pdf_path
+        return await self._ensure_report(session, audit, "report_word_path", prepare, build=build)
 
-    async def ensure_comparison_word(self, session, comparison: AuditComparison) -> str:
-        current_path = self._consume_existing_path(comparison, "report_word_path")
-        if current_path:
-            return current_path
+    async def ensure_comparison_pdf(
+        self,
+        session,
+        comparison: AuditComparison,
+        build: bool = True,
+    ) -> Optional[str]:
+        async def prepare():
+            base_audit = await self._build_comparison_report_context_async(session, comparison, "PDF")
+            return "comparison_pdf", base_audit, comparison.comparison_result
 
-        self._assert_completed(comparison.status, "La comparación aún no ha finalizado")
-        self._assert_has_source_data(
-            bool(comparison.comparison_result),
-            "La comparación no tiene datos suficientes para generar el Word",
-        )
+        return await self._ensure_report(session, comparison, "report_pdf_path", prepare, build=build)
 
-        base_audit = await self._get_report_audit_for_comparison_async(session, comparison)
-        self._assert_has_source_data(
-            base_audit is not None,
-            "No se encontró una auditoría base para generar el Word de comparación",
-        )
+    async def ensure_comparison_word(
+        self,
+        session,
+        comparison: AuditComparison,
+        build: bool = True,
+    ) -> Optional[str]:
+        async def prepare():
+            base_audit = await self._build_comparison_report_context_async(session, comparison, "Word")
+            return "comparison_word", base_audit, comparison.comparison_result
 
-        source_pdf_path = self._consume_existing_path(comparison, "report_pdf_path")
-        word_path = ReportGenerator(audit=base_audit).generate_comparison_word(
-            comparison.comparison_result,
-            pdf_path=Path(source_pdf_path) if source_pdf_path else None,
-            keep_pdf=bool(source_pdf_path),
-        )
-        self._replace_paths(
-            comparison,
-            report_word_path=word_path,
-        )
-        await self._persist_async(session, comparison)
-        return comparison.report_word_path
+        return await self._ensure_report(session, comparison, "report_word_path", prepare, build=build)
 
-    async def ensure_schema_pdf(self, session, schema_audit: AuditSchemaReview) -> str:
-        current_path = self._consume_existing_path(schema_audit, "report_pdf_path")
-        if current_path:
-            return current_path
+    async def ensure_schema_pdf(
+        self,
+        session,
+        schema_audit: AuditSchemaReview,
+        build: bool = True,
+    ) -> Optional[str]:
+        async def prepare():
+            report_audit, report_body = await self._build_schema_report_context_async(session, schema_audit)
+            return "proposal_pdf", report_audit, report_body
 
-        report_audit, report_body = await self._build_schema_report_context_async(session, schema_audit)
-        pdf_path = ReportGenerator(audit=report_audit).generate_detailed_proposal_pdf(report_body)
-        self._replace_paths(
-            schema_audit,
-            report_pdf_path=pdf_path,
-        )
-        await self._persist_async(session, schema_audit)
-        return schema_audit.report_pdf_path
+        return await self._ensure_report(session, schema_audit, "report_pdf_path", prepare, build=build)
 
-    async def ensure_schema_word(self, session, schema_audit: AuditSchemaReview) -> str:
-        current_path = self._consume_existing_path(schema_audit, "report_word_path")
-        if current_path:
-            return current_path
+    async def ensure_schema_word(
+        self,
+        session,
+        schema_audit: AuditSchemaReview,
+        build: bool = True,
+    ) -> Optional[str]:
+        async def prepare():
+            report_audit, report_body = await self._build_schema_report_context_async(session, schema_audit)
+            return "proposal_word", report_audit, report_body
 
-        report_audit, report_body = await self._build_schema_report_context_async(session, schema_audit)
-        source_pdf_path = self._consume_existing_path(schema_audit, "report_pdf_path")
-        word_path = ReportGenerator(audit=report_audit).generate_detailed_proposal_word(
-            report_body,
-            pdf_path=Path(source_pdf_path) if source_pdf_path else None,
-            keep_pdf=bool(source_pdf_path),
-        )
-        self._replace_paths(
-            schema_audit,
-            report_word_path=word_path,
-        )
-        await self._persist_async(session, schema_audit)
-        return schema_audit.report_word_path
+        return await self._ensure_report(session, schema_audit, "report_word_path", prepare, build=build)
 
     async def ensure_comparison_proposal_pdf(
         self,
         session,
         comparison: AuditComparison,
         token: str,
-    ) -> str:
-        current_path = self._consume_existing_path(comparison, "proposal_report_pdf_path")
-        if current_path:
-            return current_path
+        build: bool = True,
+    ) -> Optional[str]:
+        async def prepare():
+            report_audit, detailed_content = await self._build_comparison_proposal_context_async(
+                session,
+                comparison,
+                token,
+            )
+            return "proposal_pdf", report_audit, detailed_content
 
-        report_audit, detailed_content = await self._build_comparison_proposal_context_async(
-            session,
-            comparison,
-            token,
-        )
-        pdf_path = ReportGenerator(audit=report_audit).generate_detailed_proposal_pdf(detailed_content)
-        self._replace_paths(
-            comparison,
-            proposal_report_pdf_path=pdf_path,
+        return await self._ensure_report(
+            session, comparison, "proposal_report_pdf_path", prepare, revalidate=False, build=build
         )
-        await self._persist_async(session, comparison)
-        return comparison.proposal_report_pdf_path
 
     async def ensure_comparison_proposal_word(
         self,
         session,
         comparison: AuditComparison,
         token: str,
-    ) -> str:
-        current_path = self._consume_existing_path(comparison, "proposal_report_word_path")
-        if current_path:
-            return current_path
+        build: bool = True,
+    ) -> Optional[str]:
+        async def prepare():
+            report_audit, detailed_content = await self._build_comparison_proposal_context_async(
+                session,
+                comparison,
+                token,
+            )
+            return "proposal_word", report_audit, detailed_content
 
-        report_audit, detailed_content = await self._build_comparison_proposal_context_async(
-            session,
-            comparison,
-            token,
+        return await self._ensure_report(
+            session, comparison, "proposal_report_word_path", prepare, revalidate=False, build=build
         )
-        source_pdf_path = self._consume_existing_path(comparison, "proposal_report_pdf_path")
-        word_path = ReportGenerator(audit=report_audit).generate_detailed_proposal_word(
-            detailed_content,
-            pdf_path=Path(source_pdf_path) if source_pdf_path else None,
-            keep_pdf=bool(source_pdf_path),
-        )
-        self._replace_paths(
-            comparison,
-            proposal_report_word_path=word_path,
-        )
-        await self._persist_async(session, comparison)
-        return comparison.proposal_report_word_path
 
-    async def ensure_url_validation_pdf(self, session, validation: AuditUrlValidation) -> str:
-        current_path = self._consume_existing_path(validation, "report_pdf_path")
-        if current_path:
-            return current_path
+    async def ensure_url_validation_pdf(
+        self,
+        session,
+        validation: AuditUrlValidation,
+        build: bool = True,
+    ) -> Optional[str]:
+        async def prepare():
+            report_audit, markdown = await self._build_url_validation_report_context_async(session, validation)
+            return "proposal_pdf", report_audit, markdown
 
-        report_audit, markdown = await self._build_url_validation_report_context_async(session, validation)
-        pdf_path = ReportGenerator(audit=report_audit).generate_detailed_proposal_pdf(markdown)
-        self._replace_paths(
-            validation,
-            report_pdf_path=pdf_path,
-        )
-        await self._persist_async(session, validation)
-        return validation.report_pdf_path
+        return await self._ensure_report(session, validation, "report_pdf_path", prepare, build=build)
 
-    async def ensure_url_validation_word(self, session, validation: AuditUrlValidation) -> str:
-        current_path = self._consume_existing_path(validation, "report_word_path")
-        if current_path:
-            return current_path
+    async def ensure_url_validation_word(
+        self,
+        session,
+        validation: AuditUrlValidation,
+        build: bool = True,
+    ) -> Optional[str]:
+        async def prepare():
+            report_audit, markdown = await self._build_url_validation_report_context_async(session, validation)
+            return "proposal_word", report_audit, markdown
 
-        report_audit, markdown = await self._build_url_validation_report_context_async(session, validation)
-        source_pdf_path = self._consume_existing_path(validation, "report_pdf_path")
-        word_path = ReportGenerator(audit=report_audit).generate_detailed_proposal_word(
-            markdown,
-            pdf_path=Path(source_pdf_path) if source_pdf_path else None,
-            keep_pdf=bool(source_pdf_path),
-        )
-        self._replace_paths(
-            validation,
-            report_word_path=word_path,
-        )
-        await self._persist_async(session, validation)
-        return validation.report_word_path
+        return await self._ensure_report(session, validation, "report_word_path", prepare, build=build)
 
-    async def ensure_url_validation_global_pdf(self, session, validation: AuditUrlValidation) -> str:
-        current_path = self._consume_existing_path(validation, "global_report_pdf_path")
-        if current_path:
-            return current_path
+    async def ensure_url_validation_global_pdf(
+        self,
+        session,
+        validation: AuditUrlValidation,
+        build: bool = True,
+    ) -> Optional[str]:
+        async def prepare():
+            report_audit, markdown = await self._build_url_validation_global_report_context_async(
+                session,
+                validation,
+            )
+            return "proposal_pdf", report_audit, markdown
 
-        report_audit, markdown = await self._build_url_validation_global_report_context_async(
-            session,
-            validation,
-        )
-        pdf_path = ReportGenerator(audit=report_audit).generate_detailed_proposal_pdf(markdown)
-        self._replace_paths(
-            validation,
-            global_report_pdf_path=pdf_path,
-        )
-        await self._persist_async(session, validation)
-        return validation.global_report_pdf_path
+        return await self._ensure_report(session, validation, "global_report_pdf_path", prepare, build=build)
 
-    async def ensure_url_validation_global_word(self, session, validation: AuditUrlValidation) -> str:
-        current_path = self._consume_existing_path(validation, "global_report_word_path")
+    async def ensure_url_validation_global_word(
+        self,
+        session,
+        validation: AuditUrlValidation,
+        build: bool = True,
+    ) -> Optional[str]:
+        async def prepare():
+            report_audit, markdown = await self._build_url_validation_global_report_context_async(
+                session,
+                validation,
+            )
+            return "proposal_word", report_audit, markdown
+
+        return await self._ensure_report(session, validation, "global_report_word_path", prepare, build=build)
+
+    async def ensure_in_background(
+        self,
+        session,
+        entity: Any,
+        attr_name: str,
+        ensure: Callable[..., Awaitable[Optional[str]]],
+    ) -> Optional[str]:
+        """
+        Modo "202 + consulta": devuelve la ruta si el reporte ya existe; si no,
+        lanza su construcción en segundo plano (con sesión propia) y devuelve
+        None. El cliente vuelve a consultar la misma URL hasta obtener el
+        archivo. Si la última construcción falló (hace menos de
+        ``FAILED_BUILD_TTL_SECONDS``), lanza su ValueError una vez.
+        """
+        current_path = self._consume_existing_path(entity, attr_name)
+        if current_path and self.artifact_store.contains(Path(current_path)):
+            # Solo se comprueba la clave del artefacto; si cambió, se reconstruye en segundo plano
+            current_path = await ensure(session, entity, build=False)
         if current_path:
             return current_path
 
-        report_audit, markdown = await self._build_url_validation_global_report_context_async(
-            session,
-            validation,
-        )
-        source_pdf_path = self._consume_existing_path(validation, "global_report_pdf_path")
-        word_path = ReportGenerator(audit=report_audit).generate_detailed_proposal_word(
-            markdown,
-            pdf_path=Path(source_pdf_path) if source_pdf_path else None,
-            keep_pdf=bool(source_pdf_path),
-        )
-        self._replace_paths(
-            validation,
-            global_report_word_path=word_path,
-        )
-        await self._persist_async(session, validation)
-        return validation.global_report_word_path
+        self._forget_stale_failures()
+        key = self._build_key(entity, attr_name)
+        failure = self._failed_builds.pop(key, None)
+        if failure is not None:
+            raise ValueError(failure[0])
+        if key in self._inflight or key in self._background:
+            return None
+
+        model, entity_id = type(entity), entity.id
+
+        async def build() -> None:
+            try:
+                async with db_manager.async_session_context() as bg_session:
+                    fresh = await bg_session.get(model, entity_id)
+                    if fresh is None:
+                        raise ValueError("El recurso del reporte ya no existe")
+                    await ensure(bg_session, fresh)
+            except ValueError as exc:
+                self._failed_builds[key] = (str(exc), time.monotonic())
+            except Exception as exc:
+                log.exception("Error generando el reporte %s en segundo plano", key)
+                self._failed_builds[key] = (f"No fue posible generar el reporte: {exc}", time.monotonic())
+            finally:
+                self._background.pop(key, None)
+
+        self._background[key] = asyncio.create_task(build())
+        return None
+
+    def _forget_stale_failures(self) -> None:
+        """Descarta los errores que ningún cliente volvió a consultar a tiempo."""
+        cutoff = time.monotonic() - self.FAILED_BUILD_TTL_SECONDS
+        for key in [key for key, (_message, failed_at) in self._failed_builds.items() if failed_at < cutoff]:
+            del self._failed_builds[key]
 
     async def run_cleanup_loop(self) -> None:
         while True:
@@ -299,8 +307,99 @@ class ReportLifecycleService:
     def cleanup_expired_reports(self) -> dict[str, int]:
         return {
             "deleted_files": self._delete_expired_storage_files(),
+            "evicted_artifacts": self.artifact_store.evict(),
         }
 
+    async def _ensure_report(
+        self,
+        session,
+        entity: Any,
+        attr_name: str,
+        prepare: Callable[[], Awaitable[ReportSpec]],
+        revalidate: bool = True,
+        build: bool = True,
+    ) -> Optional[str]:
+        """
+        Ruta del reporte, construyéndolo si falta. Un artefacto del almacén se
+        revalida contra la clave de los datos actuales (``revalidate``); las
+        propuestas con IA no se revalidan porque preparar su contenido
+        implica una nueva llamada a la IA. Con ``build=False`` solo se
+        comprueba la clave: devuelve la ruta vigente o None si hay que
+        construir el reporte.
+        """
+        current_path = self._consume_existing_path(entity, attr_name)
+        if current_path and not (revalidate and self.artifact_store.contains(Path(current_path))):
+            return current_path
+
+        key = self._build_key(entity, attr_name)
+        if not build:
+            if not current_path or key in self._inflight:
+                return None
+            kind, report_audit, payload = await prepare()
+            file_path = self.artifact_store.lookup(artifact_key(kind, report_audit.model_dump(), payload))
+            if file_path is None:
+                return None
+            if file_path != current_path:
+                self._replace_paths(entity, **{attr_name: file_path})
+                await self._persist_async(session, entity)
+            REPORT_BUILDS.labels(outcome="revalidated").inc()
+            return file_path
+        while (inflight := self._inflight.get(key)) is not None:
+            REPORT_BUILDS.labels(outcome="coalesced").inc()
+            try:
+                return await asyncio.shield(inflight)
+            except _BuildCancelled:
+                # Se canceló la petición que construía: la siguiente en espera la relanza
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            kind, report_audit, payload = await prepare()
+            audit_data = report_audit.model_dump()
+            file_path = self.artifact_store.lookup(artifact_key(kind, audit_data, payload))
+            if file_path is None:
+                file_path = await run_report(build_artifact, kind, audit_data, payload)
+            outcome = "revalidated" if file_path == current_path else "built"
+            if file_path != getattr(entity, attr_name, None):
+                self._replace_paths(entity, **{attr_name: file_path})
+                await self._persist_async(session, entity)
+        except asyncio.CancelledError:
+            future.set_exception(_BuildCancelled(key))
+            future.exception()
+            raise
+        except Exception as exc:
+            REPORT_BUILDS.labels(outcome="failed").inc()
+            future.set_exception(exc)
+            # Evita el aviso "exception was never retrieved" si nadie esperaba
+            future.exception()
+            raise
+        else:
+            REPORT_BUILDS.labels(outcome=outcome).inc()
+            future.set_result(file_path)
+            return file_path
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _build_comparison_report_context_async(
+        self,
+        session,
+        comparison: AuditComparison,
+        format_label: str,
+    ) -> AuditReport:
+        self._assert_completed(comparison.status, "La comparación aún no ha finalizado")
+        self._assert_has_source_data(
+            bool(comparison.comparison_result),
+            f"La comparación no tiene datos suficientes para generar el {format_label}",
+        )
+
+        base_audit = await self._get_report_audit_for_comparison_async(session, comparison)
+        self._assert_has_source_data(
+            base_audit is not None,
+            f"No se encontró una auditoría base para generar el {format_label} de comparación",
+        )
+        return base_audit
+
     async def _build_schema_report_context_async(
         self,
         session,
@@ -477,9 +576,14 @@ class ReportLifecycleService:
 
         file_path = Path(raw_path)
         if not file_path.exists():
+            # Expulsado del almacén (LRU) o borrado: se reconstruye o se reutiliza por clave
             setattr(entity, attr_name, None)
             return None
 
+        if self.artifact_store.contains(file_path):
+            self.artifact_store.touch(file_path)
+            return str(file_path)
+
         if self._is_expired(file_path):
             self._delete_file(file_path)
             setattr(entity, attr_name, None)
@@ -490,10 +594,23 @@ class ReportLifecycleService:
     def _replace_paths(self, entity: Any, **new_paths: Optional[str]) -> None:
         for attr_name, new_path in new_paths.items():
             current_path = getattr(entity, attr_name, None)
-            if current_path and current_path != new_path:
+            # Los artefactos del almacén pueden compartirse entre entidades: solo los expulsa el LRU
+            shared = bool(current_path) and self.artifact_store.contains(Path(current_path))
+            if current_path and current_path != new_path and not shared:
                 self._delete_file(Path(current_path))
             setattr(entity, attr_name, new_path)
 
+    @staticmethod
+    def _build_key(entity: Any, attr_name: str) -> str:
+        return f"{entity.__tablename__}:{entity.id}:{attr_name}"
+
+    def _assert_audit_ready(self, audit: AuditReport, format_label: str) -> None:
+        self._assert_completed(audit.status, "La auditoría aún no ha finalizado")
+        self._assert_has_source_data(
+            bool(audit.lighthouse_data or audit.seo_analysis or audit.ai_suggestions),
+            f"La auditoría no tiene datos suficientes para generar el {format_label}",
+        )
+
     @classmethod
     def _assert_completed(cls, status_value: Any, message: str) -> None:
         if status_value not in {
@@ -537,6 +654,9 @@ class ReportLifecycleService:
             if not file_path.is_file() or file_path.suffix.lower() not in self.REPORT_EXTENSIONS:
                 continue
 
+            if self.artifact_store.root in file_path.parents:
+                continue
+
             if not self._is_expired(file_path):
                 continue
 
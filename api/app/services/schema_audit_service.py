@@ -240,18 +240,13 @@ class SchemaAuditService:
             stream=False
         )
 
-        input_tokens = self.ai_client.count_tokens(prompt_content)
-        response = await self.ai_client.chat_completion(request, token)
+        response = await self.ai_client.chat_completion(request, token, cache_template="schema_audit_comparison")
         content = response.get_content()
-        output_tokens = self.ai_client.count_tokens(content)
+        usage = await self.ai_client.resolve_usage(response, prompt_content, content)
 
         return {
             "content": content,
-            "usage": {
-                "prompt_tokens": input_tokens,
-                "completion_tokens": output_tokens,
-                "total_tokens": input_tokens + output_tokens
-            }
+            "usage": usage
         }
 
     async def generate_cqrs_solid_model_ai(
@@ -275,18 +270,13 @@ class SchemaAuditService:
             stream=False
         )
 
-        input_tokens = self.ai_client.count_tokens(prompt_content)
-        response = await self.ai_client.chat_completion(request, token)
+        response = await self.ai_client.chat_completion(request, token, cache_template="schema_cqrs_solid_model")
         content = response.get_content()
-        output_tokens = self.ai_client.count_tokens(content)
+        usage = await self.ai_client.resolve_usage(response, prompt_content, content)
 
         return {
             "content": content,
-            "usage": {
-                "prompt_tokens": input_tokens,
-                "completion_tokens": output_tokens,
-                "total_tokens": input_tokens + output_tokens
-            }
+            "usage": usage
         }
 
     def _safe_json_parse(self, raw: str) -> Optional[Any]:
@@ -573,3 +563,25 @@ def get_schema_audit_service() -> SchemaAuditService:
     if _schema_audit_service is None:
         _schema_audit_service = SchemaAuditService()
     return _schema_audit_service
+
+
+# ---------------------------------------------------------------------------
+# Funciones de nivel módulo (picklables) para ejecutarse con run_cpu
+# ---------------------------------------------------------------------------
+
+def validate_schema_payload(payload: Any, label: str) -> Dict[str, Any]:
+    """Equivalente a ``SchemaAuditService.validate_schema_payload``."""
+    return get_schema_audit_service().validate_schema_payload(payload, label)
+
+
+def build_structural_comparison(
+    original_schema: Any,
+    proposed_schema: Any,
+    incoming_schema: Any
+) -> Dict[str, Any]:
+    """Equivalente a ``SchemaAuditService.build_structural_comparison``."""
+    return get_schema_audit_service().build_structural_comparison(
+        original_schema=original_schema,
+        proposed_schema=proposed_schema,
+        incoming_schema=incoming_schema
+    )
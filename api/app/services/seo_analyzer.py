@@ -284,3 +284,11 @@ class SEOAnalyzer:
             "content_seo": self.analyze_content_quality(),
             "schema_markup": self.analyze_structured_data()  # <--- NUEVO
         }
+
+
+def run_full_seo_analysis(url: str, html_content: str) -> Dict[str, Any]:
+    """
+    Ejecuta ``SEOAnalyzer.run_full_analysis``. Función de nivel módulo
+    (picklable) para poder correrla en el pool de procesos con ``run_cpu``.
+    """
+    return SEOAnalyzer(url=url, html_content=html_content).run_full_analysis()
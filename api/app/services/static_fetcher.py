@@ -0,0 +1,146 @@
+"""
+Primer nivel (sin navegador) para obtener HTML de una URL.
+
+Muchas páginas sirven su JSON-LD en el HTML inicial; para extraer schemas no
+hace falta un render de Playwright con ``networkidle``. ``fetch_static`` hace
+un GET plano sobre un cliente httpx compartido (HTTP/2 si ``h2`` está
+instalado, conexiones reutilizadas entre URLs del mismo host) y
+``browser_fallback_reason`` decide si el resultado sirve o si hay que
+renderizar: respuestas de error, bloqueos anti-bot o páginas que parecen
+renderizadas en cliente (SPA con el contenedor raíz vacío).
+"""
+import logging
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+from prometheus_client import Counter
+
+from app.core.config import get_settings
+from app.services.browser_pool import DEFAULT_USER_AGENT
+
+try:
+    import h2  # habilita HTTP/2 en httpx
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+STATIC_FETCH_RESULTS = Counter(
+    "static_fetch_results_total",
+    "Resultados del fetch HTTP sin navegador: static (aceptado) o motivo del fallback",
+    ["outcome"],
+)
+
+_HEADERS = {
+    "User-Agent": DEFAULT_USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "es-MX,es;q=0.9,en;q=0.8",
+}
+
+_BLOCK_MARKERS = (
+    "captcha-delivery",
+    "DataDome",
+    "cf-browser-verification",
+    "challenge-platform",
+    "Just a moment...",
+    "Attention Required!",
+)
+
+# Contenedores raíz vacíos típicos de SPAs (React, Next, Vue, Angular)
+_EMPTY_APP_ROOT = re.compile(
+    r'<(div|app-root)[^>]*\bid=["\'](root|app|__next|__nuxt)["\'][^>]*>\s*</\1>'
+    r'|<app-root[^>]*>\s*</app-root>',
+    re.IGNORECASE,
+)
+_SCRIPT_OR_STYLE = re.compile(r"<(script|style|noscript|template)\b.*?</\1>", re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r"<[^>]+>")
+
+# Menos texto visible que esto en el HTML inicial sugiere render en cliente
+_MIN_VISIBLE_TEXT_CHARS = 200
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+@dataclass
+class StaticFetchResult:
+    url: str
+    final_url: str
+    status_code: int
+    content_type: str
+    html: str
+
+
+def get_static_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        settings = get_settings()
+        _client = httpx.AsyncClient(
+            http2=_HTTP2_AVAILABLE,
+            follow_redirects=True,
+            headers=_HEADERS,
+            timeout=httpx.Timeout(settings.STATIC_FETCH_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=settings.STATIC_FETCH_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.STATIC_FETCH_MAX_CONNECTIONS,
+            ),
+        )
+    return _client
+
+
+async def close_static_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_static(url: str) -> Optional[StaticFetchResult]:
+    """GET plano de ``url``. None si falla la red o la respuesta excede el tamaño máximo."""
+    max_bytes = get_settings().STATIC_FETCH_MAX_BYTES
+    try:
+        async with get_static_http_client().stream("GET", url) as response:
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > max_bytes:
+                    STATIC_FETCH_RESULTS.labels("too_large").inc()
+                    return None
+                chunks.append(chunk)
+            body = b"".join(chunks)
+            try:
+                html = body.decode(response.encoding or "utf-8", errors="replace")
+            except LookupError:
+                # charset desconocido en la cabecera
+                html = body.decode("utf-8", errors="replace")
+            return StaticFetchResult(
+                url=url,
+                final_url=str(response.url),
+                status_code=response.status_code,
+                content_type=response.headers.get("content-type", ""),
+                html=html,
+            )
+    except httpx.HTTPError as e:
+        logger.info(f"[static_fetch] {url}: {e.__class__.__name__} {e}")
+        STATIC_FETCH_RESULTS.labels("network_error").inc()
+        return None
+
+
+def browser_fallback_reason(result: StaticFetchResult) -> Optional[str]:
+    """Motivo para renderizar con navegador, o None si el HTML estático sirve."""
+    if result.status_code >= 400:
+        return "http_error"
+    if "html" not in result.content_type.lower():
+        return "not_html"
+    html = result.html
+    if any(marker in html for marker in _BLOCK_MARKERS):
+        return "blocked"
+    if _EMPTY_APP_ROOT.search(html):
+        return "client_rendered"
+    visible_text = _TAG.sub(" ", _SCRIPT_OR_STYLE.sub(" ", html))
+    if len(" ".join(visible_text.split())) < _MIN_VISIBLE_TEXT_CHARS:
+        return "client_rendered"
+    return None
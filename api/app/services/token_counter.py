@@ -0,0 +1,86 @@
+"""
+Conteo de tokens para prompts y respuestas de IA.
+
+- ``get_encoding``: registro de encoders tiktoken por proceso. Cargar un
+  encoder (y descargar su BPE la primera vez) es caro; se hace una sola vez
+  por modelo, idealmente al arrancar con ``warm_token_encoders``.
+- ``estimate_tokens``: estimación rápida para comprobaciones de presupuesto.
+  Cuenta de forma exacta unas muestras del texto y extrapola por longitud.
+- ``count_tokens`` / ``count_tokens_async``: conteo exacto, solo para cuando
+  el upstream no devuelve ``usage``. La versión async manda los textos
+  grandes al pool de procesos para no bloquear el event loop.
+"""
+import threading
+from typing import Dict, Iterable
+
+import tiktoken
+
+from app.core.executors import run_cpu
+
+DEFAULT_TOKEN_MODEL = "gpt-3.5-turbo"
+_FALLBACK_ENCODING = "cl100k_base"
+
+# Por debajo de este tamaño contar exacto es más barato que muestrear
+_EXACT_MAX_CHARS = 4096
+_SAMPLE_CHARS = 1024
+# Textos más largos se cuentan fuera del event loop
+_OFFLOAD_MIN_CHARS = 32768
+
+_encodings: Dict[str, tiktoken.Encoding] = {}
+_encodings_lock = threading.Lock()
+
+
+def get_encoding(model: str = DEFAULT_TOKEN_MODEL) -> tiktoken.Encoding:
+    encoding = _encodings.get(model)
+    if encoding is not None:
+        return encoding
+    with _encodings_lock:
+        encoding = _encodings.get(model)
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding(_FALLBACK_ENCODING)
+            _encodings[model] = encoding
+    return encoding
+
+
+def warm_token_encoders(models: Iterable[str] = (DEFAULT_TOKEN_MODEL,)) -> None:
+    """Carga los encoders al arrancar el proceso (API o worker)."""
+    for model in models:
+        get_encoding(model)
+
+
+def count_tokens(text: str, model: str = DEFAULT_TOKEN_MODEL) -> int:
+    """Conteo exacto. Función de nivel módulo (picklable) para ``run_cpu``."""
+    if not text:
+        return 0
+    return len(get_encoding(model).encode(text, disallowed_special=()))
+
+
+async def count_tokens_async(text: str, model: str = DEFAULT_TOKEN_MODEL) -> int:
+    if len(text or "") < _OFFLOAD_MIN_CHARS:
+        return count_tokens(text, model)
+    return await run_cpu(count_tokens, text, model)
+
+
+def estimate_tokens(text: str, model: str = DEFAULT_TOKEN_MODEL) -> int:
+    """
+    Estimación rápida: textos cortos se cuentan exacto; en los largos se
+    cuentan tres muestras (inicio, medio y final) y se extrapola la
+    proporción tokens/carácter a la longitud total.
+    """
+    if not text:
+        return 0
+    length = len(text)
+    if length <= _EXACT_MAX_CHARS:
+        return count_tokens(text, model)
+    middle = (length - _SAMPLE_CHARS) // 2
+    samples = (
+        text[:_SAMPLE_CHARS],
+        text[middle:middle + _SAMPLE_CHARS],
+        text[-_SAMPLE_CHARS:],
+    )
+    encoding = get_encoding(model)
+    sampled_tokens = sum(len(encoding.encode(s, disallowed_special=())) for s in samples)
+    return int(sampled_tokens * length / (_SAMPLE_CHARS * len(samples))) + 1
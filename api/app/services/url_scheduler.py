@@ -0,0 +1,238 @@
+"""
+Planificador adaptativo para procesar listas largas de URLs.
+
+Sustituye los lotes fijos + ``sleep`` aleatorio de la validación de URLs:
+
+- Ventana deslizante de URLs en vuelo (``AdaptiveWindow``): en cuanto una
+  URL termina su fase de fetch entra la siguiente, sin esperar al resto del
+  lote. El tamaño crece de forma aditiva mientras la latencia observada se
+  mantiene bajo el objetivo y se reduce a la mitad ante errores o latencias
+  altas (AIMD).
+- Cortesía por host (``HostTokenBucket``): cada dominio tiene su propio
+  token bucket, así que la ventana puede crecer sin golpear más fuerte a un
+  mismo servidor. Los hosts se atienden en round-robin.
+- Pipeline fetch → IA: la fase de IA corre en sus propios workers, de modo
+  que el análisis de una URL se solapa con el fetch de las siguientes.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from urllib.parse import urlparse
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_AI_QUEUE_DONE = object()
+
+
+class HostTokenBucket:
+    """Token bucket por host: ``rate`` peticiones/seg con ráfagas de ``burst``."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(rate, 0.001)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def seconds_until_token(self) -> float:
+        self._refill()
+        return max(0.0, (1 - self._tokens) / self.rate)
+
+
+class AdaptiveWindow:
+    """
+    Límite dinámico de tareas en vuelo (AIMD guiado por latencia y errores).
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_latency: float):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.peak_limit = self.limit
+        self.ewma_latency: Optional[float] = None
+        self.errors = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            while self.in_flight >= int(self.limit):
+                await self._condition.wait()
+            self.in_flight += 1
+
+    async def release(self, latency: float, ok: bool):
+        async with self._condition:
+            self.in_flight -= 1
+            self._observe(latency, ok)
+            self._condition.notify_all()
+
+    def _observe(self, latency: float, ok: bool):
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = 0.2 * latency + 0.8 * self.ewma_latency
+
+        congested = not ok or latency > 2 * self.target_latency
+        if not ok:
+            self.errors += 1
+
+        if congested:
+            # Una sola reducción por "ronda": los fallos de URLs lanzadas a la
+            # vez reflejan la misma congestión.
+            now = time.monotonic()
+            if now - self._last_decrease >= (self.ewma_latency or 0):
+                self.limit = max(self.minimum, self.limit / 2)
+                self._last_decrease = now
+        elif self.ewma_latency <= self.target_latency:
+            # +1 por cada ventana completa de éxitos
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.peak_limit = max(self.peak_limit, self.limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "peak_limit": int(self.peak_limit),
+            "ewma_latency_seconds": round(self.ewma_latency or 0.0, 2),
+            "errors": self.errors,
+        }
+
+
+class UrlPipelineScheduler:
+    """
+    Ejecuta ``fetch_stage`` y ``analyze_stage`` por URL en pipeline.
+
+    - ``fetch_stage(url)`` obtiene lo necesario de la red; si lanza excepción
+      cuenta como error para la ventana y se llama a ``error_stage``.
+    - ``analyze_stage(url, fetched)`` (IA) corre en ``ai_concurrency`` workers.
+    - ``on_result(index, url, result)`` se invoca en cuanto una URL termina.
+
+    ``run`` devuelve los resultados en el orden original de ``urls``.
+    """
+
+    def __init__(
+        self,
+        fetch_stage: Callable[[str], Awaitable[Any]],
+        analyze_stage: Callable[[str, Any], Awaitable[Any]],
+        error_stage: Callable[[str, Exception], Any],
+        on_result: Optional[Callable[[int, str, Any], Awaitable[None]]] = None,
+        window: Optional[AdaptiveWindow] = None,
+        ai_concurrency: Optional[int] = None,
+        host_rate: Optional[float] = None,
+        host_burst: Optional[int] = None,
+    ):
+        settings = get_settings()
+        self.fetch_stage = fetch_stage
+        self.analyze_stage = analyze_stage
+        self.error_stage = error_stage
+        self.on_result = on_result
+        self.window = window or AdaptiveWindow(
+            initial=settings.URL_VALIDATION_WINDOW_INITIAL,
+            minimum=settings.URL_VALIDATION_WINDOW_MIN,
+            maximum=settings.URL_VALIDATION_WINDOW_MAX,
+            target_latency=settings.URL_VALIDATION_TARGET_LATENCY_SECONDS,
+        )
+        self.ai_concurrency = max(1, ai_concurrency or settings.URL_VALIDATION_AI_CONCURRENCY)
+        self.host_rate = host_rate or settings.URL_VALIDATION_HOST_RATE_PER_SECOND
+        self.host_burst = host_burst or settings.URL_VALIDATION_HOST_BURST
+        self._buckets: Dict[str, HostTokenBucket] = {}
+
+    def _bucket(self, host: str) -> HostTokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = HostTokenBucket(self.host_rate, self.host_burst)
+            self._buckets[host] = bucket
+        return bucket
+
+    async def _next_url(self, pending: "OrderedDict[str, Deque[int]]") -> int:
+        """Siguiente índice con token disponible (round-robin entre hosts)."""
+        while True:
+            for host in list(pending.keys()):
+                if self._bucket(host).try_acquire():
+                    queue = pending.pop(host)
+                    index = queue.popleft()
+                    if queue:
+                        pending[host] = queue  # al final: round-robin
+                    return index
+            wait = min(self._bucket(host).seconds_until_token() for host in pending)
+            await asyncio.sleep(max(wait, 0.01))
+
+    async def run(self, urls: List[str]) -> List[Any]:
+        results: List[Any] = [None] * len(urls)
+        ai_queue: asyncio.Queue = asyncio.Queue(maxsize=self.ai_concurrency * 4)
+
+        pending: "OrderedDict[str, Deque[int]]" = OrderedDict()
+        for index, url in enumerate(urls):
+            pending.setdefault(urlparse(url).netloc.lower(), deque()).append(index)
+
+        async def _finish(index: int, result: Any):
+            results[index] = result
+            if self.on_result is not None:
+                try:
+                    await self.on_result(index, urls[index], result)
+                except Exception as e:
+                    logger.error(f"on_result falló para {urls[index]}: {e}")
+
+        async def _fetch(index: int):
+            url = urls[index]
+            started = time.monotonic()
+            try:
+                fetched = await self.fetch_stage(url)
+            except Exception as e:
+                await self.window.release(time.monotonic() - started, ok=False)
+                await _finish(index, self.error_stage(url, e))
+                return
+            latency = time.monotonic() - started
+            # put() bloquea si la IA va atrasada: backpressure sobre la ventana
+            await ai_queue.put((index, fetched))
+            await self.window.release(latency, ok=True)
+
+        async def _ai_worker():
+            while True:
+                item = await ai_queue.get()
+                if item is _AI_QUEUE_DONE:
+                    return
+                index, fetched = item
+                url = urls[index]
+                try:
+                    result = await self.analyze_stage(url, fetched)
+                except Exception as e:
+                    result = self.error_stage(url, e)
+                await _finish(index, result)
+
+        ai_workers = [asyncio.create_task(_ai_worker()) for _ in range(self.ai_concurrency)]
+        fetch_tasks = []
+        try:
+            while pending:
+                await self.window.acquire()
+                index = await self._next_url(pending)
+                fetch_tasks.append(asyncio.create_task(_fetch(index)))
+
+            await asyncio.gather(*fetch_tasks)
+            for _ in ai_workers:
+                await ai_queue.put(_AI_QUEUE_DONE)
+            await asyncio.gather(*ai_workers)
+        except BaseException:
+            for task in fetch_tasks + ai_workers:
+                task.cancel()
+            await asyncio.gather(*fetch_tasks, *ai_workers, return_exceptions=True)
+            raise
+
+        logger.info(f"📊 Planificador de URLs: {self.window.stats()}")
+        return results
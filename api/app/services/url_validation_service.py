@@ -2,16 +2,27 @@
 Servicio para validación batch de schemas por URL.
 Extrae schemas, los compara contra un source, y genera análisis IA por URL.
 """
+import hashlib
+import json
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+from app.core.config import settings
+from app.core.executors import run_cpu
 from app.services.ai_client import AIClient
 from app.services.audit_engine import get_audit_engine
 from app.services.seo_analyzer import SEOAnalyzer, filter_open_graph_schemas
 from app.services.schema_audit_service import get_schema_audit_service
+from app.services.static_fetcher import STATIC_FETCH_RESULTS, browser_fallback_reason, fetch_static
 from app.schemas.ai_schemas import ChatMessage, MessageRole, ChatCompletionRequest
 
 
+# Claves cuyo valor define la forma del schema y se conserva en la huella
+_SHAPE_KEYS = {"@type", "@context"}
+# Marcadores de la plantilla enviada a la IA: {{url}} y {{ruta.del.valor}}
+URL_PLACEHOLDER = "{{url}}"
+_PLACEHOLDER = re.compile(r"\{\{([^{}]+)\}\}")
+
 # Orden de severidad para compute_global_severity
 _SEVERITY_ORDER = {"ok": 0, "warning": 1, "critical": 2}
 _SEVERITY_REVERSE = {0: "ok", 1: "warning", 2: "critical"}
@@ -79,8 +90,15 @@ class UrlValidationService:
         timeout_ms: int = 30_000
     ) -> List[Dict[str, Any]]:
         """
-        Obtiene el HTML de una URL via AuditEngine.fetch_html y
-        extrae los schemas con SEOAnalyzer.extract_schemas_from_html.
+        Extrae los schemas de una URL en dos niveles:
+
+        1. GET HTTP plano (static_fetcher). Si la página no está bloqueada, no
+           parece renderizada en cliente y su HTML inicial ya trae schemas, se
+           usan directamente.
+        2. Si no, render con navegador via AuditEngine.fetch_html con el
+           perfil ``schema_only`` (sin imágenes/CSS/trackers, sin networkidle).
+
+        La extracción (extruct) corre en el pool de procesos.
 
         Args:
             url: URL a analizar.
@@ -89,11 +107,24 @@ class UrlValidationService:
         Returns:
             Lista de schemas encontrados. Vacía si hay error.
         """
+        if settings.STATIC_FETCH_ENABLED:
+            result = await fetch_static(url)
+            if result is not None:
+                reason = browser_fallback_reason(result)
+                if reason is None:
+                    schemas = await run_cpu(SEOAnalyzer.extract_schemas_from_html, result.html, url)
+                    if schemas:
+                        STATIC_FETCH_RESULTS.labels("static").inc()
+                        return schemas
+                    # Sin schemas en el HTML inicial: pueden inyectarse por JS (GTM…)
+                    reason = "no_schemas"
+                STATIC_FETCH_RESULTS.labels(reason).inc()
+
         engine = get_audit_engine()
-        html = await engine.fetch_html(url, timeout_ms=timeout_ms)
+        html = await engine.fetch_html(url, timeout_ms=timeout_ms, profile="schema_only")
         if not html:
             return []
-        return SEOAnalyzer.extract_schemas_from_html(html, url)
+        return await run_cpu(SEOAnalyzer.extract_schemas_from_html, html, url)
 
     # ------------------------------------------------------------------
     # Análisis IA por URL
@@ -109,6 +140,7 @@ class UrlValidationService:
         description_validation: Optional[str],
         ai_instruction: Optional[str],
         token: str,
+        shared_template: bool = False,
     ) -> Dict[str, Any]:
         """
         Genera el análisis IA para una URL individual.
@@ -122,6 +154,8 @@ class UrlValidationService:
             description_validation: Descripción del flujo.
             ai_instruction: Instrucción adicional del usuario.
             token: Token de autenticación para la API de IA.
+            shared_template: ``url_schema`` es la plantilla de ``schema_template``
+                (valores como marcadores) y el reporte se comparte en el grupo.
 
         Returns:
             Dict con 'content' (texto IA) y 'usage' (tokens).
@@ -136,6 +170,7 @@ class UrlValidationService:
             name_validation=name_validation,
             description_validation=description_validation or "",
             ai_instruction=ai_instruction or "",
+            shared_template=shared_template,
         )
 
         request = ChatCompletionRequest(
@@ -144,20 +179,126 @@ class UrlValidationService:
             stream=False,
         )
 
-        input_tokens = self.ai_client.count_tokens(prompt_content)
-        response = await self.ai_client.chat_completion(request, token)
+        response = await self.ai_client.chat_completion(request, token, cache_template="url_schema_validator")
         content = response.get_content()
-        output_tokens = self.ai_client.count_tokens(content)
+        usage = await self.ai_client.resolve_usage(response, prompt_content, content)
 
         return {
             "content": content,
-            "usage": {
-                "prompt_tokens": input_tokens,
-                "completion_tokens": output_tokens,
-                "total_tokens": input_tokens + output_tokens,
-            },
+            "usage": usage,
         }
 
+    # ------------------------------------------------------------------
+    # Agrupación de URLs con el mismo schema (un análisis IA por grupo)
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _strip_schema_values(cls, node: Any) -> Any:
+        """Forma del schema: claves y tipos, sin valores (salvo @type/@context)."""
+        if isinstance(node, dict):
+            return {
+                key: value if key in _SHAPE_KEYS else cls._strip_schema_values(value)
+                for key, value in sorted(node.items())
+            }
+        if isinstance(node, list):
+            # Listas con la misma forma de items son equivalentes sin importar su longitud
+            stripped = {
+                json.dumps(cls._strip_schema_values(item), sort_keys=True, default=str)
+                for item in node
+            }
+            return sorted(stripped)
+        return type(node).__name__
+
+    @staticmethod
+    def _replace_url(node: Any, url: str, replacement: str) -> Any:
+        """
+        Sustituye ``url`` en los strings de ``node`` solo como token completo:
+        ``https://x.com/p`` no toca ``https://x.com/p/2`` ni ``https://x.com/p?ref=``.
+        """
+        pattern = re.compile(rf"(?<![\w/.-]){re.escape(url)}(?![\w/?#&=%~+-]|\.\w)")
+
+        def replace(value: Any) -> Any:
+            if isinstance(value, str):
+                return pattern.sub(lambda _match: replacement, value)
+            if isinstance(value, dict):
+                return {key: replace(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [replace(item) for item in value]
+            return value
+
+        return replace(node)
+
+    def schema_fingerprint(self, url: str, url_schemas: Any, validation_result: Optional[Dict[str, Any]]) -> str:
+        """
+        Huella de (forma del schema + resultado de validación) de una URL.
+        Las URLs de una misma plantilla (p. ej. 300 fichas de hotel) comparten
+        huella y, con ella, el análisis IA de la plantilla.
+        """
+        validation = json.dumps(
+            self._replace_url(validation_result or {}, url, URL_PLACEHOLDER), sort_keys=True, default=str
+        )
+        shape = json.dumps(self._strip_schema_values(url_schemas), sort_keys=True, default=str)
+        return hashlib.sha256(f"{shape}|{validation}".encode("utf-8")).hexdigest()
+
+    def schema_template(self, url_schemas: Any) -> Tuple[Any, Dict[str, str]]:
+        """
+        (plantilla, valores) del schema minificado de una URL. En la plantilla
+        cada valor (salvo @type/@context) es un marcador ``{{ruta}}``; los
+        valores propios de la página quedan en el dict por ruta. La IA solo ve
+        la plantilla, así su reporte vale para todo el grupo sin arrastrar
+        datos de ninguna página.
+        """
+        values: Dict[str, str] = {}
+
+        def walk(node: Any, path: str) -> Any:
+            if isinstance(node, dict):
+                return {
+                    key: value if key in _SHAPE_KEYS else walk(value, f"{path}.{key}" if path else key)
+                    for key, value in node.items()
+                }
+            if isinstance(node, list):
+                return [walk(item, f"{path}[{index}]") for index, item in enumerate(node)]
+            if node is None:
+                return None
+            values[path] = node if isinstance(node, str) else json.dumps(node)
+            return f"{{{{{path}}}}}"
+
+        return walk(self._schema_service._minify_schema_for_ai(url_schemas), ""), values
+
+    def template_validation(self, url: str, validation_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Resultado de validación con la URL como marcador (común a todo el grupo)."""
+        return self._replace_url(validation_result or {}, url, URL_PLACEHOLDER)
+
+    @staticmethod
+    def fill_shared_report(
+        report: str,
+        url: str,
+        values: Dict[str, str],
+        source_url: Optional[str] = None,
+    ) -> str:
+        """
+        Rellena el reporte de la plantilla con la URL y los valores propios de
+        la página. ``source_url`` indica la URL cuyo análisis se compartió.
+        """
+        def fill(match: re.Match) -> str:
+            path = match.group(1).strip()
+            if path == "url":
+                return url
+            value = values.get(path)
+            if value is None:
+                return "N/A"
+            # El valor puede acabar en una celda de tabla Markdown
+            return " ".join(value.split()).replace("|", "\\|")
+
+        filled = _PLACEHOLDER.sub(fill, report or "")
+        if not source_url:
+            return filled
+        note = (
+            f"> Análisis compartido: esta URL tiene la misma estructura de schema y el mismo "
+            f"resultado de validación que {source_url}; los valores citados son los de esta URL.\n\n"
+        )
+        return note + filled
+
     # ------------------------------------------------------------------
     # Validación estructural
     # ------------------------------------------------------------------
@@ -455,18 +596,13 @@ class UrlValidationService:
             stream=False,
         )
 
-        input_tokens = self.ai_client.count_tokens(prompt_content)
-        response = await self.ai_client.chat_completion(request, token)
+        response = await self.ai_client.chat_completion(request, token, cache_template="url_validation_global_report")
         content = response.get_content()
-        output_tokens = self.ai_client.count_tokens(content)
+        usage = await self.ai_client.resolve_usage(response, prompt_content, content)
 
         return {
             "content": content,
-            "usage": {
-                "prompt_tokens": input_tokens,
-                "completion_tokens": output_tokens,
-                "total_tokens": input_tokens + output_tokens,
-            },
+            "usage": usage,
         }
 
     @staticmethod
@@ -0,0 +1,268 @@
+"""
+Medición de Core Web Vitals en laboratorio (Playwright / Chromium).
+
+- ``WEB_VITALS_INIT_SCRIPT`` se inyecta antes de navegar
+  (``page.add_init_script``) y registra ``PerformanceObserver`` con
+  ``buffered: true`` para LCP, CLS (ventanas de sesión como web-vitals),
+  FCP, long tasks (TBT) y event timing (proxy de INP).
+- ``collect_web_vitals`` lee esas métricas junto con TTFB, tiempos de
+  navegación y un resumen de recursos (número, bytes transferidos, terceros).
+- ``THROTTLING_PROFILES`` replica la limitación de Lighthouse en laboratorio
+  (red + CPU vía CDP) para que las mediciones sean comparables entre
+  auditorías.
+- ``score_performance`` calcula el score de rendimiento con las curvas
+  log-normales de Lighthouse (v10) sobre FCP, LCP, TBT y CLS.
+- ``summarize_samples`` agrega varias cargas de la misma página (mediana,
+  p75 y dispersión) para separar cambios reales del ruido entre cargas.
+"""
+import logging
+import math
+import statistics
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import BrowserContext, Page
+
+logger = logging.getLogger(__name__)
+
+
+WEB_VITALS_INIT_SCRIPT = """
+(() => {
+  if (window.__seoVitals) return;
+  const v = window.__seoVitals = {
+    lcp: null, lcpElement: null, fcp: null, cls: 0,
+    tbt: 0, longTasks: 0, maxEventDuration: null
+  };
+  const observe = (type, cb, opts = {}) => {
+    try {
+      new PerformanceObserver((list) => list.getEntries().forEach(cb))
+        .observe(Object.assign({ type, buffered: true }, opts));
+    } catch (e) { /* tipo no soportado */ }
+  };
+
+  observe('largest-contentful-paint', (e) => {
+    v.lcp = e.renderTime || e.loadTime || e.startTime;
+    v.lcpElement = e.element ? e.element.tagName : null;
+  });
+
+  observe('paint', (e) => {
+    if (e.name === 'first-contentful-paint') v.fcp = e.startTime;
+  });
+
+  // CLS: máxima ventana de sesión (huecos < 1s, ventana <= 5s)
+  let sessionValue = 0, sessionStart = 0, sessionLast = 0;
+  observe('layout-shift', (e) => {
+    if (e.hadRecentInput) return;
+    if (sessionValue && e.startTime - sessionLast < 1000 && e.startTime - sessionStart < 5000) {
+      sessionValue += e.value;
+    } else {
+      sessionValue = e.value;
+      sessionStart = e.startTime;
+    }
+    sessionLast = e.startTime;
+    v.cls = Math.max(v.cls, sessionValue);
+  });
+
+  // TBT: tiempo bloqueante (> 50ms) de las long tasks posteriores al FCP
+  observe('longtask', (e) => {
+    v.longTasks += 1;
+    if (v.fcp === null || e.startTime >= v.fcp) v.tbt += Math.max(0, e.duration - 50);
+  });
+
+  // Proxy de INP: duración máxima de eventos (solo si hubo interacción)
+  observe('event', (e) => {
+    if (e.interactionId) v.maxEventDuration = Math.max(v.maxEventDuration || 0, e.duration);
+  }, { durationThreshold: 16 });
+})();
+"""
+
+_COLLECT_SCRIPT = """
+() => {
+  const v = window.__seoVitals || {};
+  const nav = performance.getEntriesByType('navigation')[0] || {};
+  const resources = performance.getEntriesByType('resource');
+  const origin = location.origin;
+  const summary = { count: resources.length, transferBytes: 0, thirdPartyCount: 0,
+                    thirdPartyBytes: 0, byType: {} };
+  for (const r of resources) {
+    const bytes = r.transferSize || 0;
+    summary.transferBytes += bytes;
+    const type = r.initiatorType || 'other';
+    const bucket = summary.byType[type] || (summary.byType[type] = { count: 0, bytes: 0 });
+    bucket.count += 1;
+    bucket.bytes += bytes;
+    if (!r.name.startsWith(origin)) {
+      summary.thirdPartyCount += 1;
+      summary.thirdPartyBytes += bytes;
+    }
+  }
+  summary.transferBytes += nav.transferSize || 0;
+  return {
+    lcp: v.lcp, lcpElement: v.lcpElement, fcp: v.fcp, cls: v.cls, tbt: v.tbt,
+    longTasks: v.longTasks, inp: v.maxEventDuration,
+    ttfb: nav.responseStart ? nav.responseStart - (nav.activationStart || 0) : null,
+    domContentLoaded: nav.domContentLoadedEventEnd || null,
+    loadDuration: (nav.loadEventEnd - nav.startTime) || 0,
+    documentBytes: nav.transferSize || 0,
+    resources: summary
+  };
+}
+"""
+
+
+@dataclass(frozen=True)
+class ThrottlingProfile:
+    """Limitación de red/CPU y emulación de dispositivo (valores de Lighthouse)."""
+    name: str
+    rtt_ms: float = 0
+    download_kbps: float = 0
+    upload_kbps: float = 0
+    cpu_slowdown: float = 1
+    context_options: Dict[str, Any] = field(default_factory=dict)
+    # Curvas de score (p10, mediana) por métrica
+    score_curves: Dict[str, tuple] = field(default_factory=dict)
+
+
+_DESKTOP_CURVES = {"fcp": (934, 1600), "lcp": (1200, 2400), "tbt": (150, 350), "cls": (0.1, 0.25)}
+_MOBILE_CURVES = {"fcp": (1800, 3000), "lcp": (2500, 4000), "tbt": (200, 600), "cls": (0.1, 0.25)}
+
+THROTTLING_PROFILES = {
+    "none": ThrottlingProfile(name="none", score_curves=_DESKTOP_CURVES),
+    "desktop": ThrottlingProfile(
+        name="desktop", rtt_ms=40, download_kbps=10240, upload_kbps=10240, cpu_slowdown=1,
+        score_curves=_DESKTOP_CURVES,
+    ),
+    "mobile": ThrottlingProfile(
+        name="mobile", rtt_ms=150, download_kbps=1638.4, upload_kbps=750, cpu_slowdown=4,
+        context_options={
+            "viewport": {"width": 412, "height": 823},
+            "device_scale_factor": 1.75,
+            "is_mobile": True,
+            "has_touch": True,
+        },
+        score_curves=_MOBILE_CURVES,
+    ),
+}
+
+# Pesos de Lighthouse v10 sin Speed Index (su 10% se reparte proporcionalmente)
+_SCORE_WEIGHTS = {"fcp": 0.10, "lcp": 0.25, "tbt": 0.30, "cls": 0.25}
+
+
+def get_throttling_profile(name: str) -> ThrottlingProfile:
+    try:
+        return THROTTLING_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Perfil de throttling desconocido: {name}")
+
+
+async def prepare_page(context: BrowserContext, page: Page, profile: ThrottlingProfile) -> None:
+    """Inyecta la instrumentación y aplica la limitación antes de navegar."""
+    await page.add_init_script(WEB_VITALS_INIT_SCRIPT)
+    if profile.rtt_ms == 0 and profile.cpu_slowdown == 1:
+        return
+    try:
+        cdp = await context.new_cdp_session(page)
+        if profile.rtt_ms or profile.download_kbps:
+            await cdp.send("Network.enable")
+            await cdp.send("Network.emulateNetworkConditions", {
+                "offline": False,
+                "latency": profile.rtt_ms,
+                "downloadThroughput": profile.download_kbps * 1024 / 8,
+                "uploadThroughput": profile.upload_kbps * 1024 / 8,
+            })
+        if profile.cpu_slowdown > 1:
+            await cdp.send("Emulation.setCPUThrottlingRate", {"rate": profile.cpu_slowdown})
+    except Exception as e:
+        # Sin CDP (navegador no Chromium) se mide sin limitar
+        logger.warning(f"⚠️ No se pudo aplicar throttling '{profile.name}': {e}")
+
+
+async def collect_web_vitals(page: Page) -> Dict[str, Any]:
+    """Métricas recogidas por la instrumentación (ms; CLS sin unidad)."""
+    try:
+        metrics = await page.evaluate(_COLLECT_SCRIPT)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudieron leer las Web Vitals: {e}")
+        return {}
+    for key in ("lcp", "fcp", "tbt", "ttfb", "inp", "domContentLoaded"):
+        if metrics.get(key) is not None:
+            metrics[key] = round(metrics[key], 1)
+    if metrics.get("cls") is not None:
+        metrics["cls"] = round(metrics["cls"], 4)
+    return metrics
+
+
+def _log_normal_score(value: float, p10: float, median: float) -> float:
+    """Curva log-normal de Lighthouse: p10 -> 0.9, mediana -> 0.5."""
+    if value <= 0:
+        return 1.0
+    inverse_erfc_one_fifth = 0.9061938024368232
+    standardized = math.log(value / median) * inverse_erfc_one_fifth / -math.log(p10 / median)
+    return max(0.0, min(1.0, math.erfc(standardized) / 2))
+
+
+def score_performance(vitals: Dict[str, Any], profile: ThrottlingProfile) -> Optional[float]:
+    """Score 0-100 con las métricas disponibles; None si no hay ninguna."""
+    weighted = 0.0
+    total_weight = 0.0
+    for metric, weight in _SCORE_WEIGHTS.items():
+        value = vitals.get(metric)
+        curve = profile.score_curves.get(metric)
+        if value is None or curve is None:
+            continue
+        weighted += weight * _log_normal_score(value, *curve)
+        total_weight += weight
+    if not total_weight or vitals.get("lcp") is None:
+        return None
+    return round(100 * weighted / total_weight, 1)
+
+
+# Métricas que se agregan cuando una auditoría toma varias muestras
+SAMPLED_METRICS = ("performance_score", "lcp", "cls", "fcp", "tbt", "ttfb", "loadDuration")
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Percentil con interpolación lineal sobre valores ya ordenados."""
+    position = (len(sorted_values) - 1) * q
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize_samples(samples: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Mediana, p75 y dispersión por métrica. ``stdev`` es None con una sola
+    muestra (la varianza no se conoce y el comparador usa su umbral por defecto).
+    """
+    summary = {}
+    for metric in SAMPLED_METRICS:
+        values = sorted(s[metric] for s in samples if s.get(metric) is not None)
+        if not values:
+            continue
+        summary[metric] = {
+            "n": len(values),
+            "median": round(statistics.median(values), 4),
+            "p75": round(_percentile(values, 0.75), 4),
+            "min": values[0],
+            "max": values[-1],
+            "spread": round(values[-1] - values[0], 4),
+            "stdev": round(statistics.stdev(values), 4) if len(values) > 1 else None,
+        }
+    return summary
+
+
+def vitals_sample(vitals: Dict[str, Any], profile: ThrottlingProfile, mode: str) -> Dict[str, Any]:
+    """Fila por carga para ``performance_samples.runs``."""
+    return {
+        "mode": mode,
+        "performance_score": score_performance(vitals, profile),
+        "lcp": vitals.get("lcp"),
+        "cls": vitals.get("cls"),
+        "fcp": vitals.get("fcp"),
+        "tbt": vitals.get("tbt"),
+        "ttfb": vitals.get("ttfb"),
+        "loadDuration": vitals.get("loadDuration"),
+        "transferBytes": (vitals.get("resources") or {}).get("transferBytes"),
+    }
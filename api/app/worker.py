@@ -0,0 +1,146 @@
+"""
+Worker de la cola de trabajos - SEO Bot AI
+Consume los trabajos encolados por el API (auditorías, comparaciones,
+validaciones de URLs) en un proceso separado del servidor HTTP.
+
+Uso:
+    python -m app.worker                          # todos los tipos
+    python -m app.worker audit url_validation     # solo los tipos indicados
+
+La concurrencia por tipo se configura con JOB_WORKER_CONCURRENCY.
+"""
+import asyncio
+import logging
+import signal
+import sys
+from contextlib import suppress
+from typing import Dict, List
+
+from app.core.config import settings
+from app.core.executors import event_loop_monitor, execution_layer, run_db
+from app.core.redis_client import close_redis_pool, init_redis_pool
+from app.services.ai_client import close_ai_http_client
+from app.services.background_tasks import JOB_HANDLERS, mark_job_entity_failed, recover_stuck_jobs
+from app.services.browser_pool import close_browser_pool, init_browser_pool
+from app.services.html_snapshot_cache import close_html_snapshot_cache
+from app.services.job_queue import close_job_queue, get_job_queue
+from app.services.static_fetcher import close_static_http_client
+from app.services.token_counter import warm_token_encoders
+
+log = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = 1.0
+SHUTDOWN_GRACE_SECONDS = 30.0
+
+
+async def _heartbeat_loop(job: Dict):
+    interval = max(1.0, settings.JOB_VISIBILITY_TIMEOUT_SECONDS / 3)
+    queue = get_job_queue()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await queue.heartbeat(job)
+        except Exception as e:
+            log.warning("Heartbeat fallido para job %s: %s", job["id"], e)
+
+
+async def _consume(job_type: str, slot: int, stop: asyncio.Event):
+    """Bucle de consumo: reclama, ejecuta y confirma trabajos de un tipo."""
+    queue = get_job_queue()
+    handler, _ = JOB_HANDLERS[job_type]
+
+    while not stop.is_set():
+        try:
+            job = await queue.claim(job_type)
+        except Exception as e:
+            log.error("Error reclamando job %s: %s", job_type, e)
+            job = None
+
+        if job is None:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop.wait(), timeout=POLL_INTERVAL_SECONDS)
+            continue
+
+        print(f"⚙️  [{job_type}#{slot}] Ejecutando job {job['id']} (intento {job['attempts']}/{job['max_attempts']})")
+        heartbeat = asyncio.create_task(_heartbeat_loop(job))
+        try:
+            # reraise: el handler propaga el error para que la cola reintente; la
+            # fila se marca FAILED aquí solo cuando no quedan intentos
+            await handler(**job["payload"], reraise=True)
+        except Exception as e:
+            log.exception("Job %s (%s) falló", job["id"], job_type)
+            will_retry = await queue.fail(job, str(e))
+            if not will_retry and job.get("entity_table") and job.get("entity_id"):
+                await run_db(mark_job_entity_failed, job["entity_table"], job["entity_id"], str(e))
+        else:
+            await queue.ack(job)
+            print(f"✅ [{job_type}#{slot}] Job {job['id']} completado")
+        finally:
+            heartbeat.cancel()
+            with suppress(asyncio.CancelledError):
+                await heartbeat
+
+
+async def _recovery_loop(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await recover_stuck_jobs()
+        except Exception as e:
+            log.error("Error en recuperación de trabajos: %s", e)
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(stop.wait(), timeout=settings.JOB_RECOVERY_INTERVAL_SECONDS)
+
+
+async def run_worker(job_types: List[str]):
+    concurrency: Dict[str, int] = {
+        job_type: max(1, settings.JOB_WORKER_CONCURRENCY.get(job_type, 1))
+        for job_type in job_types
+    }
+    print(f"🚀 Worker iniciado — concurrencia: {concurrency}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+
+    init_redis_pool()
+    await init_browser_pool()
+    warm_token_encoders()
+    event_loop_monitor.start()
+
+    tasks = [asyncio.create_task(_recovery_loop(stop))]
+    for job_type, slots in concurrency.items():
+        for slot in range(slots):
+            tasks.append(asyncio.create_task(_consume(job_type, slot, stop)))
+
+    await stop.wait()
+    print("🛑 Deteniendo worker, esperando trabajos en curso...")
+
+    # Los trabajos que no terminen a tiempo vuelven a la cola al expirar su visibilidad
+    _, pending = await asyncio.wait(tasks, timeout=SHUTDOWN_GRACE_SECONDS)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    await event_loop_monitor.stop()
+    await close_browser_pool()
+    await close_job_queue()
+    await close_html_snapshot_cache()
+    await close_redis_pool()
+    await close_ai_http_client()
+    await close_static_http_client()
+    execution_layer.shutdown()
+    print("👋 Worker detenido")
+
+
+def main():
+    requested = sys.argv[1:] or list(JOB_HANDLERS.keys())
+    unknown = [t for t in requested if t not in JOB_HANDLERS]
+    if unknown:
+        raise SystemExit(f"Tipos de trabajo desconocidos: {unknown}. Disponibles: {list(JOB_HANDLERS)}")
+    asyncio.run(run_worker(requested))
+
+
+if __name__ == "__main__":
+    main()
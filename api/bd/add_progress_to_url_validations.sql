@@ -0,0 +1,10 @@
+-- Progreso incremental de audit_url_validations
+-- results_json se guarda por checkpoints durante la ejecución; estos contadores
+-- permiten mostrar avance y reanudar validaciones interrumpidas.
+
+ALTER TABLE audit_url_validations
+    ADD COLUMN IF NOT EXISTS processed_urls INT DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS total_urls INT DEFAULT 0;
+
+COMMENT ON COLUMN audit_url_validations.processed_urls IS 'URLs con resultado guardado en results_json';
+COMMENT ON COLUMN audit_url_validations.total_urls IS 'Total de URLs de la ejecución en curso';
@@ -0,0 +1,10 @@
+"""
+Pruebas unitarias del API. Ejecutar desde ``api/``: ``python -m pytest tests``.
+Los módulos que dependen de paquetes opcionales (FastAPI, Redis...) se
+omiten con ``pytest.importorskip`` si el entorno no los tiene instalados.
+"""
+import sys
+from pathlib import Path
+
+# Permite importar ``app`` sin instalar el paquete
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,131 @@
+"""file_download_response: rangos, peticiones condicionales e If-Range."""
+import os
+from email.utils import formatdate
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")  # TestClient
+pytest.importorskip("pandas")  # app.helpers.__init__
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.helpers.file_download import file_download_response  # noqa: E402
+
+CONTENT = bytes(range(256)) * 4  # 1024 bytes
+ETAG = '"abc123"'
+MTIME = 1_700_000_000
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "reporte.pdf"
+    path.write_bytes(CONTENT)
+    os.utime(path, (MTIME, MTIME))
+
+    app = FastAPI()
+
+    @app.get("/download")
+    def download(request: Request):
+        return file_download_response(request, path, "application/pdf", etag=ETAG)
+
+    return TestClient(app)
+
+
+def _http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def test_full_download(client):
+    response = client.get("/download")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == ETAG
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-length"] == str(len(CONTENT))
+
+
+def test_single_range(client):
+    response = client.get("/download", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+
+
+def test_open_ended_range_is_clamped_to_size(client):
+    response = client.get("/download", headers={"Range": "bytes=1000-5000"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[1000:]
+    assert response.headers["content-range"] == f"bytes 1000-1023/{len(CONTENT)}"
+
+
+def test_suffix_range(client):
+    response = client.get("/download", headers={"Range": "bytes=-100"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[-100:]
+    assert response.headers["content-range"] == f"bytes 924-1023/{len(CONTENT)}"
+
+
+def test_suffix_range_longer_than_file_returns_whole_file(client):
+    response = client.get("/download", headers={"Range": "bytes=-5000"})
+    assert response.status_code == 206
+    assert response.content == CONTENT
+
+
+@pytest.mark.parametrize("range_header", ["bytes=1024-", "bytes=2000-3000", "bytes=-0", "bytes=20-10"])
+def test_unsatisfiable_range(client, range_header):
+    response = client.get("/download", headers={"Range": range_header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+@pytest.mark.parametrize("range_header", ["bytes=0-9,20-29", "bytes=-", "items=0-9"])
+def test_multi_or_malformed_range_returns_whole_file(client, range_header):
+    response = client.get("/download", headers={"Range": range_header})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_if_none_match_returns_not_modified(client):
+    response = client.get("/download", headers={"If-None-Match": f'"otro", W/{ETAG}'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == ETAG
+
+
+def test_if_modified_since_returns_not_modified(client):
+    response = client.get("/download", headers={"If-Modified-Since": _http_date(MTIME + 60)})
+    assert response.status_code == 304
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since(client):
+    response = client.get(
+        "/download",
+        headers={"If-None-Match": '"otro"', "If-Modified-Since": _http_date(MTIME + 60)},
+    )
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_if_range_with_matching_etag_honours_range(client):
+    response = client.get("/download", headers={"Range": "bytes=0-9", "If-Range": ETAG})
+    assert response.status_code == 206
+    assert response.content == CONTENT[:10]
+
+
+@pytest.mark.parametrize("if_range", [f"W/{ETAG}", '"otro"'])
+def test_if_range_with_weak_or_stale_etag_returns_whole_file(client, if_range):
+    response = client.get("/download", headers={"Range": "bytes=0-9", "If-Range": if_range})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_if_range_with_http_date(client):
+    unchanged = client.get("/download", headers={"Range": "bytes=0-9", "If-Range": _http_date(MTIME)})
+    assert unchanged.status_code == 206
+    assert unchanged.content == CONTENT[:10]
+
+    changed = client.get("/download", headers={"Range": "bytes=0-9", "If-Range": _http_date(MTIME - 60)})
+    assert changed.status_code == 200
+    assert changed.content == CONTENT
@@ -0,0 +1,73 @@
+"""HtmlSnapshotCache.get_or_render: un render por URL y relevo si se cancela."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("redis")
+
+from app.services.html_snapshot_cache import HtmlSnapshotCache  # noqa: E402
+
+URL = "https://x.com/p"
+
+
+class _MemorySnapshotCache(HtmlSnapshotCache):
+    """Sin Redis: nada en caché y las escrituras se descartan."""
+
+    def __init__(self):
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, url, profile="desktop", max_age=None):
+        return None
+
+    async def put(self, url, html, profile="desktop"):
+        return None
+
+
+def test_concurrent_requests_share_one_render():
+    async def scenario():
+        cache = _MemorySnapshotCache()
+        calls = 0
+
+        async def render():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "<html>ok</html>"
+
+        results = await asyncio.gather(*(cache.get_or_render(URL, render) for _ in range(3)))
+        return results, calls
+
+    results, calls = asyncio.run(scenario())
+    assert results == ["<html>ok</html>"] * 3
+    assert calls == 1
+
+
+def test_cancelled_leader_hands_render_to_waiter():
+    async def scenario():
+        cache = _MemorySnapshotCache()
+        leader_started = asyncio.Event()
+
+        async def slow_render():
+            leader_started.set()
+            await asyncio.sleep(10)
+            return "<html>leader</html>"
+
+        async def waiter_render():
+            return "<html>waiter</html>"
+
+        leader = asyncio.create_task(cache.get_or_render(URL, slow_render))
+        await leader_started.wait()
+        waiter = asyncio.create_task(cache.get_or_render(URL, waiter_render))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter, cache.stats()
+
+    html, stats = asyncio.run(scenario())
+    assert html == "<html>waiter</html>"
+    assert stats["inflight"] == 0
@@ -0,0 +1,156 @@
+"""JobQueue: reclamo, reintentos con backoff, dead-letter y trabajos vivos por entidad."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # scripts Lua en fakeredis
+
+from app.services import job_queue as job_queue_module  # noqa: E402
+from app.services.job_queue import JobQueue  # noqa: E402
+
+SETTINGS = SimpleNamespace(
+    JOB_MAX_ATTEMPTS=2,
+    JOB_VISIBILITY_TIMEOUT_SECONDS=60,
+    JOB_RETRY_BACKOFF_SECONDS=0,
+    JOB_RETRY_BACKOFF_MAX_SECONDS=0,
+    JOB_PAYLOAD_TTL_SECONDS=3600,
+)
+
+
+def _make_queue() -> JobQueue:
+    queue = JobQueue.__new__(JobQueue)
+    queue.settings = SETTINGS
+    queue._redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    queue._claim = queue._redis.register_script(job_queue_module._CLAIM_SCRIPT)
+    return queue
+
+
+def _run(scenario):
+    async def main():
+        queue = _make_queue()
+        try:
+            return await scenario(queue)
+        finally:
+            await queue.close()
+    return asyncio.run(main())
+
+
+def test_claim_moves_job_to_inflight_and_counts_attempt():
+    async def scenario(queue):
+        job_id = await queue.enqueue("audit", {"token": "secret"}, "audit_reports", "a1")
+        job = await queue.claim("audit")
+        assert job["id"] == job_id
+        assert job["attempts"] == 1
+        assert await queue._redis.zscore(queue._inflight_key(), job_id) is not None
+        assert await queue._redis.zcard(queue._ready_key("audit")) == 0
+        assert await queue.claim("audit") is None
+        # El payload (con token) expira aunque el trabajo quede abandonado
+        assert 0 < await queue._redis.ttl(queue._job_key(job_id)) <= SETTINGS.JOB_PAYLOAD_TTL_SECONDS
+    _run(scenario)
+
+
+def test_fail_reschedules_then_dead_letters_without_token():
+    async def scenario(queue):
+        job_id = await queue.enqueue("audit", {"token": "secret", "audit_id": "a1"}, "audit_reports", "a1")
+
+        job = await queue.claim("audit")
+        assert await queue.fail(job, "boom") is True
+        assert await queue.has_live_job("audit_reports", "a1") is True
+
+        job = await queue.claim("audit")
+        assert job["attempts"] == 2
+        assert await queue.fail(job, "boom again") is False
+
+        assert await queue._redis.lrange(queue._dead_key(), 0, -1) == [job_id]
+        dead = await queue.get(job_id)
+        assert "token" not in dead["payload"]
+        assert dead["payload"]["audit_id"] == "a1"
+        assert dead["last_error"] == "boom again"
+        assert await queue.has_live_job("audit_reports", "a1") is False
+    _run(scenario)
+
+
+def test_ack_only_releases_its_own_job_for_the_entity():
+    async def scenario(queue):
+        await queue.enqueue("url_validation", {}, "audit_url_validations", "v1")
+        await queue.enqueue("url_validation_single", {}, "audit_url_validations", "v1")
+        full = await queue.claim("url_validation")
+        single = await queue.claim("url_validation_single")
+
+        await queue.ack(single)
+        assert await queue.has_live_job("audit_url_validations", "v1") is True
+
+        await queue.ack(full)
+        assert await queue.has_live_job("audit_url_validations", "v1") is False
+    _run(scenario)
+
+
+def test_requeue_expired_returns_exhausted_jobs():
+    async def scenario(queue):
+        retried_id = await queue.enqueue("audit", {}, "audit_reports", "a1")
+        exhausted_id = await queue.enqueue("comparison", {}, "audit_comparisons", "c1", max_attempts=1)
+        await queue.claim("audit")
+        await queue.claim("comparison")
+
+        # Ambos workers dejaron de enviar heartbeats
+        past = time.time() - 1
+        await queue._redis.zadd(queue._inflight_key(), {retried_id: past, exhausted_id: past})
+
+        exhausted = await queue.requeue_expired()
+        assert [job["id"] for job in exhausted] == [exhausted_id]
+        assert await queue._redis.zscore(queue._ready_key("audit"), retried_id) is not None
+        assert await queue._redis.zcard(queue._inflight_key()) == 0
+        assert await queue.has_live_job("audit_comparisons", "c1") is False
+    _run(scenario)
+
+
+def test_dead_letter_list_is_capped(monkeypatch):
+    monkeypatch.setattr(job_queue_module, "_DEAD_LETTER_MAX_JOBS", 2)
+
+    async def scenario(queue):
+        for _ in range(3):
+            await queue.enqueue("audit", {}, max_attempts=1)
+            await queue.fail(await queue.claim("audit"), "boom")
+        assert await queue._redis.llen(queue._dead_key()) == 2
+    _run(scenario)
+
+
+def test_local_job_is_live_and_requeued_when_heartbeats_stop():
+    async def scenario(queue):
+        job = await queue.start_local("url_validation", {"validation_id": "v1"}, "audit_url_validations", "v1")
+        assert job["attempts"] == 1
+        assert await queue.has_live_job("audit_url_validations", "v1") is True
+        assert await queue.claim("url_validation") is None
+
+        # El API murió a mitad: el deadline expira y el trabajo pasa a un worker
+        await queue._redis.zadd(queue._inflight_key(), {job["id"]: time.time() - 1})
+        assert await queue.requeue_expired() == []
+        claimed = await queue.claim("url_validation")
+        assert claimed["id"] == job["id"]
+        assert claimed["attempts"] == 2
+        assert claimed["payload"] == {"validation_id": "v1"}
+    _run(scenario)
+
+
+def test_local_job_ack_releases_entity():
+    async def scenario(queue):
+        job = await queue.start_local("audit", {}, "audit_reports", "a1")
+        await queue.ack(job)
+        assert await queue.has_live_job("audit_reports", "a1") is False
+        assert await queue._redis.zcard(queue._inflight_key()) == 0
+    _run(scenario)
+
+
+def test_orphaned_since_keeps_first_sighting_until_cleared():
+    async def scenario(queue):
+        first = await queue.orphaned_since("audit_reports", "a1", ttl=60)
+        await asyncio.sleep(0.01)
+        assert await queue.orphaned_since("audit_reports", "a1", ttl=60) == first
+
+        await queue.clear_orphaned("audit_reports", "a1")
+        assert await queue.orphaned_since("audit_reports", "a1", ttl=60) > first
+    _run(scenario)
@@ -0,0 +1,90 @@
+"""report_document: tokenización del markdown de IA en bloques y formato inline."""
+from app.services.report_document import (
+    CodeBlock,
+    HeadingBlock,
+    ListItemBlock,
+    ParagraphBlock,
+    TableBlock,
+    _tokenize,
+    inline_spans,
+    json_objects,
+    parse_markdown_blocks,
+    table_blocks,
+)
+
+
+def test_headings_lists_and_paragraphs():
+    blocks = _tokenize("# Título\n\n## Sección ##\n- uno\n* dos\nTexto **libre**\n")
+    assert blocks == (
+        HeadingBlock(level=1, text="Título"),
+        HeadingBlock(level=2, text="Sección"),
+        ListItemBlock(text="uno"),
+        ListItemBlock(text="dos"),
+        ParagraphBlock(text="Texto **libre**"),
+    )
+
+
+def test_table_skips_separator_and_ends_at_blank_line():
+    blocks = _tokenize("| Métrica | Valor |\n|---|---|\n| LCP | 2.1s |\n\nDespués")
+    assert blocks == (
+        TableBlock(rows=(("Métrica", "Valor"), ("LCP", "2.1s"))),
+        ParagraphBlock(text="Después"),
+    )
+
+
+def test_table_at_end_of_text_is_flushed():
+    assert _tokenize("| a | b |\n| 1 | 2 |") == (TableBlock(rows=(("a", "b"), ("1", "2"))),)
+
+
+def test_code_fence_keeps_raw_lines_and_language():
+    blocks = _tokenize("| a | b |\n```JSON\n  {\"x\": 1}\n# no es encabezado\n```\nfin")
+    assert blocks == (
+        TableBlock(rows=(("a", "b"),)),
+        CodeBlock(text='  {"x": 1}\n# no es encabezado', language="json"),
+        ParagraphBlock(text="fin"),
+    )
+
+
+def test_unclosed_code_fence():
+    blocks = _tokenize("Antes\n```python\nprint(1)")
+    assert blocks[-1] == CodeBlock(text="print(1)", closed=False, language="python")
+
+
+def test_tokenize_is_cached_by_text():
+    text = "# Cacheado\n- uno"
+    assert _tokenize(text) is _tokenize(text)
+
+
+def test_parse_markdown_blocks_normalizes_legacy_content():
+    assert parse_markdown_blocks(None) == ()
+    assert parse_markdown_blocks({"content": "# Hola"}) == (HeadingBlock(level=1, text="Hola"),)
+    assert parse_markdown_blocks({"analysis": "texto"}) == (ParagraphBlock(text="texto"),)
+
+
+def test_table_blocks():
+    blocks = _tokenize("# T\n| a | b |\n\n| c | d |")
+    assert [table.rows for table in table_blocks(blocks)] == [(("a", "b"),), (("c", "d"),)]
+
+
+def test_json_objects_prefers_json_fences():
+    blocks = _tokenize(
+        "```\n{\"generic\": true}\n```\n"
+        "```json\n[{\"a\": 1}, 2, {\"b\": 2}]\n```\n"
+        "```json\nno es json\n```"
+    )
+    assert json_objects(blocks) == [{"a": 1}, {"b": 2}]
+
+
+def test_json_objects_falls_back_to_generic_fences_and_skips_unclosed():
+    blocks = _tokenize("```\n{\"generic\": true}\n```\n```\n{\"abierto\": true}")
+    assert json_objects(blocks) == [{"generic": True}]
+
+
+def test_inline_spans():
+    assert inline_spans("Usa **negritas** y `código` aquí") == (
+        ("Usa ", "plain"),
+        ("negritas", "bold"),
+        (" y ", "plain"),
+        ("código", "code"),
+        (" aquí", "plain"),
+    )
@@ -0,0 +1,146 @@
+"""ReportLifecycleService: revalidación de artefactos, modo 202 y relevo de construcciones."""
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+report_lifecycle = pytest.importorskip("app.services.report_lifecycle")
+
+from app.services.report_artifacts import ReportArtifactStore, artifact_key  # noqa: E402
+
+ReportLifecycleService = report_lifecycle.ReportLifecycleService
+KIND = "audit_pdf"
+
+
+class _Audit:
+    def model_dump(self):
+        return {"url": "https://x.com"}
+
+
+class _Entity:
+    __tablename__ = "audit_reports"
+
+    def __init__(self):
+        self.id = uuid.uuid4()
+        self.report_pdf_path = None
+
+
+class _Session:
+    def add(self, entity):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, entity):
+        pass
+
+
+def _publish(store: ReportArtifactStore, payload: str) -> str:
+    staged = store.staging_dir() / "reporte.pdf"
+    staged.write_bytes(payload.encode())
+    return store.publish(artifact_key(KIND, _Audit().model_dump(), payload), staged)
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = ReportLifecycleService.__new__(ReportLifecycleService)
+    service.reports_root = tmp_path
+    service.artifact_store = ReportArtifactStore(tmp_path / "artifacts", max_bytes=10**9)
+    service._inflight = {}
+    service._background = {}
+    service._failed_builds = {}
+    return service
+
+
+@pytest.fixture
+def renders(monkeypatch, service):
+    """Sustituye el pool de reportes: publica un artefacto y cuenta los renders."""
+    calls = []
+
+    async def fake_run_report(build, kind, audit_data, payload):
+        calls.append(payload)
+        await asyncio.sleep(0.01)
+        return _publish(service.artifact_store, payload)
+
+    monkeypatch.setattr(report_lifecycle, "run_report", fake_run_report)
+    return calls
+
+
+def _ensure_for(service, source: dict):
+    async def ensure(session, entity, build=True):
+        async def prepare():
+            return KIND, _Audit(), source["payload"]
+
+        return await service._ensure_report(session, entity, "report_pdf_path", prepare, build=build)
+
+    return ensure
+
+
+def test_valid_artifact_is_served_without_building(service, renders):
+    entity = _Entity()
+    entity.report_pdf_path = _publish(service.artifact_store, "v1")
+    ensure = _ensure_for(service, {"payload": "v1"})
+
+    async def scenario():
+        return await service.ensure_in_background(_Session(), entity, "report_pdf_path", ensure)
+
+    assert asyncio.run(scenario()) == entity.report_pdf_path
+    assert renders == []
+
+
+def test_stale_artifact_is_rebuilt_in_background(service, renders, monkeypatch):
+    entity = _Entity()
+    stale_path = _publish(service.artifact_store, "v1")
+    entity.report_pdf_path = stale_path
+    source = {"payload": "v2"}
+    ensure = _ensure_for(service, source)
+
+    class _DbManager:
+        @asynccontextmanager
+        async def async_session_context(self):
+            session = _Session()
+
+            async def get(model, entity_id):
+                return entity
+
+            session.get = get
+            yield session
+
+    monkeypatch.setattr(report_lifecycle, "db_manager", _DbManager())
+
+    async def scenario():
+        first = await service.ensure_in_background(_Session(), entity, "report_pdf_path", ensure)
+        assert first is None
+        assert renders == []  # la petición no construye: responde 202
+        await asyncio.gather(*service._background.values())
+        return await service.ensure_in_background(_Session(), entity, "report_pdf_path", ensure)
+
+    fresh_path = asyncio.run(scenario())
+    assert renders == ["v2"]
+    assert fresh_path != stale_path
+    assert Path(fresh_path).read_bytes() == b"v2"
+
+
+def test_cancelled_build_is_taken_over_by_waiter(service, renders):
+    ensure = _ensure_for(service, {"payload": "v1"})
+
+    async def scenario():
+        leader_entity, waiter_entity = _Entity(), _Entity()
+        waiter_entity.id = leader_entity.id
+        leader = asyncio.create_task(ensure(_Session(), leader_entity))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(ensure(_Session(), waiter_entity))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    path = asyncio.run(scenario())
+    assert Path(path).read_bytes() == b"v1"
+    assert service._inflight == {}
@@ -0,0 +1,81 @@
+"""UrlValidationService: huella por forma del schema, plantilla y relleno por URL."""
+import pytest
+
+pytest.importorskip("pydantic_settings")
+url_validation_service = pytest.importorskip("app.services.url_validation_service")
+
+UrlValidationService = url_validation_service.UrlValidationService
+
+
+def _hotel(url: str, name: str, prices: list) -> list:
+    return [{
+        "@context": "https://schema.org",
+        "@type": "Hotel",
+        "name": name,
+        "url": url,
+        "offers": [{"@type": "Offer", "price": price} for price in prices],
+    }]
+
+
+def _validation(url: str) -> dict:
+    return {"is_valid": False, "errors": [f"{url}: falta la propiedad address"]}
+
+
+@pytest.fixture(scope="module")
+def service():
+    return UrlValidationService()
+
+
+def test_template_pages_share_fingerprint(service):
+    first = service.schema_fingerprint(
+        "https://x.com/a", _hotel("https://x.com/a", "Hotel A", [10]), _validation("https://x.com/a")
+    )
+    second = service.schema_fingerprint(
+        "https://x.com/b", _hotel("https://x.com/b", "Hotel B", [20, 30]), _validation("https://x.com/b")
+    )
+    assert first == second
+
+
+def test_different_shape_or_validation_changes_fingerprint(service):
+    url = "https://x.com/a"
+    base = service.schema_fingerprint(url, _hotel(url, "Hotel A", [10]), _validation(url))
+    other_type = [{**_hotel(url, "Hotel A", [10])[0], "@type": "Motel"}]
+    assert service.schema_fingerprint(url, other_type, _validation(url)) != base
+    assert service.schema_fingerprint(url, _hotel(url, "Hotel A", [10]), {"is_valid": True}) != base
+
+
+def test_replace_url_only_matches_whole_url():
+    url = "https://x.com/p"
+    replaced = UrlValidationService._replace_url(
+        [f"{url}: error", f"{url}/2", f"{url}?ref=1", f"{url}.html", f"ver {url}.", f"({url})"],
+        url,
+        "{{url}}",
+    )
+    assert replaced == [
+        "{{url}}: error",
+        "https://x.com/p/2",
+        "https://x.com/p?ref=1",
+        "https://x.com/p.html",
+        "ver {{url}}.",
+        "({{url}})",
+    ]
+
+
+def test_schema_template_hides_page_values(service):
+    template, values = service.schema_template(_hotel("https://x.com/a", "Hotel A", [10]))
+    assert "Hotel A" not in str(template)
+    assert template[0]["@type"] == "Hotel"
+    assert template[0]["name"] == "{{[0].name}}"
+    assert values["[0].name"] == "Hotel A"
+    assert values["[0].offers[0].price"] == "10"
+
+
+def test_fill_shared_report_uses_each_page_values(service):
+    _template, values = service.schema_template(_hotel("https://x.com/b", "Hotel | B\nCentro", [20]))
+    report = "| {{[0].name}} | {{ [0].offers[0].price }} | {{[0].offers[1].price}} |\nURL: {{url}}"
+
+    filled = UrlValidationService.fill_shared_report(report, "https://x.com/b", values, "https://x.com/a")
+
+    assert "Análisis compartido" in filled and "https://x.com/a" in filled
+    assert "| Hotel \\| B Centro | 20 | N/A |\nURL: https://x.com/b" in filled
+    assert UrlValidationService.fill_shared_report("{{url}}", "https://x.com/b", values) == "https://x.com/b"